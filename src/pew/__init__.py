@@ -11,19 +11,32 @@ PORT = 8456
 MSG_PORT = 8128
 
 import copy
+import functools
 import json
 import logging
 import os
-import six.moves.BaseHTTPServer as BaseHTTPServer
-import six.moves.SimpleHTTPServer as SimpleHTTPServer
-import six.moves.socketserver as socketserver
 import sys
 import threading
 import time
 
 import six
-from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
-from six.moves.urllib.parse import urlparse, unquote
+
+from . import assets, executor, metrics
+from .dispatch import MessageDispatcher, background, route
+from .executor import WorkerPool
+from .messages import Message, decode_message, encode_result
+from .native import get_native
+from .pending import PendingRequests, PEWTimeoutError
+
+if sys.version_info >= (3, 7):
+    # the HTTP and WebSocket servers are only imported by apps that use them
+    def __getattr__(name):
+        if name == "PEWMessageRequestHandler":
+            from .server import MessageRequestHandler
+            return MessageRequestHandler
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+else:
+    from .server import MessageRequestHandler as PEWMessageRequestHandler
 
 app_name = "python"
 
@@ -47,61 +60,85 @@ def get_app_name():
 
 message_thread = None
 message_delegate = None
+message_server = None
+app_server = None
 
 
-def start_message_server(delegate, host=HOST, port=MSG_PORT):
+def start_message_server(delegate, host=HOST, port=MSG_PORT, max_workers=16, allowed_origins=None):
     """
     Messages sent to the server at the specified host and port will be parsed as URLs
     and converted to Python methods called upon the delegate object, which must be a
     PEWMessageHandler-derived object.
 
-    Returns the root URL to the started server.
+    Up to max_workers messages are handled concurrently, and connections are kept alive
+    between messages. Arguments can also be sent in the body of a POST request.
+
+    The web UI can also connect over WebSocket, in which case messages in both directions
+    share a single connection. Use pew.message_server.websockets to push messages to it.
+
+    Only pages in allowed_origins, which defaults to pages served from this machine, may
+    send messages, and each launch uses a new secret token in the server's URL.
+
+    Returns the root URL to the started server, which includes the token. Pass it to the web
+    UI as its bridge protocol.
     """
 
+    from .server import create_token
     global message_thread
-    message_thread = PEWThread(target=start_message_server_thread, args=(delegate, host, port))
+    token = create_token()
+    thread_class = get_native("PEWThread", threading.Thread)
+    message_thread = thread_class(target=start_message_server_thread,
+                                  args=(delegate, host, port, max_workers, token, allowed_origins))
     message_thread.daemon = True
     message_thread.start()
-    return "http://%s:%s/" % (host, port)
+    return "http://%s:%s/%s/" % (host, port, token)
 
 
-def start_message_server_thread(delegate, host=HOST, port=MSG_PORT):
-    from BaseHTTPServer import HTTPServer
-    global message_delegate
+def start_message_server_thread(delegate, host=HOST, port=MSG_PORT, max_workers=16, token=None,
+                                allowed_origins=None):
+    from .server import create_message_server
+    global message_delegate, message_server
     message_delegate = delegate
-    server = HTTPServer((host, port), PEWMessageRequestHandler)
+    message_server = create_message_server(delegate, host, port, max_workers=max_workers, token=token,
+                                           allowed_origins=allowed_origins)
     logging.info("message server initialized at http://%s:%s/" % (host, port))
     try:
-        server.serve_forever()
+        message_server.serve_forever()
     except Exception as e:
         import traceback
         logging.info("Server disconnected")
         logging.info("Reason: %s" % traceback.format_exc())
+    finally:
+        message_server.server_close()
     logging.info("Finished.")
 
 
-def start_local_server(url_root, host=HOST, port=PORT, callback=None):
+def start_local_server(url_root, host=HOST, port=PORT, callback=None, max_workers=8,
+                       cache_size=32 * 1024 * 1024):
     """
     Starts a local HTTP server with the site root pointing to the directory passed in
     as url_root. This function does not return - if using this in a GUI app, make sure
     to call this in a thread. If the host and port are not passed in, they default to
     "%s" and %s, respectively.
 
+    Up to max_workers requests are served concurrently. Files are sent with ETag and
+    Last-Modified headers so that unchanged files are not downloaded again, and
+    precompressed .br and .gz siblings are used when present, see pew.static. Up to
+    cache_size bytes of recently used files are kept in memory.
+
     If there's a callback function, it will call that once it starts the server. This is
     useful for taking an action like opening the site in a web browser once it is loaded.
     """ % (HOST, PORT)
 
-    http_handler = SimpleHTTPServer.SimpleHTTPRequestHandler
+    from .static import create_static_server
     logging.info("Starting local server")
 
-    httpd = socketserver.TCPServer((HOST, PORT), http_handler)
+    httpd = create_static_server(url_root, host, port, max_workers=max_workers, cache_size=cache_size)
     try:
-        root = os.path.abspath(url_root)
-        os.chdir(root)
-        hostname = HOST
-        if HOST == "":
+        hostname = host
+        if host == "":
             hostname = "localhost"
-        url = "http://%s:%d/" % (hostname, PORT)
+        url = "http://%s:%d/" % (hostname, httpd.server_address[1])
 
         if callback:
             logging.info("callback being called")
@@ -110,31 +147,57 @@ def start_local_server(url_root, host=HOST, port=PORT, callback=None):
 
         httpd.serve_forever()
     except KeyboardInterrupt:
-        httpd.socket.close()
-
+        pass
+    finally:
+        httpd.server_close()
 
-class PEWMessageRequestHandler(BaseHTTPRequestHandler):
-    handler = None
 
-    def do_GET(self):
-        global message_delegate
-        if message_delegate and run_on_main_thread(message_delegate.parse_message, self.path):
-            self.send_response(200)
-        else:
-            self.send_response(500)
+def start_app_server(url_root, delegate, host=HOST, port=0, **kwargs):
+    """
+    Starts a server for the web UI files in url_root, bridge messages to delegate, and
+    pushes to the web UI, all on one port of the bridge's asyncio event loop. With the
+    default port of 0 the OS picks a free port. Requires Python 3.5 or later.
+
+    Unlike start_local_server, this returns once the server is listening. Returns the
+    pew.app_server.AppServer, whose url and bridge_url attributes hold the URLs to load
+    the UI from and to use as its bridge protocol. Other keyword arguments are passed
+    to AppServer. Coroutines on the bridge's event loop cannot wait for it to start, and
+    should create an AppServer and await its start_serving() method instead.
+    """
+    from .app_server import AppServer
+    global app_server
+    server = AppServer(url_root, delegate, host, port, **kwargs)
+    server.start()
+    app_server = server
+    return server
 
 
-class PEWMessageHandler:
+class PEWMessageHandler(object):
     def __init__(self, webview, delegate):
         self.webview = webview
-        self.delegate = delegate
-        self.js_value = None
+        self.js_requests = PendingRequests()
+        # runs delegate methods marked with pew.background
+        self.executor = WorkerPool()
         self.message_received = False
+        self.delegate = delegate
+
+    @property
+    def delegate(self):
+        return self._delegate
 
-    def get_value_from_js(self, value):
-        self.js_value = value.replace("%", "%%")
+    @delegate.setter
+    def delegate(self, delegate):
+        self._delegate = delegate
+        self.dispatcher = MessageDispatcher(delegate)
+        self.dispatcher.register("js_value_result", self.js_value_result)
 
-    def get_js_value(self, variable, timeout=1):
+    def js_value_result(self, request_id, result):
+        """
+        Receives the answer to a bridge.getJSValue request. Internal use only.
+        """
+        self.js_requests.resolve(request_id, result.get("value"))
+
+    def get_js_value(self, variable, timeout=1, callback=None):
         """
         Gets the value of a property, variable or function in JavaScript.
 
@@ -142,13 +205,53 @@ class PEWMessageHandler:
         sometimes an app cannot proceed until a value is retrieved, e.g. tests, so this method
         sends a message asking for the value and waits until JS sends back the value.
 
-        This method causes the app to sleep and should be avoided for any time-sensitive operation.
+        Each request carries its own ID, so several values can be requested at the same time.
+        Web views that return the result of evaluated scripts, like WebKitGTK's, answer
+        directly without the round trip through the bridge. Either way the script is
+        evaluated on the main thread, where those web views also deliver the result. When
+        called on the main thread, blocking will therefore always time out, so pass a
+        callback instead.
 
         :param variable: the property or variable you want the value of
         :param timeout: how many seconds to wait before giving up on retrieving the value
+        :param callback: if set, return immediately and call callback(value, error) once the value
+                         arrives, with a JavaScriptError if the script failed or a PEWTimeoutError
+                         if no value arrived in time
         """
-        self.evaluate_javascript("bridge.getJSValue('%s');" % variable)
-        return self._wait_for_js_value(variable, timeout)
+        pending = self.js_requests.create()
+        if getattr(self.webview, "javascript_results", False):
+            # the web view returns the value of a script itself, so no message from the bridge is needed
+            def set_result(value, error):
+                self.js_requests.resolve(pending.request_id, value, error)
+            args = (variable, set_result)
+        else:
+            args = ("bridge.getJSValue(%s, %d);" % (json.dumps(variable), pending.request_id),)
+        # web views may only be used on the main thread
+        run_on_main_thread = get_native("run_on_main_thread", _run_immediately)
+        evaluate = functools.partial(run_on_main_thread, self.webview.evaluate_javascript, *args)
+
+        if callback is not None:
+            timer = executor.call_later(timeout, self._expire_js_request, pending.request_id, variable)
+
+            def done(result):
+                timer.cancel()
+                callback(result.value, result.error)
+
+            pending.add_done_callback(done)
+            evaluate()
+            return None
+
+        evaluate()
+        try:
+            return pending.wait(timeout)
+        except PEWTimeoutError:
+            self.js_requests.discard(pending.request_id)
+            raise PEWTimeoutError("Timed out attempting to retrieve value for '%s'" % variable)
+
+    def _expire_js_request(self, request_id, variable):
+        pending = self.js_requests.discard(request_id)
+        if pending is not None:
+            pending.set_result(error=PEWTimeoutError("Timed out attempting to retrieve value for '%s'" % variable))
 
     def clear_message_received_flag(self):
         """
@@ -156,71 +259,119 @@ class PEWMessageHandler:
         """
         self.message_received = False
 
-    def parse_message(self, url):
+    def evaluate_javascript(self, js):
         """
-        Processes a message received from the JavaScript bridge and calls the
-        corresponding Python delegate method. Internal use only.
+        Evaluates js in the web UI. Unlike the web view's method, this can be called from any
+        thread. Without a web view, js is sent to UIs connected to the message server.
         """
+        if self.webview is not None:
+            run_on_main_thread = get_native("run_on_main_thread", _run_immediately)
+            run_on_main_thread(self.webview.evaluate_javascript, js)
+        elif message_server is not None:
+            message_server.websockets.evaluate_javascript(js)
+        elif app_server is not None:
+            app_server.clients.evaluate_javascript(js)
+        else:
+            logging.warning("No web UI to evaluate JavaScript in")
 
-        parts = urlparse(url)
-        query = parts.query
-
-        # On Android at least, Python puts the ?whatever part in path rather than query
-        path = parts.path.split("?")
-        if len(path) == 2 and not query:
-            query = path[1]
-        path = path[0][1:]
-
-        func_name = parts.netloc
-        if path != "":
-            func_name += path.replace("/", ".")
-        command = "%s" % func_name
-
-        func_args = []
-        func_kwargs = {}
-        if query:
-            args = query.split("&")
-            for arg in args:
-                arg = unquote(arg.encode('ascii'))
-                logging.debug("arg = %s" % arg)
-                #arg = arg.replace("\\", "\\\\")
-                #arg = arg.replace("\\u", "\u")
-                arg = arg.decode('utf-8')
-                name = None
-                value = arg
-
-                if arg.find("=") != -1:
-                    name, value = arg.split("=")
-
-                if value == "empty_string":
-                    value = ""
-
-                try:
-                    value = json.loads(value)
-                except:
-                    pass
-
-                if name is not None:
-                    func_kwargs[name] = value
+    def send_call_result(self, call_id, value=None, error=None):
+        """
+        Sends the result of a delegate method back to the JavaScript code that called it.
+        """
+        self.evaluate_javascript("bridge.receiveMessage(%s);" % encode_result(call_id, value, error))
+
+    def _send_result(self, message, reply, value=None, error=None):
+        if error is None and hasattr(value, "__await__"):
+            # coroutine delegate methods run on the bridge's asyncio event loop, and their
+            # result is sent once they have finished
+            from . import aio
+
+            def coroutine_done(future):
+                if future.cancelled():
+                    self._send_result(message, reply, error=Exception("Cancelled"))
+                elif future.exception() is not None:
+                    self._send_result(message, reply, error=future.exception())
                 else:
-                    func_args.append(value)
+                    self._send_result(message, reply, future.result())
 
-        if func_name.startswith("get_value_from_js"):
-            command = "self.%s" % func_name
-        else:
-            command = "self.delegate.%s" % func_name
+            aio.run_coroutine(value).add_done_callback(coroutine_done)
+            return
+
+        if message.call_id is None:
+            return
 
         try:
-            function = eval(command)
-            function(*func_args, **func_kwargs)
+            (reply or self.send_call_result)(message.call_id, value, error)
+        except Exception:
+            import traceback
+            logging.error(traceback.format_exc())
+
+    def _call_delegate(self, message, function):
+        timed = metrics.enabled
+        if timed:
+            start = metrics.clock()
+
+        try:
+            result = function(*message.args, **message.kwargs)
         except Exception as e:
             import traceback
             logging.error(traceback.format_exc())
+            if timed:
+                metrics.record_route(message.name, metrics.clock() - start, error=True)
+            raise
+
+        if timed:
+            metrics.record_route(message.name, metrics.clock() - start)
+        return result
+
+    def parse_message(self, message, reply=None):
+        """
+        Processes a message received from the JavaScript bridge and calls the
+        corresponding Python delegate method. Internal use only.
+
+        Methods marked with the pew.background decorator are run on a worker thread, and
+        coroutines returned by any method are run on the asyncio event loop. If the message
+        carries a call ID, the method's result is sent back to the caller once it is
+        available. Only bridge.call asks for a result this way; other messages get no
+        reply, even on errors.
+
+        :param message: the message as a JSON document, binary envelope or legacy URL, see pew.messages
+        :param reply: function called as reply(call_id, value, error) to send the result of the
+                      call, defaults to send_call_result
+        """
+
+        if not isinstance(message, Message):
+            try:
+                message = decode_message(message)
+            except ValueError as e:
+                logging.error("Unable to decode bridge message: %s", e)
+                return False
+
+        function = self.dispatcher.resolve(message.name)
+        if function is None:
+            self._send_result(message, reply, error=KeyError("No delegate method for '%s'" % message.name))
             return False
 
+        if self.dispatcher.is_background(message.name, function):
+            pending = self.executor.submit(self._call_delegate, message, function)
+            pending.add_done_callback(lambda result: self._send_result(message, reply, result.value, result.error))
+        else:
+            try:
+                result = self._call_delegate(message, function)
+            except Exception as e:
+                self._send_result(message, reply, error=e)
+                return False
+
+            self._send_result(message, reply, result)
+
         self.message_received = True
         return True
 
+
+def _run_immediately(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
 def get_app_dir():
     return os.path.dirname(sys.argv[0])
 
@@ -0,0 +1,195 @@
+"""
+asyncio support for the PyEverywhere bridge. Requires Python 3.5 or later.
+
+Bridge coroutines run on a single asyncio event loop, which by default is started on a
+background PEWThread the first time it is needed. Work that has to happen on the UI thread
+is handed to the native main loop through the backend's run_on_main_thread (GLib on GTK,
+wx.CallAfter on wxPython, a UI thread Runnable on Android) and its result is sent back to
+the event loop, so coroutines never block the UI and the UI never blocks coroutines.
+
+Delegate methods that are coroutine functions are scheduled on this loop automatically by
+PEWMessageHandler.parse_message.
+
+Example:
+    class AppDelegate(object):
+        async def load_feed(self, url):
+            data = await fetch(url)
+            await self.bridge.call_js_function("show_feed", data)
+"""
+
+import asyncio
+import logging
+import threading
+
+from .native import get_native
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _run_immediately(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def _get_run_on_main_thread():
+    # without a native backend, e.g. in browser mode, there is no UI thread to hand calls to
+    return get_native("run_on_main_thread", _run_immediately)
+
+
+def set_event_loop(loop):
+    """
+    Sets the event loop used for bridge coroutines. Use this if your app already runs its own
+    asyncio loop on another thread. The loop must be running or be started by the caller.
+    """
+    global _loop
+    with _loop_lock:
+        _loop = loop
+
+
+def get_event_loop():
+    """
+    Returns the event loop used for bridge coroutines, starting it on a background thread
+    if no loop has been set yet.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(_loop)
+                _loop.call_soon(started.set)
+                _loop.run_forever()
+
+            thread = get_native("PEWThread", threading.Thread)(target=run_loop)
+            thread.daemon = True
+            thread.start()
+            started.wait()
+
+        return _loop
+
+
+def run_coroutine(coro):
+    """
+    Schedules coro on the bridge event loop from any thread. Returns a
+    concurrent.futures.Future for its result. Exceptions are logged if nobody retrieves them.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+    def log_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Error in bridge coroutine", exc_info=future.exception())
+
+    future.add_done_callback(log_error)
+    return future
+
+
+def call_on_main_thread(func, *args, **kwargs):
+    """
+    Runs func on the native UI thread and returns an awaitable for its result. Must be called
+    from a coroutine running on the bridge event loop.
+    """
+    return _call_on_main_thread(_get_run_on_main_thread(), func, *args, **kwargs)
+
+
+def _call_on_main_thread(run_on_main_thread, func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def set_result(value, error):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def run():
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            loop.call_soon_threadsafe(set_result, None, e)
+        else:
+            loop.call_soon_threadsafe(set_result, value, None)
+
+    run_on_main_thread(run)
+    return future
+
+
+class AsyncBridge(object):
+    """
+    Awaitable versions of the WebUIView and PEWMessageHandler calls into JavaScript.
+
+    :param handler: the PEWMessageHandler receiving messages for the web view
+    :param run_on_main_thread: function used to run calls on the UI thread, defaults to the
+                               native backend's run_on_main_thread
+    """
+
+    def __init__(self, handler, run_on_main_thread=None):
+        self.handler = handler
+        self._run_on_main_thread = run_on_main_thread
+
+    @property
+    def webview(self):
+        return self.handler.webview
+
+    def _on_main_thread(self, func, *args, **kwargs):
+        run_on_main_thread = self._run_on_main_thread or _get_run_on_main_thread()
+        return _call_on_main_thread(run_on_main_thread, func, *args, **kwargs)
+
+    async def evaluate_javascript(self, js):
+        """
+        Evaluates js in the web view. Web views that return the result of scripts, like
+        WebKitGTK's, return the value of js converted through JSON and raise JavaScriptError
+        if it throws. Elsewhere this returns None once js has been handed to the browser engine.
+        """
+        if not getattr(self.webview, "javascript_results", False):
+            await self._on_main_thread(self.webview.evaluate_javascript, js)
+            return None
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def set_result(value, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+        def callback(value, error):
+            loop.call_soon_threadsafe(set_result, value, error)
+
+        await self._on_main_thread(self.webview.evaluate_javascript, js, callback)
+        return await future
+
+    async def call_js_function(self, function_name, *args):
+        """
+        Awaitable version of WebUIView.call_js_function.
+        """
+        await self._on_main_thread(self.webview.call_js_function, function_name, *args)
+
+    async def get_js_value(self, variable, timeout=1):
+        """
+        Returns the value of a property, variable or function in JavaScript without blocking
+        the event loop or the UI thread. Raises PEWTimeoutError if no answer arrives within
+        timeout seconds.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def set_value(value, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+        def callback(value, error):
+            loop.call_soon_threadsafe(set_value, value, error)
+
+        await self._on_main_thread(self.handler.get_js_value, variable, timeout, callback)
+        return await future
@@ -0,0 +1,492 @@
+"""
+A single-port asyncio server for the whole app. Requires Python 3.5 or later.
+
+start_local_server and start_message_server each run a blocking server on its own fixed
+port and threads. AppServer instead serves everything from the bridge's asyncio event loop
+(see pew.aio) on one port, which by default is picked by the OS so that many app instances
+can run on the same host:
+
+* GET /<path> serves the files in the root directory, see pew.static
+* GET or POST /_pew/<token>/<name> sends a bridge message, as with the message server
+* GET /_pew/<token>/ws opens a WebSocket carrying messages in both directions
+* GET /_pew/<token>/events opens a server-sent events stream, for UIs that cannot use WebSocket
+
+<token> is a random token generated for each server, which bridge_url includes, so that
+pages from other sites cannot send messages to the app.
+
+Load the UI with the server's bridge_url as its protocol, e.g.
+
+    server = pew.start_app_server(ui_root, handler)
+    webbrowser.open(server.url + "index.html?protocol=" + server.bridge_url)
+
+and use server.clients to push messages to every connected UI.
+"""
+
+import asyncio
+import http.client
+import io
+import json
+import logging
+import sys
+
+from six.moves.urllib.parse import urlsplit
+
+from . import aio
+from .messages import BINARY_MAGIC, decode_message, encode_result
+from .server import create_token
+from .static import CHUNK_SIZE, AssetCache, StaticFiles, error_response
+from .websocket import (OP_BINARY, OP_CLOSE, OP_CONTINUATION, OP_PING, OP_PONG, OP_TEXT,
+                        WebSocketError, WebSocketHub, accept_key, apply_mask, decode_text, encode_frame)
+
+BRIDGE_PATH = "/_pew/"
+
+# the largest request head accepted, which bounds the memory used by a connection
+MAX_HEAD_SIZE = 64 * 1024
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except AttributeError:
+        # Python 3.6 and earlier
+        return asyncio._get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _response_head(status, headers):
+    lines = ["HTTP/1.1 %d %s" % (status, http.client.responses.get(status, ""))]
+    lines.extend("%s: %s" % header for header in headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+class PushClient(object):
+    """
+    A UI connected to an AppServer for pushes. send is only called on the event loop.
+    """
+
+    def __init__(self, writer, event_stream=False):
+        self.writer = writer
+        self.event_stream = event_stream
+
+    @property
+    def closed(self):
+        return self.writer.transport.is_closing()
+
+    def send(self, message):
+        data = message.encode("utf-8")
+        if self.event_stream:
+            self.writer.write(b"data: " + data.replace(b"\n", b"\ndata: ") + b"\n\n")
+        else:
+            self.writer.write(encode_frame(OP_TEXT, data))
+
+
+class PushHub(WebSocketHub):
+    """
+    The UIs connected to an AppServer over WebSocket or server-sent events. Messages can be
+    sent from any thread, see WebSocketHub.
+    """
+
+    def __init__(self, loop):
+        super(PushHub, self).__init__()
+        self.loop = loop
+
+    def send(self, message):
+        self.loop.call_soon_threadsafe(self._broadcast, json.dumps(message))
+
+    def _broadcast(self, data):
+        with self._lock:
+            clients = list(self._connections)
+
+        for client in clients:
+            if client.closed:
+                self.remove(client)
+            else:
+                client.send(data)
+
+
+class AppServer(object):
+    """
+    Serves the app's files, bridge messages and pushes on a single port.
+
+    :param root: directory containing the web UI, or None to only handle bridge messages
+    :param delegate: the PEWMessageHandler receiving bridge messages
+    :param port: port to listen on, 0 to let the OS pick one. The bound port is available
+                 in the port attribute once the server has started.
+    :param dispatch_on_main_thread: True to run delegate methods on the native UI thread, defaults
+                                    to True if a native backend has been loaded
+    :param dispatch_timeout: seconds to wait for the result of a call
+    :param max_body_size: largest request body, in bytes, that will be accepted
+    :param cache_size: bytes of file contents to keep in memory, see pew.static.AssetCache
+    :param token: secret the paths of bridge requests must start with, defaults to a random
+                  token. Pass "" to accept requests without one.
+
+    Bridge requests without the token or from pages on other origins are rejected, and
+    responses only allow the server's own origin to read them.
+    """
+
+    keep_alive_timeout = 30
+    # seconds between comments sent to keep server-sent event streams open
+    heartbeat_interval = 15
+
+    def __init__(self, root, delegate, host="127.0.0.1", port=0, dispatch_on_main_thread=None,
+                 dispatch_timeout=10, max_body_size=16 * 1024 * 1024, cache_size=32 * 1024 * 1024,
+                 token=None):
+        if dispatch_on_main_thread is None:
+            dispatch_on_main_thread = "pew.ui" in sys.modules
+
+        self.files = None
+        if root is not None:
+            self.files = StaticFiles(root, cache=AssetCache(cache_size) if cache_size else None)
+        self.delegate = delegate
+        self.host = host
+        self.port = port
+        self.dispatch_on_main_thread = dispatch_on_main_thread
+        self.dispatch_timeout = dispatch_timeout
+        self.max_body_size = max_body_size
+        self.token = create_token() if token is None else token
+        self.loop = None
+        self.clients = None
+        self._server = None
+
+    @property
+    def url(self):
+        return "http://%s:%d/" % (self.host or "localhost", self.port)
+
+    @property
+    def origin(self):
+        return self.url.rstrip("/")
+
+    def origin_allowed(self, headers):
+        # requests without an Origin header do not come from a web page on another site
+        origin = headers.get("Origin")
+        return origin is None or origin == self.origin
+
+    @property
+    def bridge_path(self):
+        """
+        The path that bridge requests start with, including the token.
+        """
+        return BRIDGE_PATH + self.token + "/" if self.token else BRIDGE_PATH
+
+    @property
+    def bridge_url(self):
+        """
+        The URL to set as the bridge protocol in the web UI.
+        """
+        return self.url + self.bridge_path.lstrip("/")
+
+    async def start_serving(self):
+        """
+        Starts listening on the running event loop. Returns the server's URL.
+        """
+        self.loop = asyncio.get_event_loop()
+        self.clients = PushHub(self.loop)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_HEAD_SIZE)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info("app server listening at %s" % self.url)
+        return self.url
+
+    def start(self):
+        """
+        Starts the server on the bridge event loop, see pew.aio, and returns the server's
+        URL once it is listening. Coroutines running on that loop cannot wait for it and
+        must use `await start_serving()` instead.
+        """
+        loop = aio.get_event_loop()
+        if _running_loop() is loop:
+            raise RuntimeError("AppServer.start cannot be called on its event loop, await start_serving() instead")
+        return aio.run_coroutine(self.start_serving()).result()
+
+    def stop(self):
+        """
+        Stops accepting connections and closes those used for pushes.
+        """
+        def close():
+            self._server.close()
+            with self.clients._lock:
+                clients = list(self.clients._connections)
+            for client in clients:
+                client.writer.close()
+
+        if self._server is not None:
+            self.loop.call_soon_threadsafe(close)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, [("Content-Length", "0"), ("Connection", "close")])
+                    break
+
+                try:
+                    request_line, _, header_data = head.partition(b"\r\n")
+                    method, target, version = request_line.decode("latin-1").split(" ")
+                    headers = http.client.parse_headers(io.BytesIO(header_data))
+                    length = int(headers.get("Content-Length") or 0)
+                except (ValueError, http.client.HTTPException):
+                    await self._send(writer, 400, [("Content-Length", "0"), ("Connection", "close")])
+                    break
+
+                if length > self.max_body_size:
+                    await self._send(writer, 413, [("Content-Length", "0"), ("Connection", "close")])
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = (headers.get("Connection") or "").lower()
+                keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+                if await self._handle_request(method, target, headers, body, reader, writer):
+                    # the connection was taken over by a WebSocket or an event stream
+                    break
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            import traceback
+            logging.error(traceback.format_exc())
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, headers, body=b""):
+        writer.write(_response_head(status, headers))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, value):
+        body = (value if isinstance(value, str) else json.dumps(value)).encode("utf-8")
+        await self._send(writer, status, [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Access-Control-Allow-Origin", self.origin),
+        ], body)
+
+    async def _handle_request(self, method, target, headers, body, reader, writer):
+        path = urlsplit(target).path
+        if not path.startswith(BRIDGE_PATH):
+            if method not in ("GET", "HEAD"):
+                await self._send(writer, 405, [("Allow", "GET, HEAD"), ("Content-Length", "0")])
+            else:
+                await self._send_file(method, target, headers, writer)
+            return False
+
+        name = path[len(self.bridge_path):]
+        if not path.startswith(self.bridge_path) or not self.origin_allowed(headers):
+            await self._send_json(writer, 403, {"ok": False, "error": "forbidden"})
+            return False
+        elif name == "ws" and (headers.get("Upgrade") or "").lower() == "websocket":
+            await self._handle_websocket(headers, reader, writer)
+            return True
+        elif name == "events":
+            await self._handle_event_stream(reader, writer)
+            return True
+        elif method == "OPTIONS":
+            await self._send(writer, 204, [
+                ("Access-Control-Allow-Origin", self.origin),
+                ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+                ("Access-Control-Allow-Headers", "Content-Type"),
+                ("Content-Length", "0"),
+            ])
+            return False
+
+        if body[:4] == BINARY_MAGIC or body.lstrip()[:1] == b"{":
+            # a complete message in one of the formats in pew.messages
+            message = body
+        else:
+            message = "/" + target[len(self.bridge_path):]
+            if body:
+                message += ("&" if "?" in message else "?") + body.decode("utf-8")
+        await self._handle_message(message, writer)
+        return False
+
+    async def _respond_file(self, target, headers):
+        if self.files is None:
+            return error_response(404, "Not found")
+        # stat and read files on a worker thread so slow storage does not stall the loop
+        return await self.loop.run_in_executor(None, self.files.respond, target, headers)
+
+    async def _send_file(self, method, target, headers, writer):
+        response = await self._respond_file(target, headers)
+        try:
+            await self._send(writer, response.status, response.headers)
+            if method == "HEAD":
+                return
+            if response.data is not None:
+                writer.write(response.data)
+            elif response.count > 0:
+                await writer.drain()
+                if hasattr(self.loop, "sendfile"):
+                    await self.loop.sendfile(writer.transport, response.content, response.start, response.count)
+                else:
+                    response.content.seek(response.start)
+                    remaining = response.count
+                    while remaining > 0:
+                        data = await self.loop.run_in_executor(None, response.content.read,
+                                                               min(CHUNK_SIZE, remaining))
+                        if not data:
+                            break
+                        writer.write(data)
+                        remaining -= len(data)
+                        await writer.drain()
+            await writer.drain()
+        finally:
+            if response.content is not None:
+                response.content.close()
+
+    async def _dispatch(self, message, reply):
+        if self.delegate is None:
+            return False
+        if self.dispatch_on_main_thread:
+            return await asyncio.wait_for(aio.call_on_main_thread(self.delegate.parse_message, message, reply),
+                                          self.dispatch_timeout)
+        return await self.loop.run_in_executor(None, self.delegate.parse_message, message, reply)
+
+    def _reply_function(self, callback):
+        # replies may be sent from any thread, so hand them to the event loop
+        def reply(call_id, value, error):
+            self.loop.call_soon_threadsafe(callback, encode_result(call_id, value, error))
+        return reply
+
+    async def _handle_message(self, message, writer):
+        try:
+            message = decode_message(message)
+        except ValueError as e:
+            await self._send_json(writer, 400, {"ok": False, "error": str(e)})
+            return
+
+        result = self.loop.create_future()
+
+        def set_result(data):
+            if not result.done():
+                result.set_result(data)
+
+        try:
+            handled = await self._dispatch(message, self._reply_function(set_result))
+            if message.call_id is not None:
+                await self._send_json(writer, 200, await asyncio.wait_for(result, self.dispatch_timeout))
+                return
+        except asyncio.TimeoutError:
+            await self._send_json(writer, 504, {"ok": False, "error": "timeout"})
+            return
+        except Exception:
+            import traceback
+            logging.error(traceback.format_exc())
+            handled = False
+
+        if handled:
+            await self._send_json(writer, 200, {"ok": True})
+        else:
+            await self._send_json(writer, 500, {"ok": False})
+
+    async def _handle_event_stream(self, reader, writer):
+        await self._send(writer, 200, [
+            ("Content-Type", "text/event-stream"),
+            ("Cache-Control", "no-cache"),
+            ("Access-Control-Allow-Origin", self.origin),
+            ("Connection", "close"),
+        ])
+        client = PushClient(writer, event_stream=True)
+        self.clients.add(client)
+        try:
+            while True:
+                try:
+                    # event stream clients never send anything, so data means the connection closed
+                    await asyncio.wait_for(reader.read(1024), self.heartbeat_interval)
+                    break
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.remove(client)
+
+    async def _read_frame(self, reader):
+        header = await reader.readexactly(2)
+        fin = bool(header[0] & 0x80)
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), "big")
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), "big")
+
+        if length > self.max_body_size:
+            raise WebSocketError("Frame of %d bytes exceeds the maximum message size" % length)
+        if not header[1] & 0x80:
+            raise WebSocketError("Client frames must be masked")
+        mask = await reader.readexactly(4)
+        payload = apply_mask(await reader.readexactly(length), mask) if length else b""
+        return fin, opcode, payload
+
+    async def _receive(self, reader, writer):
+        fragments = []
+        message_opcode = None
+        size = 0
+        while True:
+            fin, opcode, payload = await self._read_frame(reader)
+            if opcode == OP_PING:
+                writer.write(encode_frame(OP_PONG, payload))
+                continue
+            elif opcode == OP_PONG:
+                continue
+            elif opcode == OP_CLOSE:
+                writer.write(encode_frame(OP_CLOSE, payload[:2]))
+                return None
+            elif opcode == OP_CONTINUATION:
+                if message_opcode is None:
+                    raise WebSocketError("Continuation frame without a message")
+            elif opcode in (OP_TEXT, OP_BINARY):
+                if message_opcode is not None:
+                    raise WebSocketError("New message started before the previous one finished")
+                message_opcode = opcode
+            else:
+                raise WebSocketError("Unknown opcode %d" % opcode)
+
+            size += len(payload)
+            if size > self.max_body_size:
+                raise WebSocketError("Message exceeds the maximum message size")
+            fragments.append(payload)
+
+            if fin:
+                message = b"".join(fragments)
+                return decode_text(message) if message_opcode == OP_TEXT else message
+
+    async def _handle_websocket(self, headers, reader, writer):
+        key = headers.get("Sec-WebSocket-Key")
+        if not key:
+            await self._send_json(writer, 400, {"ok": False, "error": "missing Sec-WebSocket-Key"})
+            return
+
+        await self._send(writer, 101, [
+            ("Upgrade", "websocket"),
+            ("Connection", "Upgrade"),
+            ("Sec-WebSocket-Accept", accept_key(key)),
+        ])
+
+        client = PushClient(writer)
+        self.clients.add(client)
+        reply = self._reply_function(client.send)
+        try:
+            while True:
+                message = await self._receive(reader, writer)
+                if message is None:
+                    break
+                if isinstance(message, str) and message.lstrip()[:1] != "{":
+                    message = "/" + message
+                try:
+                    await self._dispatch(message, reply)
+                except Exception:
+                    import traceback
+                    logging.error(traceback.format_exc())
+        except WebSocketError as e:
+            logging.warning("Closing WebSocket after protocol error: %s", e)
+            writer.write(encode_frame(OP_CLOSE, e.status.to_bytes(2, "big")))
+        finally:
+            self.clients.remove(client)
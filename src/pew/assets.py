@@ -0,0 +1,200 @@
+"""
+Serving of the web UI from an asset bundle through a custom URL scheme.
+
+Instead of loading file:// URLs, which requires the UI to be extracted to disk, an app can
+register a bundle before creating its WebUIView and load the URL returned by get_url:
+
+    pew.assets.set_bundle(os.path.join(thisdir, "files", "web.zip"))
+    self.webview = pew.WebUIView(name, pew.assets.get_url("index.html"), "myapp", self)
+
+The web view then requests app://bundle/index.html and every asset it references from
+the bundle, which is indexed once when it is opened. A bundle can be a zip archive, a
+dictionary of paths to contents or, for development, a directory. The GTK, Chromium and
+Android backends serve the scheme, others should keep loading file:// URLs.
+"""
+
+import collections
+import io
+import os
+import posixpath
+import threading
+import zipfile
+import zlib
+
+import six
+from six.moves.urllib.parse import unquote
+
+from .static import guess_content_type
+
+DEFAULT_SCHEME = "app"
+HOST = "bundle"
+INDEX = "index.html"
+
+scheme = DEFAULT_SCHEME
+bundle = None
+
+Asset = collections.namedtuple("Asset", ["data", "content_type", "headers"])
+
+
+def normalize_path(path):
+    """
+    Converts the path of an asset URL into the name of the asset in the bundle, e.g.
+    '/lib/../index.html' -> 'index.html'. Paths cannot refer to files outside the bundle.
+    path must already be percent-decoded, see load_url.
+    """
+    path = path.split("?", 1)[0].split("#", 1)[0]
+    directory = not path or path.endswith("/")
+    # normalizing from the root drops any .. that would leave the bundle
+    path = posixpath.normpath("/" + path).lstrip("/")
+    if directory:
+        path = posixpath.join(path, INDEX) if path else INDEX
+    return path
+
+
+class AssetBundle(object):
+    """
+    Base class for asset bundles. Subclasses implement read, which returns the contents of
+    an asset or raises KeyError, and etag.
+    """
+
+    # bundles do not change while the app runs, so the web view never needs to revalidate
+    cache_control = "max-age=31536000, immutable"
+
+    def read(self, name):
+        raise NotImplementedError
+
+    def etag(self, name, data):
+        return '"%x-%x"' % (zlib.crc32(data) & 0xffffffff, len(data))
+
+    def load(self, path):
+        """
+        Returns the Asset for a URL path. Raises KeyError if the bundle does not contain it.
+        """
+        name = normalize_path(path)
+        data = self.read(name)
+        headers = {
+            "Content-Type": guess_content_type(name),
+            "Content-Length": str(len(data)),
+            "Cache-Control": self.cache_control,
+            "ETag": self.etag(name, data),
+            "Access-Control-Allow-Origin": "*",
+        }
+        return Asset(data, headers["Content-Type"], headers)
+
+
+class MemoryAssetBundle(AssetBundle):
+    """
+    A bundle of assets held in memory, as a dictionary of names to bytes.
+    """
+
+    def __init__(self, files):
+        self.files = dict((normalize_path(name), data) for name, data in files.items())
+
+    def read(self, name):
+        return self.files[name]
+
+
+class ZipAssetBundle(AssetBundle):
+    """
+    A bundle of assets in a zip archive. Only the archive's index is read when the bundle is
+    opened, assets are decompressed on demand.
+
+    :param path: path to the archive, or a file object containing it
+    :param prefix: directory in the archive containing the assets, e.g. 'web/'
+    """
+
+    def __init__(self, path, prefix=""):
+        self.path = path if isinstance(path, six.string_types) else None
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self._zip = zipfile.ZipFile(path)
+        self._lock = threading.Lock()
+        self.index = {}
+        for info in self._zip.infolist():
+            if info.filename.startswith(self.prefix) and not info.filename.endswith("/"):
+                self.index[info.filename[len(self.prefix):]] = info
+
+    def read(self, name):
+        info = self.index[name]
+        with self._lock:
+            return self._zip.read(info)
+
+    def etag(self, name, data):
+        info = self.index[name]
+        return '"%x-%x"' % (info.CRC, info.file_size)
+
+    def close(self):
+        self._zip.close()
+
+
+class DirectoryAssetBundle(AssetBundle):
+    """
+    Assets read from a directory, which is useful during development as changes to the
+    files are picked up on reload.
+    """
+
+    cache_control = "no-cache"
+
+    def __init__(self, root):
+        self.path = os.path.abspath(root)
+
+    def read(self, name):
+        path = os.path.join(self.path, *name.split("/"))
+        try:
+            with io.open(path, "rb") as asset:
+                return asset.read()
+        except (IOError, OSError):
+            raise KeyError(name)
+
+
+def open_bundle(source, prefix=""):
+    """
+    Returns an AssetBundle for source, which is a path to a zip archive or a directory, a
+    dictionary of asset names to contents, or an AssetBundle.
+    """
+    if isinstance(source, AssetBundle):
+        return source
+    elif isinstance(source, dict):
+        return MemoryAssetBundle(source)
+    elif isinstance(source, six.string_types) and os.path.isdir(source):
+        return DirectoryAssetBundle(os.path.join(source, prefix))
+    return ZipAssetBundle(source, prefix)
+
+
+def set_bundle(source, url_scheme=DEFAULT_SCHEME, prefix=""):
+    """
+    Sets the bundle the web UI is served from, see open_bundle, and the URL scheme used to
+    reach it. Must be called before the app creates its first WebUIView.
+    """
+    global bundle, scheme
+    bundle = open_bundle(source, prefix)
+    scheme = url_scheme
+    return bundle
+
+
+def get_bundle():
+    return bundle
+
+
+def get_url(path=INDEX):
+    """
+    Returns the URL of an asset in the bundle, e.g. app://bundle/index.html.
+    """
+    return "%s://%s/%s" % (scheme, HOST, path.lstrip("/"))
+
+
+def is_asset_url(url):
+    return bundle is not None and url.startswith(scheme + ":")
+
+
+def load_url(url):
+    """
+    Returns the Asset for an asset URL. Raises KeyError if it is not in the bundle.
+    """
+    if bundle is None:
+        raise KeyError(url)
+    path = url.split(":", 1)[1].split("?", 1)[0].split("#", 1)[0]
+    if path.startswith("//"):
+        # skip the host
+        path = "/" + path[2:].partition("/")[2]
+    # web views pass the URL as requested, so decode it before normalize_path resolves any ..
+    return bundle.load(unquote(path))
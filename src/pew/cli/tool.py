@@ -165,6 +165,11 @@ def run(args):
         if "ui_root" in info_json:
             ui_root = info_json["ui_root"]
 
+        # options after the platform are collected with the URL arguments
+        watch = args.watch or "--watch" in args.args
+        if "--watch" in args.args:
+            args.args.remove("--watch")
+
         url_args = ''
         if len(args.args) > 0:
             for arg in args.args:
@@ -183,7 +188,12 @@ def run(args):
             print("URL: %s" % url)
             print("If your browser does not open within a few seconds, copy and paste this URL to test.")
             webbrowser.open(url)
-        pew.start_local_server(os.path.dirname(ui_root), callback=open_browser)
+        if watch:
+            from pew.devserver import run_dev_server
+            watch_dirs = [os.path.dirname(ui_root)] + info_json.get("asset_dirs", [])
+            run_dev_server(os.path.dirname(ui_root), watch_dirs, pew.HOST, pew.PORT, callback=open_browser)
+        else:
+            pew.start_local_server(os.path.dirname(ui_root), callback=open_browser)
     else:
         run_python_script(controller.get_main_script_path(), args.args)
 
@@ -323,6 +333,7 @@ def main():
     run_opt = commands.add_parser('run', help="Run PyEverywhere project")
     run_opt.add_argument('platform', choices=platforms, nargs='?', default=get_default_platform(), help='Platform to run the project on. Choices are: %r' % (platforms,))
     run_opt.add_argument('--config', default=None, help='Specify a Python config file to use when running the app. For iOS and Android, this must be specified in the build step.')
+    run_opt.add_argument('--watch', action='store_true', help='For the browser platform, reload the page when files in the UI or asset directories change.')
     run_opt.add_argument('args', nargs=argparse.REMAINDER)
     run_opt.set_defaults(func=run)
 
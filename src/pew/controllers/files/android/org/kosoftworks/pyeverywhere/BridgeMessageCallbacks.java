@@ -0,0 +1,7 @@
+package org.kosoftworks.pyeverywhere;
+
+public interface BridgeMessageCallbacks
+{
+	// message is a JSON document or legacy message URL from nativebridge.js
+	public void receiveMessage(String message);
+}
@@ -0,0 +1,52 @@
+package org.kosoftworks.pyeverywhere;
+
+import android.util.Log;
+import android.webkit.JavascriptInterface;
+
+import java.util.concurrent.BlockingQueue;
+import java.util.concurrent.LinkedBlockingQueue;
+
+/**
+ * Exposed to the page as window.pewAndroid, through which nativebridge.js sends messages
+ * to Python without a navigation per message. Messages are queued and handed to Python on
+ * a background thread of their own, so neither the page nor the UI thread waits for them.
+ */
+public class PEWJavascriptInterface implements Runnable
+{
+	private static final String TAG = "PEWJavascriptInterface";
+
+	private final BlockingQueue<String> messages = new LinkedBlockingQueue<String>();
+	private final BridgeMessageCallbacks callbacks;
+
+	public PEWJavascriptInterface(BridgeMessageCallbacks c)
+	{
+		callbacks = c;
+		Thread thread = new Thread(this, "pew-bridge");
+		thread.setDaemon(true);
+		thread.start();
+	}
+
+	@JavascriptInterface
+	public void postMessage(String message)
+	{
+		messages.offer(message);
+	}
+
+	@Override
+	public void run()
+	{
+		while (true) {
+			String message;
+			try {
+				message = messages.take();
+			} catch (InterruptedException e) {
+				return;
+			}
+			try {
+				callbacks.receiveMessage(message);
+			} catch (Exception e) {
+				Log.e(TAG, "Error handling bridge message", e);
+			}
+		}
+	}
+}
@@ -0,0 +1,123 @@
+package org.kosoftworks.pyeverywhere;
+
+import android.os.Build;
+import android.webkit.ValueCallback;
+import android.webkit.WebView;
+
+import org.json.JSONObject;
+
+import java.util.ArrayList;
+import java.util.List;
+
+/**
+ * Queues scripts for a WebView and evaluates everything queued during a frame in one
+ * batch on the UI thread. Scripts can be added from any thread, so Python does not need
+ * to post a Runnable of its own for every script.
+ */
+public class PEWScriptQueue implements Runnable
+{
+	private static final int NO_RESULT = -1;
+
+	private final WebView webView;
+	private ScriptResultCallbacks callbacks = null;
+
+	private List<String> scripts = new ArrayList<String>();
+	private List<Integer> requestIds = new ArrayList<Integer>();
+	private boolean posted = false;
+
+	public PEWScriptQueue(WebView view)
+	{
+		webView = view;
+	}
+
+	public void setScriptResultCallbacks(ScriptResultCallbacks c)
+	{
+		callbacks = c;
+	}
+
+	public void evaluate(String script)
+	{
+		add(script, NO_RESULT);
+	}
+
+	public void evaluateWithResult(String script, int requestId)
+	{
+		add(script, requestId);
+	}
+
+	private synchronized void add(String script, int requestId)
+	{
+		scripts.add(script);
+		requestIds.add(requestId);
+		if (!posted) {
+			posted = true;
+			// run once per frame, however many scripts arrive before it
+			webView.postOnAnimation(this);
+		}
+	}
+
+	@Override
+	public void run()
+	{
+		List<String> batchScripts;
+		List<Integer> batchIds;
+		synchronized (this) {
+			batchScripts = scripts;
+			batchIds = requestIds;
+			scripts = new ArrayList<String>();
+			requestIds = new ArrayList<Integer>();
+			posted = false;
+		}
+
+		StringBuilder batch = new StringBuilder();
+		for (int i = 0; i < batchScripts.size(); i++) {
+			int requestId = batchIds.get(i);
+			if (requestId == NO_RESULT) {
+				// a failing script must not stop the rest of the batch, as in pew.js_queue
+				batch.append("try { ").append(batchScripts.get(i)).append(" } catch (e) { console.error(e); }\n");
+			} else {
+				// keep the order of scripts by sending the batch before each script with a result
+				flush(batch);
+				evaluateWithCallback(batchScripts.get(i), requestId);
+			}
+		}
+		flush(batch);
+	}
+
+	private void flush(StringBuilder batch)
+	{
+		if (batch.length() == 0) {
+			return;
+		}
+		String script = batch.toString();
+		batch.setLength(0);
+		if (Build.VERSION.SDK_INT >= 19) {
+			webView.evaluateJavascript(script, null);
+		} else {
+			webView.loadUrl("javascript:" + script);
+		}
+	}
+
+	private void evaluateWithCallback(String script, final int requestId)
+	{
+		if (Build.VERSION.SDK_INT < 19) {
+			reportResult(requestId, "{\"error\": \"evaluateJavascript requires API level 19\"}");
+			return;
+		}
+		String wrapped = "(function() { try { return {value: eval(" + JSONObject.quote(script) + ")}; }"
+			+ " catch (e) { return {error: String(e)}; } })()";
+		webView.evaluateJavascript(wrapped, new ValueCallback<String>() {
+			@Override
+			public void onReceiveValue(String value) {
+				reportResult(requestId, value);
+			}
+		});
+	}
+
+	private void reportResult(int requestId, String result)
+	{
+		if (callbacks != null) {
+			callbacks.onScriptResult(requestId, result);
+		}
+	}
+}
@@ -1,17 +1,55 @@
 package org.kosoftworks.pyeverywhere;
 
+import android.net.Uri;
+import android.os.Build;
+import android.text.TextUtils;
+import android.webkit.MimeTypeMap;
+import android.webkit.WebResourceRequest;
+import android.webkit.WebResourceResponse;
 import android.webkit.WebView;
 import android.webkit.WebViewClient;
 
-public class PEWebViewClient extends WebViewClient 
+import java.io.ByteArrayInputStream;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.zip.ZipEntry;
+import java.util.zip.ZipFile;
+
+public class PEWebViewClient extends WebViewClient
 {
 	private WebViewCallbacks callback;
 
+	// asset bundle served for URLs with assetScheme, see pew.assets
+	private String assetScheme = null;
+	private ZipFile assetZip = null;
+	private File assetDirectory = null;
+	private String assetPrefix = "";
+
 	public void setWebViewCallbacks(WebViewCallbacks c)
 	{
 		callback = c;
 	}
 
+	public void setAssetBundle(String scheme, String path, String prefix) throws IOException
+	{
+		File file = new File(path);
+		if (file.isDirectory()) {
+			assetDirectory = file;
+			assetZip = null;
+		} else {
+			assetZip = new ZipFile(file);
+			assetDirectory = null;
+		}
+		assetPrefix = prefix;
+		assetScheme = scheme;
+	}
+
 	@Override
 	public void onPageFinished(WebView view, String url) {
         callback.pageLoadComplete(view, url);
@@ -20,7 +58,112 @@ public class PEWebViewClient extends WebViewClient
 	@Override
 	public boolean shouldOverrideUrlLoading(WebView view, String url) {
 		return callback.shouldLoadURL(view, url);
-		
+
+	}
+
+	@Override
+	public WebResourceResponse shouldInterceptRequest(WebView view, WebResourceRequest request) {
+		return loadAsset(request.getUrl());
+	}
+
+	@Override
+	public WebResourceResponse shouldInterceptRequest(WebView view, String url) {
+		// used before API level 21
+		return loadAsset(Uri.parse(url));
+	}
+
+	private WebResourceResponse loadAsset(Uri uri)
+	{
+		if (assetScheme == null || !assetScheme.equals(uri.getScheme())) {
+			return null;
+		}
+
+		String name = assetName(uri.getPath());
+		Map<String, String> headers = new HashMap<String, String>();
+		headers.put("Access-Control-Allow-Origin", "*");
+		try {
+			InputStream stream = null;
+			if (assetZip != null) {
+				ZipEntry entry = assetZip.getEntry(assetPrefix + name);
+				if (entry != null) {
+					stream = assetZip.getInputStream(entry);
+				}
+				// zip bundles do not change while the app runs
+				headers.put("Cache-Control", "max-age=31536000, immutable");
+			} else {
+				File file = new File(assetDirectory, name);
+				if (file.isFile()) {
+					stream = new FileInputStream(file);
+				}
+				headers.put("Cache-Control", "no-cache");
+			}
+
+			if (stream == null) {
+				return errorResponse(404, "Not Found", headers);
+			}
+
+			String mimeType = mimeType(name);
+			String encoding = mimeType.startsWith("text/") || mimeType.equals("application/javascript") ? "utf-8" : null;
+			if (Build.VERSION.SDK_INT >= 21) {
+				return new WebResourceResponse(mimeType, encoding, 200, "OK", headers, stream);
+			}
+			return new WebResourceResponse(mimeType, encoding, stream);
+		} catch (IOException e) {
+			return errorResponse(500, "Internal Server Error", headers);
+		}
+	}
+
+	private WebResourceResponse errorResponse(int status, String reason, Map<String, String> headers)
+	{
+		if (Build.VERSION.SDK_INT < 21) {
+			return null;
+		}
+		return new WebResourceResponse("text/plain", "utf-8", status, reason, headers,
+			new ByteArrayInputStream(new byte[0]));
+	}
+
+	private static String assetName(String path)
+	{
+		// resolve . and .. so that requests cannot leave the bundle
+		List<String> parts = new ArrayList<String>();
+		if (path == null) {
+			path = "";
+		}
+		for (String part : path.split("/")) {
+			if (part.isEmpty() || part.equals(".")) {
+				continue;
+			} else if (part.equals("..")) {
+				if (!parts.isEmpty()) {
+					parts.remove(parts.size() - 1);
+				}
+			} else {
+				parts.add(part);
+			}
+		}
+		if (path.isEmpty() || path.endsWith("/")) {
+			parts.add("index.html");
+		}
+		return TextUtils.join("/", parts);
+	}
+
+	private static String mimeType(String name)
+	{
+		String extension = MimeTypeMap.getFileExtensionFromUrl(name).toLowerCase();
+		if (extension.equals("js") || extension.equals("mjs")) {
+			return "application/javascript";
+		} else if (extension.equals("css")) {
+			return "text/css";
+		} else if (extension.equals("html") || extension.equals("htm")) {
+			return "text/html";
+		} else if (extension.equals("json")) {
+			return "application/json";
+		} else if (extension.equals("wasm")) {
+			return "application/wasm";
+		} else if (extension.equals("svg")) {
+			return "image/svg+xml";
+		}
+		String mimeType = MimeTypeMap.getSingleton().getMimeTypeFromExtension(extension);
+		return mimeType != null ? mimeType : "application/octet-stream";
 	}
 
-}
\ No newline at end of file
+}
@@ -0,0 +1,7 @@
+package org.kosoftworks.pyeverywhere;
+
+public interface ScriptResultCallbacks
+{
+	// result is a JSON object with the script's value, or with an error if it threw
+	public void onScriptResult(int requestId, String result);
+}
@@ -0,0 +1,163 @@
+"""
+A development server that reloads the web UI in the browser when its files change, used by
+`pew run browser --watch`. Requires Python 3.5 or later.
+
+DevServer is an AppServer that watches the UI's directories with pew.watcher. Every HTML
+page it serves loads a small script which listens on the server's event stream. When only
+stylesheets change, the script swaps them in place without reloading the page, so the UI
+keeps its state; any other change reloads the page.
+"""
+
+import asyncio
+import logging
+import os
+
+from six.moves.urllib.parse import urlsplit
+
+from . import aio
+from .app_server import AppServer
+from .watcher import FileWatcher
+
+# served under the server's bridge_path, so that only pages knowing the token can listen
+CLIENT_NAME = "livereload.js"
+
+CLIENT_SCRIPT = b"""(function() {
+    // reloads the page or its stylesheets when files change, see pew.devserver
+    function reloadStylesheets(paths) {
+        var links = document.querySelectorAll('link[rel="stylesheet"]');
+        var reloaded = {};
+        for (var i = 0; i < links.length; i++) {
+            var url = new URL(links[i].href);
+            if (url.host === location.host && paths.indexOf(url.pathname) !== -1) {
+                url.searchParams.set("_reload", Date.now());
+                links[i].href = url.toString();
+                reloaded[url.pathname] = true;
+            }
+        }
+        // stylesheets that are not linked directly, e.g. imported ones, need a full reload
+        return Object.keys(reloaded).length === paths.length;
+    }
+
+    var connected = false;
+    // the event stream is next to this script, under the server's bridge path
+    var source = new EventSource(new URL("events", document.currentScript.src).toString());
+    source.onopen = function() {
+        // files may have changed while the server was restarting
+        if (connected) {
+            location.reload();
+        }
+        connected = true;
+    };
+    source.onmessage = function(event) {
+        var message = JSON.parse(event.data);
+        if (message.reload || (message.css && !reloadStylesheets(message.css))) {
+            location.reload();
+        }
+    };
+})();
+"""
+
+class DevServer(AppServer):
+    """
+    Serves the web UI in root and pushes reloads to browsers showing it when files in
+    watch_paths change.
+
+    :param watch_paths: directories to watch, defaults to root
+    :param debounce: seconds to wait for a burst of changes to finish, see FileWatcher
+    """
+
+    def __init__(self, root, watch_paths=None, host="127.0.0.1", port=0, debounce=0.1, **kwargs):
+        super(DevServer, self).__init__(root, None, host, port, **kwargs)
+        self.root = os.path.abspath(root)
+        self.watcher = FileWatcher(watch_paths or [root], self.files_changed, debounce=debounce)
+
+    async def start_serving(self):
+        url = await super(DevServer, self).start_serving()
+        self.watcher.start()
+        return url
+
+    def stop(self):
+        self.watcher.stop()
+        super(DevServer, self).stop()
+
+    @property
+    def client_path(self):
+        """
+        The path of the script that reloads pages.
+        """
+        return self.bridge_path + CLIENT_NAME
+
+    def files_changed(self, paths):
+        """
+        Tells the connected browsers to swap the changed stylesheets, or to reload the page
+        if anything else changed.
+        """
+        stylesheets = []
+        for path in paths:
+            relative = os.path.relpath(path, self.root)
+            if not path.endswith(".css") or relative.startswith(os.pardir) or not os.path.exists(path):
+                logging.info("%s changed, reloading the page" % path)
+                self.clients.send({"reload": True})
+                return
+            stylesheets.append("/" + relative.replace(os.sep, "/"))
+
+        logging.info("Reloading stylesheets %s" % ", ".join(stylesheets))
+        self.clients.send({"css": stylesheets})
+
+    async def _handle_request(self, method, target, headers, body, reader, writer):
+        if urlsplit(target).path == self.client_path:
+            await self._send(writer, 200, [
+                ("Content-Type", "application/javascript; charset=utf-8"),
+                ("Content-Length", str(len(CLIENT_SCRIPT))),
+                ("Cache-Control", "no-cache"),
+            ], CLIENT_SCRIPT if method != "HEAD" else b"")
+            return False
+        return await super(DevServer, self)._handle_request(method, target, headers, body, reader, writer)
+
+    async def _respond_file(self, target, headers):
+        response = await super(DevServer, self)._respond_file(target, headers)
+        response_headers = dict(response.headers)
+        if (response.status != 200 or "Content-Encoding" in response_headers
+                or not response_headers.get("Content-Type", "").startswith("text/html")):
+            return response
+
+        data = response.data
+        if data is None:
+            try:
+                data = await self.loop.run_in_executor(None, response.content.read)
+            finally:
+                response.content.close()
+        data = bytes(data)
+
+        # load the reload script from every page
+        end = data.lower().rfind(b"</body>")
+        if end == -1:
+            end = len(data)
+        script_tag = b'<script src="' + self.client_path.encode("ascii") + b'"></script>'
+        data = data[:end] + script_tag + data[end:]
+        response_headers = [(name, str(len(data)) if name == "Content-Length" else value)
+                            for name, value in response.headers]
+        return response._replace(headers=response_headers, data=data, content=None, start=0, count=len(data))
+
+
+def run_dev_server(root, watch_paths=None, host="127.0.0.1", port=0, callback=None, **kwargs):
+    """
+    Runs a DevServer on an event loop in the calling thread until interrupted. callback is
+    called with the server's URL once it is listening. Other keyword arguments are passed
+    to DevServer.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    aio.set_event_loop(loop)
+    server = DevServer(root, watch_paths, host, port, **kwargs)
+    try:
+        url = loop.run_until_complete(server.start_serving())
+        if callback:
+            loop.run_in_executor(None, callback, url)
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.watcher.stop()
+        loop.close()
+        aio.set_event_loop(None)
@@ -0,0 +1,179 @@
+"""
+Routing of JavaScript bridge messages to Python delegate methods.
+
+Each message name is resolved to a callable once and the result is cached, so
+dispatching a message is a dictionary lookup rather than a string build and eval.
+Names that cannot be resolved are remembered as well, so that a UI repeatedly
+sending an unknown message does not pay for the attribute lookups each time.
+"""
+
+import logging
+import threading
+
+ROUTES_ATTR = '_pew_routes'
+BACKGROUND_ATTR = '_pew_background'
+
+
+def route(*names):
+    """
+    Decorator that registers a delegate method as the handler for one or more bridge
+    messages. If no names are given, the method's own name is used.
+
+    Example:
+        class AppDelegate(object):
+            @pew.dispatch.route('user/save', 'user/update')
+            def save_user(self, user):
+                ...
+    """
+    def decorator(func):
+        routes = list(getattr(func, ROUTES_ATTR, []))
+        routes.extend(names or [func.__name__])
+        setattr(func, ROUTES_ATTR, routes)
+        return func
+
+    # support using @route without parentheses
+    if len(names) == 1 and callable(names[0]):
+        func = names[0]
+        names = ()
+        return decorator(func)
+
+    return decorator
+
+
+def background(func):
+    """
+    Decorator that marks a delegate method to be run on a background worker thread instead of
+    the UI thread, so that slow methods do not freeze the window. The method's return value
+    or exception is sent back to the JavaScript caller.
+
+    Background methods must not touch native UI objects directly, use run_on_main_thread or
+    WebUIView.call_js_function for that.
+
+    Example:
+        class AppDelegate(object):
+            @pew.background
+            def search(self, query):
+                return database.search(query)
+    """
+    setattr(func, BACKGROUND_ATTR, True)
+    return func
+
+
+def normalize_route(name):
+    """
+    Converts a message name into its canonical route form, e.g. 'user/save' -> 'user.save'.
+    """
+    return name.strip("/").replace("/", ".")
+
+
+class MessageDispatcher(object):
+    """
+    Resolves bridge message names to callables on a target object and caches the results.
+
+    Routes registered with the `route` decorator on the target's class, or via `register`,
+    take priority. Other names are resolved as (possibly dotted) public attribute paths on
+    the target, matching the behavior of earlier versions of PyEverywhere.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._routes = {}
+        self._resolved = {}
+        self._missing = set()
+        self._background = set()
+        self._lock = threading.Lock()
+        self._register_decorated_routes()
+
+    def _register_decorated_routes(self):
+        if self.target is None:
+            return
+
+        for attr_name in dir(type(self.target)):
+            func = getattr(type(self.target), attr_name, None)
+            routes = getattr(func, ROUTES_ATTR, None)
+            if not routes:
+                continue
+            bound = getattr(self.target, attr_name)
+            for name in routes:
+                self._routes[normalize_route(name)] = bound
+
+    def register(self, name, func, background=False):
+        """
+        Registers func as the handler for message name, replacing any existing handler.
+        If background is True, func is run on a worker thread, see the background decorator.
+        """
+        with self._lock:
+            name = normalize_route(name)
+            self._routes[name] = func
+            self._resolved.pop(name, None)
+            self._missing.discard(name)
+            if background:
+                self._background.add(name)
+            else:
+                self._background.discard(name)
+
+    def is_background(self, name, func):
+        """
+        Returns True if func, the handler for message name, should run on a worker thread.
+        """
+        return getattr(func, BACKGROUND_ATTR, False) or normalize_route(name) in self._background
+
+    def invalidate(self):
+        """
+        Clears the cached lookups, e.g. after attributes of the target have been replaced.
+        Explicitly registered routes are kept.
+        """
+        with self._lock:
+            self._resolved.clear()
+            self._missing.clear()
+
+    def _lookup(self, name):
+        if self.target is None:
+            return None
+
+        obj = self.target
+        for part in name.split("."):
+            # never expose private or special attributes to messages coming from the web UI
+            if not part or part.startswith("_"):
+                return None
+            obj = getattr(obj, part, None)
+            if obj is None:
+                return None
+
+        if not callable(obj):
+            return None
+
+        return obj
+
+    def resolve(self, name):
+        """
+        Returns the callable for message name, or None if the target does not handle it.
+        """
+        name = normalize_route(name)
+        func = self._routes.get(name) or self._resolved.get(name)
+        if func is not None:
+            return func
+
+        if name in self._missing:
+            return None
+
+        with self._lock:
+            func = self._lookup(name)
+            if func is None:
+                self._missing.add(name)
+                logging.warning("No delegate method found for message '%s'", name)
+                return None
+
+            self._resolved[name] = func
+            return func
+
+    def dispatch(self, name, args=(), kwargs=None):
+        """
+        Calls the handler for message name with the given arguments and returns its result.
+        Raises KeyError if no handler exists.
+        """
+        func = self.resolve(name)
+        if func is None:
+            raise KeyError(name)
+        return func(*args, **(kwargs or {}))
+
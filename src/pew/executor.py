@@ -0,0 +1,211 @@
+"""
+A pool of worker threads for running delegate methods off the UI thread, a task loop
+for backends whose Python main thread only waits for work, and a shared timer thread.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+from .native import get_native
+from .pending import PendingResult
+
+# timers must not be moved by changes to the wall clock, e.g. a network time sync
+clock = getattr(time, "monotonic", time.time)
+
+
+class WorkerPool(object):
+    """
+    Runs submitted functions on up to max_workers threads. Threads are started the first
+    time they are needed, using the native backend's PEWThread when one is loaded.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._tasks = queue.Queue()
+        self._workers = []
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def _run_tasks(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            task = self._tasks.get()
+            with self._lock:
+                self._idle -= 1
+            if task is None:
+                break
+
+            result, func, args, kwargs = task
+            try:
+                result.set_result(func(*args, **kwargs))
+            except Exception as e:
+                import traceback
+                e.traceback = traceback.format_exc()
+                result.set_result(error=e)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) on a worker thread. Returns a PendingResult for its result.
+        """
+        result = PendingResult(None)
+        self._tasks.put((result, func, args, kwargs))
+
+        with self._lock:
+            start_worker = self._idle == 0 and len(self._workers) < self.max_workers
+            if start_worker:
+                thread = get_native("PEWThread", threading.Thread)(target=self._run_tasks)
+                thread.daemon = True
+                self._workers.append(thread)
+
+        if start_worker:
+            thread.start()
+        return result
+
+    def shutdown(self):
+        """
+        Stops the worker threads once the queued functions have run.
+        """
+        with self._lock:
+            workers = self._workers
+            self._workers = []
+        for worker in workers:
+            self._tasks.put(None)
+
+
+class TimerHandle(object):
+    """
+    A call scheduled with TaskLoop.call_later.
+    """
+
+    def __init__(self, due, func, args, kwargs):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TaskLoop(object):
+    """
+    Runs queued tasks and timers on the thread that calls run. The thread sleeps until a
+    task is queued or a timer is due, so an idle loop does not wake the CPU. Tasks can be
+    queued from any thread.
+    """
+
+    def __init__(self):
+        self._tasks = []
+        self._timers = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._stopped = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def call_soon(self, func, *args, **kwargs):
+        """
+        Queues func(*args, **kwargs) to run on the loop's thread.
+        """
+        with self._condition:
+            self._tasks.append((func, args, kwargs))
+            self._condition.notify()
+
+    def call_later(self, delay, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) on the loop's thread after delay seconds. Returns a
+        TimerHandle whose cancel method stops the call.
+        """
+        timer = TimerHandle(clock() + delay, func, args, kwargs)
+        with self._condition:
+            heapq.heappush(self._timers, (timer.due, next(self._counter), timer))
+            self._condition.notify()
+        return timer
+
+    def stop(self):
+        """
+        Makes run return after the tasks it is running. Tasks still queued are dropped.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _next_tasks(self, block=True):
+        with self._condition:
+            while True:
+                if self._stopped and block:
+                    return None
+                tasks = self._tasks
+                self._tasks = []
+                now = clock()
+                while self._timers and self._timers[0][0] <= now:
+                    timer = heapq.heappop(self._timers)[2]
+                    if not timer.cancelled:
+                        tasks.append((timer.func, timer.args, timer.kwargs))
+                if tasks or not block:
+                    return tasks
+
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._condition.wait(timeout)
+
+    def _run_tasks(self, tasks):
+        for func, args, kwargs in tasks:
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                import traceback
+                logging.error(traceback.format_exc())
+
+    def run_pending(self):
+        """
+        Runs the queued tasks and due timers on the calling thread without waiting for more.
+        Returns the number of tasks run.
+        """
+        tasks = self._next_tasks(block=False)
+        self._run_tasks(tasks)
+        return len(tasks)
+
+    def run(self):
+        """
+        Runs tasks until stop is called.
+        """
+        self._running = True
+        try:
+            while True:
+                tasks = self._next_tasks()
+                if tasks is None:
+                    break
+                self._run_tasks(tasks)
+        finally:
+            with self._condition:
+                self._running = False
+                self._stopped = False
+
+
+_timers = None
+_timers_lock = threading.Lock()
+
+
+def call_later(delay, func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) after delay seconds on a single background thread shared by
+    all timers, e.g. request timeouts. Returns a TimerHandle whose cancel method stops the call.
+    """
+    global _timers
+    with _timers_lock:
+        if _timers is None:
+            _timers = TaskLoop()
+            thread = get_native("PEWThread", threading.Thread)(target=_timers.run)
+            thread.daemon = True
+            thread.start()
+    return _timers.call_later(delay, func, *args, **kwargs)
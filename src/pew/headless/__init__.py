@@ -0,0 +1,70 @@
+"""
+A headless backend with no window or browser engine, for running the bridge, delegates
+and functional tests on machines without a display, such as CI build agents.
+
+The main loop is a pew.executor.TaskLoop and the web view records the scripts it is asked
+to evaluate, see NativeWebView. Give a web view a js_engine, such as
+pew.headless.bridge.NativeBridgeStub, to answer scripts like nativebridge.js would.
+
+It is only used when asked for, by listing "headless" in pew.options.preferred_platforms
+or in the PEW_PREFERRED_PLATFORMS environment variable before pew.ui is imported.
+"""
+
+import warnings
+
+from ..executor import TaskLoop
+
+app = None
+
+# runs the work that other backends hand to their native main loop
+main_loop = TaskLoop()
+
+
+def run_on_main_thread(func, *args, **kwargs):
+    main_loop.call_soon(func, *args, **kwargs)
+
+
+def choose_file(callback):
+    warnings.warn(
+        "choose_file is deprecated, use show_open_file_dialog instead. choose_file will be removed in v1.0",
+        DeprecationWarning
+    )
+    return show_open_file_dialog(callback)
+
+
+def show_open_file_dialog(callback, options=dict()):
+    # there is nobody to pick a file, so behave as if the dialog was cancelled
+    run_on_main_thread(callback, None)
+
+
+def show_save_file_dialog(options, callback):
+    run_on_main_thread(callback, None)
+
+
+def get_app():
+    return app
+
+
+def set_fullscreen():
+    if app and hasattr(app, 'webview'):
+        app.webview.set_fullscreen()
+
+
+class NativePEWApp(object):
+    def __init__(self):
+        global app
+        app = self
+
+    def run(self):
+        """
+        Initializes the UI and runs the main loop on the calling thread until shutdown.
+        """
+        main_loop.call_soon(self.setUp)
+        main_loop.run()
+
+    def shutdown(self):
+        main_loop.stop()
+
+
+from .menus import *
+from .webview import *
@@ -0,0 +1,132 @@
+"""
+A stand-in for nativebridge.js that runs in Python, so the bridge can be exercised in the
+headless backend without a browser engine.
+"""
+
+import ast
+import json
+import logging
+import re
+
+from ..pending import JavaScriptError, PendingRequests
+
+# the wrapper pew.js_queue.JSCallQueue puts around each call in a batch
+TRY_PATTERN = re.compile(r"^try \{ (.*) \} catch \(e\) \{ console\.error\(e\); \}$", re.DOTALL)
+CALL_PATTERN = re.compile(r"^([A-Za-z_$][\w$.]*)\((.*)\)$", re.DOTALL)
+
+
+class NativeBridgeStub(object):
+    """
+    Answers the scripts Python sends to the web UI the way nativebridge.js would. Scripts
+    are limited to function calls with JSON-like arguments and to the names in values.
+
+    Calls to functions other than the bridge's own are recorded in calls and, if registered
+    in functions, passed on to them. JS calls to Python are simulated with call and notify.
+
+    :param webview: the headless web view to answer scripts for, whose js_engine is set to this stub
+    :param values: maps JS expressions to the values get_js_value receives for them
+    :param functions: maps JS function names to Python functions called with their arguments
+    """
+
+    def __init__(self, webview, values=None, functions=None):
+        self.webview = webview
+        self.values = dict(values or {})
+        self.functions = dict(functions or {})
+        self.calls = []
+        self.protocol = None
+        self.pending_calls = PendingRequests()
+        webview.js_engine = self
+
+    def __call__(self, js):
+        result = None
+        for statement in self._split_statements(js):
+            result = self.evaluate_statement(statement)
+        return result
+
+    def _split_statements(self, js):
+        lines = [line.strip() for line in js.strip().splitlines()]
+        matches = [TRY_PATTERN.match(line) for line in lines]
+        if lines and all(matches):
+            return [match.group(1).strip().rstrip(";") for match in matches]
+        return [js.strip().rstrip(";")]
+
+    def evaluate_statement(self, statement):
+        """
+        Evaluates a single call or expression and returns its value.
+        """
+        match = CALL_PATTERN.match(statement)
+        if match is None:
+            if statement in self.values:
+                return self.values[statement]
+            raise JavaScriptError("ReferenceError: %s is not defined" % statement)
+
+        name = match.group(1)
+        args = parse_arguments(match.group(2))
+        if name == "bridge.receiveMessage":
+            self.receive_message(args[0])
+        elif name == "bridge.getJSValue":
+            self.send_js_value(*args)
+        elif name == "bridge.setProtocol":
+            self.protocol = args[0]
+        else:
+            self.calls.append((name, args))
+            if name in self.functions:
+                return self.functions[name](*args)
+        return None
+
+    def receive_message(self, message):
+        if "reply" in message:
+            error = message.get("error")
+            if error:
+                error = JavaScriptError("%s: %s" % (error["type"], error["message"]))
+            self.pending_calls.resolve(message["reply"], message.get("value"), error or None)
+        if "eval" in message:
+            self(message["eval"])
+        if "call" in message:
+            self.evaluate_statement("%s(%s)" % (message["call"], json.dumps(message.get("args", []))[1:-1]))
+
+    def send_js_value(self, variable, request_id):
+        self.post_message("js_value_result", [request_id, {"value": self.values.get(variable)}])
+
+    def call(self, name, *args):
+        """
+        Calls a Python delegate method like bridge.call does. Returns a
+        pew.pending.PendingResult, which is set once the result has been sent back.
+        """
+        pending = self.pending_calls.create()
+        self.post_message(name, list(args), pending.request_id)
+        return pending
+
+    def notify(self, name, *args):
+        """
+        Sends a message to Python without waiting for a result.
+        """
+        self.post_message(name, list(args))
+
+    def post_message(self, name, args, call_id=None):
+        message = {"name": name, "args": args}
+        if call_id is not None:
+            message["id"] = call_id
+        self.webview.webview_did_receive_message(self.webview, json.dumps(message))
+
+
+def parse_arguments(text):
+    """
+    Parses the arguments of a JS function call. Arguments that are neither JSON nor Python
+    literals, e.g. JS expressions, are returned as a single string.
+    """
+    text = text.strip()
+    if not text:
+        return []
+
+    try:
+        return json.loads("[%s]" % text)
+    except ValueError:
+        pass
+
+    # call_js_function quotes strings with single quotes
+    try:
+        return list(ast.literal_eval("(%s,)" % text))
+    except (ValueError, SyntaxError):
+        logging.debug("Could not parse JavaScript arguments: %s", text)
+        return [text]
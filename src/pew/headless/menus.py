@@ -0,0 +1,10 @@
+from ..menus import PEWMenuBase
+from ..menus import PEWMenuBarBase
+from ..menus import PEWMenuItemBase
+from ..menus import PEWShortcut
+
+
+# there is no window to show menus in, so use these stub classes for cross-platform code
+PEWMenu = PEWMenuBase
+PEWMenuBar = PEWMenuBarBase
+PEWMenuItem = PEWMenuItemBase
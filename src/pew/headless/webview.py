@@ -0,0 +1,139 @@
+import collections
+import logging
+import threading
+
+from ..interfaces import WebViewInterface
+from ..pending import JavaScriptError
+from . import run_on_main_thread
+
+
+PEWThread = threading.Thread
+
+
+class NativeWebView(WebViewInterface):
+    """
+    A web view without a browser engine. Scripts passed to evaluate_javascript are counted
+    and the most recent max_recorded_scripts are kept in scripts, so tests and benchmarks
+    can check what the UI would have been sent.
+
+    If js_engine is set, scripts are also passed to js_engine(js), whose return value or
+    exception becomes the result of the script, see pew.headless.bridge.
+    """
+
+    max_recorded_scripts = 10000
+
+    def __init__(self, name="WebView", size=(1024, 768)):
+        self.title = name
+        self.size = size
+        self.js_engine = None
+        self.scripts = collections.deque(maxlen=self.max_recorded_scripts)
+        self.script_count = 0
+        self.visible = False
+        self.fullscreen = False
+        self.zoom_level = 2
+        self.user_agent = "PyEverywhere Headless"
+        self.url = None
+        self.history = []
+        self.history_index = -1
+        self.menubar = None
+
+    @property
+    def javascript_results(self):
+        # only an engine can produce results, otherwise values are requested through the bridge
+        return self.js_engine is not None
+
+    def show(self):
+        self.visible = True
+
+    def close(self):
+        self.visible = False
+        self.shutdown()
+
+    def set_fullscreen(self, enable=True):
+        self.fullscreen = enable
+
+    def set_window_title(self, title):
+        self.title = title
+
+    def set_menubar(self, menubar):
+        self.menubar = menubar
+
+    def get_user_agent(self):
+        return self.user_agent
+
+    def set_user_agent(self, user_agent):
+        self.user_agent = user_agent
+
+    def get_zoom_level(self):
+        return self.zoom_level
+
+    def set_zoom_level(self, zoom):
+        self.zoom_level = zoom
+
+    def present_window(self):
+        self.visible = True
+
+    def load_url(self, url):
+        run_on_main_thread(self._navigate, url)
+
+    def _navigate(self, url, history_index=None):
+        """
+        Loads url unless the delegate vetoes it. Accepted loads of new URLs are added to the
+        history, loads from the history move to history_index.
+        """
+        if not self.webview_should_start_load(self, url, None):
+            return
+        if history_index is None:
+            self.history = self.history[:self.history_index + 1] + [url]
+            self.history_index = len(self.history) - 1
+        else:
+            self.history_index = history_index
+        self.url = url
+        self.webview_did_finish_load(self, url)
+
+    def reload(self):
+        if self.url is not None:
+            run_on_main_thread(self._navigate, self.url, self.history_index)
+
+    def go_back(self):
+        if self.history_index > 0:
+            self._load_history(self.history_index - 1)
+
+    def go_forward(self):
+        if self.history_index < len(self.history) - 1:
+            self._load_history(self.history_index + 1)
+
+    def _load_history(self, index):
+        run_on_main_thread(self._navigate, self.history[index], index)
+
+    def clear_history(self):
+        self.history = self.history[self.history_index:self.history_index + 1]
+        self.history_index = len(self.history) - 1
+
+    def get_url(self):
+        return self.url
+
+    def evaluate_javascript(self, js, callback=None):
+        """
+        Records js and passes it to js_engine, if set. If callback is set, it is called as
+        callback(value, error) with the engine's result.
+        """
+        self.scripts.append(js)
+        self.script_count += 1
+        if self.js_engine is None:
+            if callback is not None:
+                callback(None, None)
+            return
+
+        try:
+            value = self.js_engine(js)
+        except Exception as e:
+            if callback is None:
+                logging.warning("Error evaluating JavaScript: %s", e)
+                return
+            if not isinstance(e, JavaScriptError):
+                e = JavaScriptError(str(e))
+            callback(None, e)
+        else:
+            if callback is not None:
+                callback(value, None)
@@ -0,0 +1,129 @@
+"""
+Batching of Python -> JavaScript calls.
+
+Every call to evaluate_javascript costs a round trip into the browser engine, e.g. a
+Runnable posted to the UI thread on Android or a separate IPC message on GTK. The
+JSCallQueue buffers calls and sends them to the web view as a single script, either
+at the end of the current main loop iteration or after a fixed interval.
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+clock = getattr(time, "monotonic", time.time)
+
+
+class JSCallQueue(object):
+    """
+    Buffers JavaScript snippets and evaluates them together as one script.
+
+    :param evaluate: function that evaluates a script in the web view
+    :param schedule: function that runs a callable on the main thread at the end of the
+                     current main loop iteration, e.g. run_on_main_thread
+    :param interval: seconds to wait before flushing, or None to flush on the next main
+                     loop iteration
+    :param coalesce: True to only keep the most recent call for each JS function, or a
+                     collection of function names to limit coalescing to those functions
+    """
+
+    def __init__(self, evaluate, schedule, interval=0.016, coalesce=False):
+        self.evaluate = evaluate
+        self.schedule = schedule
+        self.interval = interval
+        self.coalesce = coalesce
+        self._pending = collections.OrderedDict()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._flush_scheduled = False
+        # deadline of the next interval flush, waited for by a single long-lived flusher thread
+        self._flush_due = None
+        self._flusher = None
+        self._closed = False
+
+    def _should_coalesce(self, function_name):
+        if self.coalesce is True:
+            return True
+        return bool(self.coalesce) and function_name in self.coalesce
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, function_name, js):
+        """
+        Queues the js snippet, which calls function_name, for the next flush.
+        """
+        if self._should_coalesce(function_name):
+            key = function_name
+        else:
+            key = next(self._counter)
+
+        with self._lock:
+            # re-insert so that a superseding call runs after the calls queued before it
+            self._pending.pop(key, None)
+            self._pending[key] = js
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+
+            if self.interval and not self._closed:
+                self._flush_due = clock() + self.interval
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._run_flusher, name="JSCallQueue")
+                    self._flusher.daemon = True
+                    self._flusher.start()
+                self._condition.notify()
+                return
+
+        self.schedule(self.flush)
+
+    def _run_flusher(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._flush_due is None:
+                        self._condition.wait()
+                        continue
+                    remaining = self._flush_due - clock()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+                self._flush_due = None
+
+            self.schedule(self.flush)
+
+    def close(self):
+        """
+        Evaluates all pending calls and stops the flusher thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+    def get_script(self):
+        """
+        Removes all pending calls from the queue and returns them as a single script.
+        Each call is isolated so that an exception in one does not prevent the rest from running.
+        """
+        with self._lock:
+            snippets = list(self._pending.values())
+            self._pending.clear()
+            self._flush_scheduled = False
+
+        if len(snippets) == 1:
+            return snippets[0]
+
+        return "\n".join("try { %s } catch (e) { console.error(e); }" % js for js in snippets)
+
+    def flush(self):
+        """
+        Evaluates all pending calls immediately.
+        """
+        script = self.get_script()
+        if script:
+            self.evaluate(script)
@@ -1,7 +1,7 @@
 import logging
-import time
 import urllib
 
+from ..executor import TaskLoop
 from .runnable import run_on_ui_thread
 
 
@@ -11,6 +11,9 @@ def run_on_main_thread(func, *args, **kwargs):
 
 app = None
 
+# runs Python-side work on the app's main thread, which otherwise only waits for the UI to exit
+main_loop = TaskLoop()
+
 
 def get_app():
     return app
@@ -30,8 +33,7 @@ class NativePEWApp(object):
 
     def run(self):
         self.build()
-        while True:
-            time.sleep(0.05)
+        main_loop.run()
 
     def shutdown(self):
         pass  # I don't think this is supported natively with Kivy
@@ -44,6 +46,7 @@ class NativePEWApp(object):
     def on_stop(self):
         logging.info("on_stop called...")
         self.shutdown()
+        main_loop.stop()
 
     def on_resume(self):
         # Here you can check if any data needs replacing (usually nothing)
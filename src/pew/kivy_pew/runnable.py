@@ -2,46 +2,117 @@
 Runnable
 ========
 
+Calls Python functions on the Android UI thread. All calls go through a single
+long-lived Java Runnable, which runs every call queued since it was last posted, so no
+Java proxy object is created per call.
 '''
 
+import collections
+import threading
+
 from jnius import PythonJavaClass, java_method, autoclass
 
+from pew.pending import PendingResult
+
 # reference to the activity
 _PythonActivity = autoclass('org.kivy.android.PythonActivity')
+_Looper = autoclass('android.os.Looper')
 
 
-class Runnable(PythonJavaClass):
-    '''Wrapper around Java Runnable class. This class can be used to schedule a
-    call of a Python function into the PythonActivity thread.
+class UIThreadDispatcher(PythonJavaClass):
+    '''The Java Runnable that drains the queue of pending calls on the UI thread. It is
+    posted at most once at a time, however many calls are queued.
     '''
 
     __javainterfaces__ = ['java/lang/Runnable']
-    __runnables__ = []
 
-    def __init__(self, func):
-        super(Runnable, self).__init__()
-        self.func = func
+    def __init__(self):
+        super(UIThreadDispatcher, self).__init__()
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+        self.posted = False
 
-    def __call__(self, *args, **kwargs):
-        self.args = args
-        self.kwargs = kwargs
-        Runnable.__runnables__.append(self)
+    def post(self, func, args, kwargs, result=None):
+        self.pending.append((func, args, kwargs, result))
+        with self.lock:
+            if self.posted:
+                return
+            self.posted = True
         _PythonActivity.mActivity.runOnUiThread(self)
 
     @java_method('()V')
     def run(self):
-        try:
-            self.func(*self.args, **self.kwargs)
-        except:
+        with self.lock:
+            self.posted = False
+
+        # calls queued while draining wait for the next run, so the UI thread is not starved
+        for _ in range(len(self.pending)):
+            func, args, kwargs, result = self.pending.popleft()
+            call(func, args, kwargs, result)
+
+
+def call(func, args, kwargs, result=None):
+    try:
+        value = func(*args, **kwargs)
+    except Exception as e:
+        if result is None:
             import traceback
             traceback.print_exc()
+        else:
+            result.set_result(error=e)
+    else:
+        if result is not None:
+            result.set_result(value)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = UIThreadDispatcher()
+        return _dispatcher
+
 
-        Runnable.__runnables__.remove(self)
+def is_ui_thread():
+    return _Looper.myLooper() == _Looper.getMainLooper()
 
-def run_on_ui_thread(f):
-    '''Decorator to create automatically a :class:`Runnable` object with the
-    function. The function will be delayed and call into the Activity thread.
+
+class Runnable(object):
+    '''Wrapper around a function, which is called on the PythonActivity UI thread each time
+    the Runnable is called.
     '''
+
+    def __init__(self, func, wait=False):
+        self.func = func
+        self.wait = wait
+
+    def __call__(self, *args, **kwargs):
+        result = PendingResult(None) if self.wait else None
+        if self.wait and is_ui_thread():
+            # waiting for a call queued behind ourselves would never finish
+            call(self.func, args, kwargs, result)
+        else:
+            get_dispatcher().post(self.func, args, kwargs, result)
+        return result
+
+
+def run_on_ui_thread(f=None, wait=False):
+    '''Decorator to call the function in the Activity thread. The call is queued and the
+    decorated function returns immediately.
+
+    With wait=True, the decorated function returns a pew.pending.PendingResult instead,
+    whose wait(timeout) method returns the function's return value or raises its exception.
+    Calls made on the UI thread run immediately.
+    '''
+    if f is None:
+        return lambda f: run_on_ui_thread(f, wait)
+
+    runnable = Runnable(f, wait)
+
     def f2(*args, **kwargs):
-        Runnable(f)(*args, **kwargs)
+        return runnable(*args, **kwargs)
     return f2
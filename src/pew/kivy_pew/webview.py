@@ -1,4 +1,6 @@
 import atexit
+import itertools
+import json
 import logging
 import threading
 
@@ -9,9 +11,14 @@ logging.info("Starting pew_p4a...?")
 from jnius import autoclass, JavaClass, PythonJavaClass, MetaJavaClass, java_method, JavaMethod
 from .runnable import run_on_ui_thread
 
+import pew.assets
+from pew.pending import JavaScriptError
+
 WebView = autoclass('android.webkit.WebView')
 WebViewClient = autoclass('android.webkit.WebViewClient')
 PythonWebViewClient = autoclass('org.kosoftworks.pyeverywhere.PEWebViewClient')
+ScriptQueue = autoclass('org.kosoftworks.pyeverywhere.PEWScriptQueue')
+JavascriptInterface = autoclass('org.kosoftworks.pyeverywhere.PEWJavascriptInterface')
 PythonActivity = autoclass('org.kivy.android.PythonActivity')
 activity = PythonActivity.mActivity
 
@@ -84,12 +91,65 @@ class PEWebViewClientInterface(PythonJavaClass):
         self.delegate.webview_did_finish_load(self.webview, url)
 
 
+class BridgeMessageCallbacks(PythonJavaClass):
+    """
+    Receives the messages that the page posts to window.pewAndroid, on the Java interface's
+    background thread.
+    """
+    __javainterfaces__ = ['org/kosoftworks/pyeverywhere/BridgeMessageCallbacks']
+    __javacontext__ = 'app'
+
+    def __init__(self, delegate):
+        self.delegate = delegate
+        super(BridgeMessageCallbacks, self).__init__()
+
+    @java_method('(Ljava/lang/String;)V')
+    def receiveMessage(self, message):
+        self.delegate.webview_did_receive_message(self.delegate, message)
+
+
+class ScriptResultCallbacks(PythonJavaClass):
+    """
+    Receives the results of scripts evaluated by PEWScriptQueue. A single instance is
+    shared by all scripts, so no Java proxy is created per call.
+    """
+    __javainterfaces__ = ['org/kosoftworks/pyeverywhere/ScriptResultCallbacks']
+    __javacontext__ = 'app'
+
+    def __init__(self):
+        super(ScriptResultCallbacks, self).__init__()
+        self.callbacks = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, callback):
+        request_id = next(self.ids)
+        with self.lock:
+            self.callbacks[request_id] = callback
+        return request_id
+
+    @java_method('(ILjava/lang/String;)V')
+    def onScriptResult(self, request_id, result):
+        with self.lock:
+            callback = self.callbacks.pop(request_id, None)
+        if callback is None:
+            return
+        result = json.loads(result) if result else {}
+        if "error" in result:
+            callback(None, JavaScriptError(result["error"]))
+        else:
+            callback(result.get("value"), None)
+
+
 class AndroidWebView(object):
     def __init__(self, **kwargs):
         super(AndroidWebView, self).__init__()
         self.initialized = False
         self.webview = None
         self.client = kwargs['client']
+        self.javascript_interface = kwargs.get('javascript_interface')
+        self.script_queue = None
+        self.script_callbacks = ScriptResultCallbacks()
         self.create_webview()
         self.url = None
 
@@ -125,9 +185,22 @@ class AndroidWebView(object):
     def set_zoom_level(self, zoom):
         raise NotImplementedError
 
+    def evaluate_javascript(self, js, callback=None):
+        """
+        Queues js for the next frame. Can be called from any thread. If callback is set, it is
+        called on the UI thread as callback(value, error) with the value of js.
+        """
+        if self.script_queue is None:
+            # the web view is still being created on the UI thread, so queue behind it
+            self._evaluate_when_created(js, callback)
+        elif callback is None:
+            self.script_queue.evaluate(js)
+        else:
+            self.script_queue.evaluateWithResult(js, self.script_callbacks.add(callback))
+
     @run_on_ui_thread
-    def evaluate_javascript(self, js):
-        self.webview.loadUrl('javascript:' + js, None)
+    def _evaluate_when_created(self, js, callback):
+        self.evaluate_javascript(js, callback)
 
     def get_user_agent(self):
         settings = self.webview.getSettings()
@@ -148,11 +221,19 @@ class AndroidWebView(object):
         settings.setMediaPlaybackRequiresUserGesture(False)
         settings.setDomStorageEnabled(True)
         self.webview.setWebViewClient(self.client)
+        if self.javascript_interface is not None:
+            self.webview.addJavascriptInterface(self.javascript_interface, "pewAndroid")
+        script_queue = ScriptQueue(self.webview)
+        script_queue.setScriptResultCallbacks(self.script_callbacks)
+        self.script_queue = script_queue
         self.initialized = True
         self.load_url(self.url)
 
 
 class NativeWebView(object):
+    # evaluate_javascript can pass back the result of the script, see PEWMessageHandler.get_js_value
+    javascript_results = True
+
     def __init__(self, name="WebView", size=None):
         self.initialize()
 
@@ -160,9 +241,27 @@ class NativeWebView(object):
         self.callback = PEWebViewClientInterface(self)
         self.client = PythonWebViewClient()
         self.client.setWebViewCallbacks(self.callback)
-        self.webview = AndroidWebView(client=self.client)
+        self.set_asset_bundle(pew.assets.get_bundle())
+        # bridge messages arrive through window.pewAndroid rather than as navigations
+        self.bridge_callbacks = BridgeMessageCallbacks(self)
+        self.javascript_interface = JavascriptInterface(self.bridge_callbacks)
+        self.webview = AndroidWebView(client=self.client, javascript_interface=self.javascript_interface)
         self.callback.setWebView(self.webview)
 
+    def set_asset_bundle(self, bundle):
+        # the Java client reads assets itself, so they are served without calling into Python
+        if bundle is None:
+            return
+        path = getattr(bundle, "path", None)
+        if path is None:
+            logging.warning("Android can only serve asset bundles from a zip archive or a directory")
+            return
+        try:
+            self.client.setAssetBundle(pew.assets.scheme, path, getattr(bundle, "prefix", ""))
+        except Exception:
+            import traceback
+            logging.error("Unable to open asset bundle %s: %s" % (path, traceback.format_exc()))
+
     def get_persisted_state(self):
         state = {}
         # Temporarily disable until we finish updates to p4a webview bootstrap
@@ -194,6 +293,6 @@ class NativeWebView(object):
     def load_url(self, url):
         self.webview.load_url(url)
 
-    @run_on_ui_thread
-    def evaluate_javascript(self, js):
-        self.webview.evaluate_javascript(js)
+    def evaluate_javascript(self, js, callback=None):
+        # AndroidWebView batches scripts onto the UI thread itself
+        self.webview.evaluate_javascript(js, callback)
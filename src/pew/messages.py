@@ -0,0 +1,270 @@
+"""
+Encoding and decoding of messages sent from the web UI to Python.
+
+Three formats are accepted:
+
+* JSON documents, e.g. {"name": "user.save", "args": [{"id": 1}], "kwargs": {}}. Arguments
+  keep their JSON types and the whole message is parsed in a single json.loads call.
+* Binary envelopes, for messages carrying raw bytes such as images or audio. An envelope is
+  the magic b"PEWB", a 4 byte big-endian length, a JSON header in the format above, and a
+  series of blobs, each a 4 byte big-endian length followed by the data. Arguments of the
+  form {"$blob": n} in the header are replaced by the bytes of the nth blob.
+* Legacy URLs, e.g. myapp://user/save?%7B%22id%22%3A1%7D, as sent by older versions of
+  nativebridge.js and by transports that can only deliver URLs.
+
+Messages may carry a call ID, in the "id" field of JSON and binary messages or the
+_call_id keyword of URLs. When present, the result of the delegate method is sent back to
+the JavaScript caller tagged with that ID.
+"""
+
+import base64
+import collections
+import datetime
+import decimal
+import json
+import struct
+
+import six
+from six.moves.urllib.parse import urlparse, unquote
+
+from .dispatch import normalize_route
+
+BINARY_MAGIC = b"PEWB"
+BLOB_KEY = "$blob"
+URL_CALL_ID_KEY = "_call_id"
+
+
+class Message(collections.namedtuple("Message", ["name", "args", "kwargs", "call_id"])):
+    __slots__ = ()
+
+    def __new__(cls, name, args, kwargs, call_id=None):
+        return super(Message, cls).__new__(cls, name, args, kwargs, call_id)
+
+
+def _decode_url_value(value):
+    value = unquote(value.encode("ascii"))
+    # Python 2 returns the unquoted bytes, Python 3 decodes them for us
+    if isinstance(value, six.binary_type):
+        value = value.decode("utf-8")
+    return value
+
+
+def decode_url_message(url):
+    """
+    Decodes a message in the legacy URL format. Each query string component is an argument,
+    or a keyword argument if it has the form name=value. Values that are valid JSON are
+    converted to the corresponding Python type, all others are passed as strings.
+
+    Only a literal "=" marks a keyword argument. Earlier versions unquoted components
+    first, so an encoded one like "key%3Dvalue" was also passed as the keyword argument
+    key. It is now passed as the string "key=value", and values containing "=" no longer
+    fail to decode.
+    """
+    parts = urlparse(url)
+    query = parts.query
+
+    # On Android at least, Python puts the ?whatever part in path rather than query
+    path = parts.path.split("?")
+    if len(path) == 2 and not query:
+        query = path[1]
+    path = path[0].lstrip("/")
+
+    # the message server receives paths with no netloc, e.g. /load_complete
+    name = normalize_route(".".join(part for part in (parts.netloc, path) if part))
+
+    args = []
+    kwargs = {}
+    if query:
+        for arg in query.split("&"):
+            # split before unquoting so that an encoded "=" in a value is not mistaken for a keyword
+            key, separator, value = arg.partition("=")
+            if not separator:
+                key, value = None, arg
+            value = _decode_url_value(value)
+
+            if value == "empty_string":
+                value = ""
+
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+
+            if key is not None:
+                kwargs[_decode_url_value(key)] = value
+            else:
+                args.append(value)
+
+    call_id = kwargs.pop(URL_CALL_ID_KEY, None)
+    return Message(name, args, kwargs, call_id)
+
+
+def _message_from_document(document, blobs=None):
+    if not isinstance(document, dict) or not isinstance(document.get("name"), six.string_types):
+        raise ValueError("Message must be an object with a name")
+
+    args = document.get("args")
+    kwargs = document.get("kwargs")
+    if args is None:
+        args = []
+    if kwargs is None:
+        kwargs = {}
+    if not isinstance(args, list) or not isinstance(kwargs, dict):
+        raise ValueError("Message args must be a list and kwargs an object")
+
+    if blobs is not None:
+        args = _replace_blobs(args, blobs)
+        kwargs = _replace_blobs(kwargs, blobs)
+
+    return Message(normalize_route(document["name"]), args,
+                   dict((str(key), value) for key, value in kwargs.items()), document.get("id"))
+
+
+def decode_json_message(text):
+    """
+    Decodes a message in the JSON document format.
+    """
+    return _message_from_document(json.loads(text))
+
+
+def _replace_blobs(value, blobs):
+    if isinstance(value, dict):
+        if len(value) == 1 and BLOB_KEY in value:
+            index = value[BLOB_KEY]
+            if not isinstance(index, six.integer_types) or isinstance(index, bool) or not 0 <= index < len(blobs):
+                raise ValueError("Message refers to a missing blob: %r" % (index,))
+            return blobs[index]
+        return dict((key, _replace_blobs(item, blobs)) for key, item in value.items())
+    elif isinstance(value, list):
+        return [_replace_blobs(item, blobs) for item in value]
+    return value
+
+
+def decode_binary_message(data):
+    """
+    Decodes a message in the binary envelope format.
+    """
+    if data[:4] != BINARY_MAGIC or len(data) < 8:
+        raise ValueError("Not a binary message envelope")
+
+    view = memoryview(data)
+    header_length = struct.unpack("!I", view[4:8])[0]
+    offset = 8 + header_length
+    if offset > len(data):
+        raise ValueError("Truncated message header")
+    header = json.loads(view[8:offset].tobytes().decode("utf-8"))
+
+    blobs = []
+    while offset < len(data):
+        if offset + 4 > len(data):
+            raise ValueError("Truncated blob length")
+        blob_length = struct.unpack("!I", view[offset:offset + 4])[0]
+        offset += 4
+        if offset + blob_length > len(data):
+            raise ValueError("Truncated blob")
+        blobs.append(view[offset:offset + blob_length].tobytes())
+        offset += blob_length
+
+    return _message_from_document(header, blobs)
+
+
+def decode_message(data):
+    """
+    Decodes a message in any of the supported formats and returns a Message. Raises
+    ValueError if the message is malformed.
+    """
+    if isinstance(data, bytearray):
+        data = bytes(data)
+
+    if isinstance(data, six.binary_type):
+        if data[:4] == BINARY_MAGIC:
+            return decode_binary_message(data)
+        data = data.decode("utf-8")
+
+    if data.lstrip()[:1] == "{":
+        return decode_json_message(data)
+
+    return decode_url_message(data)
+
+
+def encode_json_message(name, args=(), kwargs=None, call_id=None):
+    """
+    Encodes a message in the JSON document format.
+    """
+    message = {"name": name, "args": list(args), "kwargs": kwargs or {}}
+    if call_id is not None:
+        message["id"] = call_id
+    return json.dumps(message)
+
+
+def encode_binary_message(name, args=(), kwargs=None, call_id=None):
+    """
+    Encodes a message in the binary envelope format. Any bytes arguments, including ones
+    nested in lists and dicts, are sent as blobs.
+    """
+    blobs = []
+
+    def extract_blobs(value):
+        if isinstance(value, (six.binary_type, bytearray, memoryview)):
+            blobs.append(bytes(value))
+            return {BLOB_KEY: len(blobs) - 1}
+        elif isinstance(value, dict):
+            return dict((key, extract_blobs(item)) for key, item in value.items())
+        elif isinstance(value, (list, tuple)):
+            return [extract_blobs(item) for item in value]
+        return value
+
+    header = {
+        "name": name,
+        "args": extract_blobs(list(args)),
+        "kwargs": extract_blobs(kwargs or {})
+    }
+    if call_id is not None:
+        header["id"] = call_id
+    header = json.dumps(header).encode("utf-8")
+
+    chunks = [BINARY_MAGIC, struct.pack("!I", len(header)), header]
+    for blob in blobs:
+        chunks.append(struct.pack("!I", len(blob)))
+        chunks.append(blob)
+    return b"".join(chunks)
+
+
+def encode_value(value):
+    """
+    Converts values the json module does not handle into JSON types. Used as the default
+    function when encoding call results: dates and times become ISO 8601 strings, sets and
+    other iterables become lists, decimals become numbers and bytes become base64 strings.
+    Objects can control their conversion by defining a to_json method.
+    """
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    elif isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    elif isinstance(value, decimal.Decimal):
+        return float(value)
+    elif isinstance(value, (six.binary_type, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    elif hasattr(value, "__iter__") and not isinstance(value, six.string_types):
+        return list(value)
+
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+
+def encode_result(call_id, value=None, error=None):
+    """
+    Encodes the result of a call as a JSON reply for bridge.receiveMessage in nativebridge.js.
+    error is the exception raised by the call, if any. Values are converted with encode_value,
+    and values that still cannot be converted to JSON are reported as an error.
+    """
+    reply = {"reply": call_id, "value": None, "error": None}
+    if error is None:
+        try:
+            reply["value"] = value
+            return json.dumps(reply, default=encode_value)
+        except (TypeError, ValueError) as e:
+            reply["value"] = None
+            error = e
+
+    reply["error"] = {"type": error.__class__.__name__, "message": six.text_type(error)}
+    return json.dumps(reply)
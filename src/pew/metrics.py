@@ -0,0 +1,225 @@
+"""
+Instrumentation for the JavaScript bridge.
+
+When enabled, PyEverywhere keeps the following metrics:
+
+* for each delegate route dispatched by PEWMessageHandler.parse_message, the number of
+  calls and errors and a histogram of dispatch latency in milliseconds
+* for each JavaScript function called with WebUIView.call_js_function, the number of
+  calls and the number of bytes of script sent
+* the number of calls queued by run_on_main_thread that have not run yet, and the
+  largest that number has been
+
+Metrics are disabled by default, so the bridge only pays for a flag check. Enable them by
+calling pew.metrics.enable() or by setting the PEW_METRICS environment variable to 1, then
+use pew.metrics.snapshot() to retrieve them or start_export() to write them out periodically.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from six.moves.urllib.request import Request, urlopen
+
+# upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+clock = getattr(time, "perf_counter", time.time)
+
+enabled = os.environ.get("PEW_METRICS") == "1"
+
+_lock = threading.Lock()
+_routes = {}
+_js_functions = {}
+_main_thread = {"queued": 0, "max_queued": 0, "calls": 0}
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram of values in milliseconds.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket containing the given fraction of values.
+        """
+        if self.count == 0:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                if index < len(self.buckets):
+                    return min(self.buckets[index], self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        buckets = dict(("le_%s" % bound, count) for bound, count in zip(self.buckets, self.counts))
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+def enable(enable=True):
+    """
+    Turns metrics collection on or off.
+    """
+    global enabled
+    enabled = enable
+
+
+def reset():
+    """
+    Clears all collected metrics.
+    """
+    with _lock:
+        _routes.clear()
+        _js_functions.clear()
+        _main_thread.update({"queued": 0, "max_queued": 0, "calls": 0})
+
+
+def record_route(name, elapsed, error=False):
+    """
+    Records a dispatch of route name that took elapsed seconds.
+    """
+    with _lock:
+        stats = _routes.get(name)
+        if stats is None:
+            stats = _routes[name] = {"calls": 0, "errors": 0, "latency": Histogram()}
+        stats["calls"] += 1
+        if error:
+            stats["errors"] += 1
+        stats["latency"].add(elapsed * 1000.0)
+
+
+def record_js_call(function_name, script):
+    """
+    Records a call to JS function function_name using the given script.
+    """
+    size = len(script.encode("utf-8")) if hasattr(script, "encode") else len(script)
+    with _lock:
+        stats = _js_functions.get(function_name)
+        if stats is None:
+            stats = _js_functions[function_name] = {"calls": 0, "bytes": 0}
+        stats["calls"] += 1
+        stats["bytes"] += size
+
+
+def instrument_main_thread(run_on_main_thread):
+    """
+    Wraps a backend's run_on_main_thread function to track how many calls are waiting to run.
+    """
+    def instrumented(func, *args, **kwargs):
+        if not enabled:
+            return run_on_main_thread(func, *args, **kwargs)
+
+        def run(*args, **kwargs):
+            with _lock:
+                _main_thread["queued"] -= 1
+            return func(*args, **kwargs)
+
+        with _lock:
+            _main_thread["calls"] += 1
+            _main_thread["queued"] += 1
+            _main_thread["max_queued"] = max(_main_thread["max_queued"], _main_thread["queued"])
+        return run_on_main_thread(run, *args, **kwargs)
+
+    instrumented.__doc__ = run_on_main_thread.__doc__
+    return instrumented
+
+
+def snapshot():
+    """
+    Returns a JSON-serializable dictionary with the current value of all metrics.
+    """
+    with _lock:
+        return {
+            "timestamp": time.time(),
+            "routes": dict((name, {
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "latency_ms": stats["latency"].to_dict()
+            }) for name, stats in _routes.items()),
+            "js_functions": dict((name, dict(stats)) for name, stats in _js_functions.items()),
+            "main_thread": dict(_main_thread),
+        }
+
+
+def export(destination):
+    """
+    Writes a snapshot of the metrics as JSON to destination, which is either a file path or
+    an http(s) URL the snapshot will be POSTed to.
+    """
+    data = json.dumps(snapshot(), indent=2, sort_keys=True)
+    if destination.startswith("http://") or destination.startswith("https://"):
+        request = Request(destination, data.encode("utf-8"), {"Content-Type": "application/json"})
+        urlopen(request, timeout=10).close()
+    else:
+        temp_path = destination + ".tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(data)
+        # replace the previous snapshot atomically so readers never see a partial file
+        if os.path.exists(destination) and not hasattr(os, "replace"):
+            os.remove(destination)
+        getattr(os, "replace", os.rename)(temp_path, destination)
+
+
+_exporter = None
+
+
+def start_export(destination, interval=10):
+    """
+    Exports metrics to destination every interval seconds on a background thread, see export.
+    Also enables metrics collection. Returns a threading.Event that stops the export when set.
+    """
+    global _exporter
+    enable()
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                export(destination)
+            except Exception:
+                import traceback
+                logging.warning("Unable to export bridge metrics: %s" % traceback.format_exc())
+
+    if _exporter is not None:
+        _exporter.set()
+    _exporter = stop
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return stop
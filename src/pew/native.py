@@ -0,0 +1,17 @@
+"""
+Access to the native backend loaded by pew.ui, for modules that also work without one.
+"""
+
+import sys
+
+
+def get_native(name, default=None):
+    """
+    Returns a function or class from the native backend. If a default is given, it is returned
+    instead when the app has not loaded a native backend, e.g. when running in a browser.
+    """
+    if default is not None and "pew.ui" not in sys.modules:
+        return default
+
+    import pew.ui
+    return getattr(pew.ui, name)
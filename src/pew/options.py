@@ -1 +1,5 @@
-preferred_platforms = []
+import os
+
+# backends to try first, can also be set as a comma-separated list, e.g. PEW_PREFERRED_PLATFORMS=headless
+preferred_platforms = [platform.strip() for platform in os.environ.get("PEW_PREFERRED_PLATFORMS", "").split(",")
+                       if platform.strip()]
@@ -0,0 +1,123 @@
+"""
+Tracking of requests that are waiting on an asynchronous answer from the web UI.
+
+Each request gets its own ID, which is sent along with the request and echoed back with
+the answer, so that any number of requests can be outstanding at once. Callers can either
+block on the result, which wakes up as soon as it arrives, or register a callback.
+"""
+
+import itertools
+import logging
+import threading
+
+
+class PEWTimeoutError(Exception):
+    """
+    Exception thrown when PEW times out waiting to retrieve a JS value.
+    """
+
+    pass
+
+
+class JavaScriptError(Exception):
+    """
+    Exception thrown when JavaScript evaluated by the web view raises an error.
+    """
+
+    pass
+
+
+class PendingResult(object):
+    """
+    The eventual result of a request sent to the web UI.
+    """
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.value = None
+        self.error = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._event.is_set()
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(result) once the result is available. If it already is, the callback
+        is called immediately.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_result(self, value=None, error=None):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.value = value
+            self.error = error
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                import traceback
+                logging.error(traceback.format_exc())
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the result is available and returns its value. Raises PEWTimeoutError
+        if it does not arrive within timeout seconds.
+        """
+        if not self._event.wait(timeout):
+            raise PEWTimeoutError("Timed out waiting for the result of request %s" % self.request_id)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class PendingRequests(object):
+    """
+    Registry of PendingResults keyed by request ID.
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def create(self):
+        """
+        Registers a new request and returns its PendingResult.
+        """
+        result = PendingResult(next(self._ids))
+        with self._lock:
+            self._pending[result.request_id] = result
+        return result
+
+    def discard(self, request_id):
+        with self._lock:
+            return self._pending.pop(request_id, None)
+
+    def resolve(self, request_id, value=None, error=None):
+        """
+        Sets the result of the request with the given ID. Returns False if no such request
+        is pending, e.g. because it already timed out.
+        """
+        result = self.discard(request_id)
+        if result is None:
+            logging.warning("Received a result for unknown request %r", request_id)
+            return False
+
+        result.set_result(value, error)
+        return True
@@ -10,6 +10,8 @@ gi.require_version('Gtk', '3.0')
 gi.require_version('WebKit2', '4.0')
 from gi.repository import GLib, Gio, Gtk, WebKit2
 
+import pew.assets
+
 
 app = None
 
@@ -157,10 +159,40 @@ class NativePEWApp(object):
             cookie_manager.set_accept_policy(WebKit2.CookieAcceptPolicy.NO_THIRD_PARTY)
             cookie_manager.set_persistent_storage(cookies_filename, WebKit2.CookiePersistentStorage.SQLITE)
 
+        if pew.assets.get_bundle() is not None:
+            webkit_web_context.register_uri_scheme(pew.assets.scheme, self.__on_asset_request)
+            security_manager = webkit_web_context.get_security_manager()
+            security_manager.register_uri_scheme_as_secure(pew.assets.scheme)
+            security_manager.register_uri_scheme_as_cors_enabled(pew.assets.scheme)
+
         self.__webkit_web_context = webkit_web_context
 
         return webkit_web_context
 
+    def __on_asset_request(self, request):
+        # serve the asset from memory rather than having WebKit look it up on disk
+        try:
+            asset = pew.assets.load_url(request.get_uri())
+        except KeyError:
+            request.finish_error(GLib.Error.new_literal(
+                Gio.io_error_quark(), "Asset not found: %s" % request.get_uri(), Gio.IOErrorEnum.NOT_FOUND
+            ))
+            return
+
+        stream = Gio.MemoryInputStream.new_from_bytes(GLib.Bytes.new(asset.data))
+        if hasattr(WebKit2, 'URISchemeResponse'):
+            # WebKitGTK 2.36 and later can also send the cache headers
+            from gi.repository import Soup
+            response = WebKit2.URISchemeResponse.new(stream, len(asset.data))
+            response.set_content_type(asset.content_type)
+            headers = Soup.MessageHeaders.new(Soup.MessageHeadersType.RESPONSE)
+            for name, value in asset.headers.items():
+                headers.append(name, value)
+            response.set_http_headers(headers)
+            request.finish_with_response(response)
+        else:
+            request.finish(stream, len(asset.data), asset.content_type)
+
     def gtk_get_top_window(self):
         return self.__gtk_application.get_active_window()
 
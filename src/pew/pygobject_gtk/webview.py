@@ -1,19 +1,24 @@
+import json
 import logging
 import threading
 
 from enum import Enum
 
 from ..interfaces import WebViewInterface
+from ..pending import JavaScriptError
 
 import gi
 gi.require_version('Gdk', '3.0')
 gi.require_version('Gtk', '3.0')
 gi.require_version('WebKit2', '4.0')
-from gi.repository import Gdk, Gtk, WebKit2
+from gi.repository import GLib, Gdk, Gtk, WebKit2
 
 
 PEWThread = threading.Thread
 
+# the page posts bridge messages to window.webkit.messageHandlers.pew, see nativebridge.js
+MESSAGE_HANDLER = "pew"
+
 
 class NativeWebView(WebViewInterface):
     ZOOM_INCREMENTS = {
@@ -24,6 +29,9 @@ class NativeWebView(WebViewInterface):
         4: 1.5
     }
 
+    # evaluate_javascript can pass back the result of the script, see PEWMessageHandler.get_js_value
+    javascript_results = True
+
     def __init__(self, name="WebView", size=(1024, 768)):
         self.default_zoom_increment = self.current_zoom_increment = 2
         self.__name = name
@@ -81,7 +89,18 @@ class NativeWebView(WebViewInterface):
         if self.__gtk_webview:
             return self.__gtk_webview
 
-        gtk_webview = WebKit2.WebView(web_context=self.webkit_web_context)
+        # bridge messages arrive as script messages, which avoids a cancelled navigation per message
+        user_content_manager = WebKit2.UserContentManager()
+        user_content_manager.connect(
+            'script-message-received::' + MESSAGE_HANDLER,
+            self.__gtk_webview_on_script_message_received
+        )
+        user_content_manager.register_script_message_handler(MESSAGE_HANDLER)
+
+        gtk_webview = WebKit2.WebView(
+            web_context=self.webkit_web_context,
+            user_content_manager=user_content_manager
+        )
         gtk_webview.connect(
             'decide-policy',
             self.__gtk_webview_on_decide_policy
@@ -165,8 +184,16 @@ class NativeWebView(WebViewInterface):
     def go_forward(self):
         self.gtk_webview.go_forward()
 
-    def evaluate_javascript(self, js):
-        self.gtk_webview.run_javascript(js)
+    def evaluate_javascript(self, js, callback=None):
+        """
+        Evaluates js. Must be called on the GTK main thread, e.g. through run_on_main_thread.
+        If callback is set, it is called on the main thread as callback(value, error) with
+        the value of js converted through JSON, or with a JavaScriptError if js throws.
+        """
+        if callback is None:
+            self.gtk_webview.run_javascript(js)
+        else:
+            self.gtk_webview.run_javascript(js, None, self.__gtk_webview_on_javascript_finished, callback)
 
     def __gtk_window_on_destroy(self, window):
         self.shutdown()
@@ -180,6 +207,25 @@ class NativeWebView(WebViewInterface):
 
         return False
 
+    def __gtk_webview_on_script_message_received(self, user_content_manager, js_result):
+        value = js_result.get_js_value()
+        if value.is_string():
+            message = value.to_string()
+        else:
+            message = value.to_json(0)
+        self.webview_did_receive_message(self, message)
+
+    def __gtk_webview_on_javascript_finished(self, webview, result, callback):
+        try:
+            js_result = webview.run_javascript_finish(result)
+        except GLib.Error as e:
+            callback(None, JavaScriptError(e.message))
+            return
+
+        # undefined and functions have no JSON representation and become None
+        data = js_result.get_js_value().to_json(0)
+        callback(json.loads(data) if data else None, None)
+
     def __gtk_webview_on_load_changed(self, webview, load_event):
         if load_event == WebKit2.LoadEvent.FINISHED:
             if not self.current_zoom_increment == self.default_zoom_increment:
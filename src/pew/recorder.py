@@ -0,0 +1,134 @@
+"""
+Recording of the JavaScript calls made by a WebUIView.
+
+The recorded session script can be played back in a browser for testing. Since apps can run
+for a very long time, recordings are bounded: the MemoryRecorder keeps only the most recent
+calls, while the FileRecorder streams calls to disk and rotates the file once it grows too
+large.
+"""
+
+import collections
+import io
+import os
+import threading
+
+import six
+
+RECORDING_OFF = "off"
+RECORDING_MEMORY = "memory"
+RECORDING_FILE = "file"
+
+
+class MemoryRecorder(object):
+    """
+    Keeps the most recent max_entries JS calls in a ring buffer.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.entries = collections.deque(maxlen=max_entries)
+
+    def record(self, js):
+        self.entries.append(js)
+
+    def get_script(self):
+        return "".join(js + "\n" for js in list(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+
+    def close(self):
+        self.entries.clear()
+
+
+class FileRecorder(object):
+    """
+    Streams JS calls to a file. Once the file exceeds max_bytes, it is rotated to path.1,
+    path.1 to path.2 and so on, keeping at most backup_count old files.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=1):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._file = None
+        self._open()
+
+    def _open(self):
+        self._file = io.open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = "%s.%d" % (self.path, index)
+            if os.path.exists(source):
+                os.rename(source, "%s.%d" % (self.path, index + 1))
+
+        if self.backup_count > 0:
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def record(self, js):
+        if isinstance(js, six.binary_type):
+            js = js.decode("utf-8")
+        data = js + u"\n"
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            if self._file is None:
+                return
+            if self._size > 0 and self._size + size > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._size += size
+
+    def get_script(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            paths = ["%s.%d" % (self.path, index) for index in range(self.backup_count, 0, -1)]
+            paths.append(self.path)
+            script = []
+            for path in paths:
+                if os.path.exists(path):
+                    with io.open(path, "r", encoding="utf-8") as script_file:
+                        script.append(script_file.read())
+            return "".join(script)
+
+    def clear(self):
+        """
+        Removes the recorded calls, including rotated files.
+        """
+        with self._lock:
+            for index in range(1, self.backup_count + 1):
+                path = "%s.%d" % (self.path, index)
+                if os.path.exists(path):
+                    os.remove(path)
+            if self._file is not None:
+                self._file.seek(0)
+                self._file.truncate()
+                self._size = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def create_recorder(mode, **options):
+    """
+    Creates a recorder for mode, which is one of RECORDING_OFF, RECORDING_MEMORY or
+    RECORDING_FILE. Options are passed to the recorder's constructor. Returns None when
+    recording is off.
+    """
+    if mode == RECORDING_OFF:
+        return None
+    elif mode == RECORDING_MEMORY:
+        return MemoryRecorder(**options)
+    elif mode == RECORDING_FILE:
+        return FileRecorder(**options)
+
+    raise ValueError("Unknown JS session recording mode '%s'" % mode)
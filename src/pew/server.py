@@ -0,0 +1,396 @@
+"""
+HTTP servers used by the PyEverywhere bridge.
+
+The message server accepts bridge messages from the web UI when it is not able to talk to
+Python directly, e.g. when running in a regular browser. Requests are handled by a fixed
+pool of worker threads and connections are kept alive, so a busy UI does not pay for a
+new connection and thread for every message.
+"""
+
+import binascii
+import json
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+
+import six
+from six.moves import queue
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from .messages import BINARY_MAGIC, decode_message, encode_result
+from .native import get_native
+from .pending import PendingResult, PEWTimeoutError
+from .websocket import WebSocketConnection, WebSocketError, WebSocketHub, accept_key
+
+
+# origins of pages served from this machine, and "null" for pages loaded from files
+LOCAL_ORIGIN = re.compile(r"^(https?://(127\.0\.0\.1|localhost|\[::1\])(:\d+)?|null)$")
+
+
+def create_token():
+    """
+    Returns a random token that the web UI must include in the path of its requests, so that
+    pages from other sites cannot send messages to the app.
+    """
+    return binascii.hexlify(os.urandom(16)).decode("ascii")
+
+
+class ThreadPoolMixIn(object):
+    """
+    Mix-in for socketserver servers that handles requests using a fixed pool of worker threads.
+    When all workers are busy, up to max_queued_requests connections wait for a free worker,
+    after which the server stops accepting new connections until the backlog drains.
+    """
+
+    max_workers = 16
+    max_queued_requests = 64
+    thread_class = threading.Thread
+
+    _requests = None
+    _workers = None
+    _detached = None
+
+    def _start_workers(self):
+        self._requests = queue.Queue(self.max_queued_requests)
+        self._detached = set()
+        self._workers = []
+        for i in range(self.max_workers):
+            worker = self.thread_class(target=self._process_requests)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _process_requests(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                # pass the shutdown signal on to the next worker
+                self._requests.put_nowait(None)
+                break
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                if request in self._detached:
+                    self._detached.discard(request)
+                else:
+                    self.shutdown_request(request)
+
+    def detach_request(self, request, target):
+        """
+        Runs target on a thread of its own instead of a worker, for connections that stay open
+        for long, e.g. WebSockets, so that they do not take workers away from other requests.
+        target must shut down the request when it is done.
+        """
+        self._detached.add(request)
+        thread = self.thread_class(target=target)
+        thread.daemon = True
+        thread.start()
+
+    def process_request(self, request, client_address):
+        if self._requests is None:
+            self._start_workers()
+        self._requests.put((request, client_address))
+
+    def server_close(self):
+        super(ThreadPoolMixIn, self).server_close()
+        if self._workers:
+            # drop connections still waiting for a worker, so the shutdown signal always fits
+            while True:
+                try:
+                    item = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    self.shutdown_request(item[0])
+            self._requests.put_nowait(None)
+            self._workers = None
+
+
+class ThreadPoolHTTPServer(ThreadPoolMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MessageRequestHandler(BaseHTTPRequestHandler):
+    """
+    Converts GET and POST requests into calls to the server's PEWMessageHandler.
+
+    The request path names the delegate method. Arguments are passed either in the query
+    string, as with the URLs used by the protocol-based bridge, or for POST requests in the
+    body, which avoids URL length limits for large payloads.
+
+    A POST body may also be a complete message in one of the formats in pew.messages, in
+    which case the path is ignored.
+
+    Request paths start with the server's token, e.g. "/<token>/save_user", and requests from
+    pages whose origin is not allowed are rejected, see create_message_server.
+
+    A GET request asking for a WebSocket upgrade turns the connection into a persistent
+    bridge channel instead. Each message received on it is either a message in one of the
+    formats in pew.messages or has the same form as a request path, e.g.
+    "save_user?%7B%22name%22%3A%22ann%22%7D". Each open WebSocket is served by a thread of
+    its own rather than one of the server's workers.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # close idle keep-alive connections so they do not hold on to a worker forever
+    timeout = 30
+    # set once a WebSocket has been handed over to its own thread, which closes the connection
+    detached = False
+
+    def finish(self):
+        if not self.detached:
+            BaseHTTPRequestHandler.finish(self)
+
+    def log_message(self, format, *args):
+        logging.debug("message server: " + format, *args)
+
+    def origin_allowed(self):
+        """
+        Returns True if the request comes from a page allowed to use the server. Requests
+        without an Origin header do not come from a web page, e.g. native web views.
+        """
+        origin = self.headers.get("Origin")
+        if origin is None:
+            return True
+        allowed_origins = self.server.allowed_origins
+        if allowed_origins is None:
+            return LOCAL_ORIGIN.match(origin) is not None
+        return origin in allowed_origins
+
+    def authorize(self):
+        """
+        Checks the request's origin and token, and strips the token from self.path. Sends an
+        error response and returns False if the request is not allowed.
+        """
+        prefix = "/%s/" % self.server.token if self.server.token else "/"
+        if not self.origin_allowed() or not self.path.startswith(prefix):
+            self.send_result(403, {"ok": False, "error": "forbidden"})
+            return False
+        self.path = "/" + self.path[len(prefix):]
+        return True
+
+    def send_cors_headers(self):
+        # only pages allowed to send messages may read the results
+        origin = self.headers.get("Origin")
+        if origin is not None and self.origin_allowed():
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+
+    def send_result(self, status, body):
+        """
+        Sends a JSON response. body is either a JSON-serializable object or already encoded JSON text.
+        """
+        if not isinstance(body, six.string_types):
+            body = json.dumps(body)
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_cors_headers()
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def dispatch(self, message, reply=None):
+        delegate = self.server.delegate
+        if delegate is None:
+            return False
+
+        if not self.server.dispatch_on_main_thread:
+            return delegate.parse_message(message, reply)
+
+        result = PendingResult(None)
+
+        def run():
+            try:
+                result.set_result(delegate.parse_message(message, reply))
+            except Exception as e:
+                result.set_result(error=e)
+
+        get_native("run_on_main_thread")(run)
+        return result.wait(self.server.dispatch_timeout)
+
+    def handle_message(self, message):
+        try:
+            message = decode_message(message)
+        except ValueError as e:
+            self.send_result(400, {"ok": False, "error": str(e)})
+            return
+
+        # the result of calls is sent back in the response
+        reply = PendingResult(message.call_id)
+
+        try:
+            handled = self.dispatch(message, lambda call_id, value, error: reply.set_result(
+                encode_result(call_id, value, error)))
+            if message.call_id is not None:
+                self.send_result(200, reply.wait(self.server.dispatch_timeout))
+                return
+        except PEWTimeoutError:
+            self.send_result(504, {"ok": False, "error": "timeout"})
+            return
+        except Exception:
+            import traceback
+            logging.error(traceback.format_exc())
+            handled = False
+
+        if handled:
+            self.send_result(200, {"ok": True})
+        else:
+            self.send_result(500, {"ok": False})
+
+    def do_GET(self):
+        if not self.authorize():
+            return
+        if self.headers.get("Upgrade", "").lower() == "websocket":
+            self.handle_websocket()
+        else:
+            self.handle_message(self.path)
+
+    def handle_websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key:
+            self.send_result(400, {"ok": False, "error": "missing Sec-WebSocket-Key"})
+            return
+
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept_key(key))
+        self.end_headers()
+        self.wfile.flush()
+
+        # the connection stays open for as long as the UI does
+        self.connection.settimeout(None)
+        self.close_connection = True
+
+        websocket = WebSocketConnection(self.rfile, self.wfile, self.server.max_body_size)
+        self.server.websockets.add(websocket)
+        self.detached = True
+        self.server.detach_request(self.request, lambda: self.serve_websocket(websocket))
+
+    def serve_websocket(self, websocket):
+        def reply(call_id, value, error):
+            websocket.send(six.text_type(encode_result(call_id, value, error)))
+
+        try:
+            while True:
+                message = websocket.receive()
+                if message is None:
+                    break
+                if isinstance(message, six.text_type) and message.lstrip()[:1] != "{":
+                    message = "/" + message
+                try:
+                    self.dispatch(message, reply)
+                except Exception:
+                    import traceback
+                    logging.error(traceback.format_exc())
+        except WebSocketError as e:
+            logging.warning("Closing WebSocket after protocol error: %s", e)
+            websocket.close(struct.pack("!H", e.status))
+        finally:
+            self.server.websockets.remove(websocket)
+            try:
+                BaseHTTPRequestHandler.finish(self)
+            except (IOError, OSError):
+                pass
+            self.server.shutdown_request(self.request)
+
+    def do_POST(self):
+        if not self.authorize():
+            self.close_connection = True
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_result(400, {"ok": False, "error": "invalid Content-Length"})
+            self.close_connection = True
+            return
+        if length > self.server.max_body_size:
+            self.send_result(413, {"ok": False, "error": "message too large"})
+            self.close_connection = True
+            return
+
+        body = self.rfile.read(length)
+        if body[:4] == BINARY_MAGIC:
+            self.handle_message(body)
+            return
+
+        if isinstance(body, six.binary_type):
+            body = body.decode("utf-8")
+
+        if body.lstrip()[:1] == "{":
+            # a JSON message document, see pew.messages
+            self.handle_message(body)
+            return
+
+        url = self.path
+        if body:
+            url += ("&" if "?" in url else "?") + body
+        self.handle_message(url)
+
+    def do_OPTIONS(self):
+        if not self.authorize():
+            return
+        self.send_response(204)
+        self.send_cors_headers()
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def create_message_server(delegate, host, port, max_workers=ThreadPoolMixIn.max_workers,
+                          dispatch_on_main_thread=None, dispatch_timeout=10, max_body_size=16 * 1024 * 1024,
+                          token=None, allowed_origins=None):
+    """
+    Creates a ThreadPoolHTTPServer that passes the messages it receives to delegate, which
+    must be a PEWMessageHandler. Call serve_forever on the result to start handling requests.
+
+    Only requests whose path starts with the server's token are accepted. The web UI should
+    use the server's url attribute, which includes the token, as its bridge protocol.
+
+    The server's websockets attribute is a WebSocketHub that can be used to push messages to
+    UIs connected over WebSocket, e.g. server.websockets.call_js_function("update", data).
+
+    :param max_workers: maximum number of requests handled concurrently
+    :param dispatch_on_main_thread: True to run delegate methods on the native UI thread, defaults
+                                    to True if a native backend has been loaded
+    :param dispatch_timeout: seconds to wait for the UI thread before failing a request
+    :param max_body_size: largest POST body, in bytes, that will be accepted
+    :param token: secret that request paths must start with, defaults to a new random token
+    :param allowed_origins: origins of the pages allowed to send messages, defaults to pages
+                            served from this machine or loaded from files
+    """
+    if dispatch_on_main_thread is None:
+        dispatch_on_main_thread = "pew.ui" in sys.modules
+
+    server = ThreadPoolHTTPServer((host, port), MessageRequestHandler, bind_and_activate=False)
+    server.max_workers = max_workers
+    server.thread_class = get_native("PEWThread", threading.Thread)
+    server.delegate = delegate
+    server.dispatch_on_main_thread = dispatch_on_main_thread
+    server.dispatch_timeout = dispatch_timeout
+    server.max_body_size = max_body_size
+    server.websockets = WebSocketHub()
+    server.token = create_token() if token is None else token
+    server.allowed_origins = allowed_origins
+    try:
+        server.server_bind()
+        server.server_activate()
+    except Exception:
+        server.server_close()
+        raise
+    server.url = "http://%s:%d/%s" % (host or "localhost", server.server_address[1],
+                                      server.token + "/" if server.token else "")
+    return server
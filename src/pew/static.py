@@ -0,0 +1,428 @@
+"""
+Static file server used by pew.start_local_server.
+
+Files are served by a pool of worker threads over keep-alive connections, with the headers
+browsers need to avoid downloading unchanged files again:
+
+* a strong ETag and Last-Modified header, answering conditional requests with 304
+* precompressed siblings, e.g. phaser.js.br or phaser.js.gz next to phaser.js, are sent
+  to clients that accept that encoding, as long as they are not older than the original
+* single byte ranges, as requested by media elements when seeking
+
+Small files are kept in memory by an AssetCache, so that hot assets are not read from
+slow storage again on every load. Other files are sent with socket.sendfile where
+available, which copies them straight from the page cache to the socket.
+"""
+
+import collections
+import email.utils
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.urllib.parse import unquote, urlparse
+
+from .native import get_native
+
+# encodings of precompressed siblings, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("application/wasm", ".wasm")
+mimetypes.add_type("text/css", ".css")
+
+
+def guess_content_type(path):
+    """
+    Returns the Content-Type header value for a file, with a charset for text files.
+    """
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def make_etag(stat):
+    """
+    Returns a strong ETag for a file with the given os.stat result.
+    """
+    return '"%x-%x-%x"' % (stat.st_ino, stat.st_size, int(stat.st_mtime * 1000000))
+
+
+def parse_range(header, size):
+    """
+    Parses a Range header for a file of size bytes. Returns a (start, end) tuple with an
+    inclusive end, None if the header should be ignored, or False if the range cannot be
+    satisfied. Only single ranges are supported, others are answered with the whole file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # a suffix range, i.e. the last n bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    if start >= size:
+        return False
+    end = int(end) if end else size - 1
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def file_version(stat):
+    """
+    Returns a value that changes whenever the file with the given os.stat result is
+    modified or replaced.
+    """
+    return stat.st_ino, stat.st_size, getattr(stat, "st_mtime_ns", stat.st_mtime)
+
+
+class AssetCache(object):
+    """
+    Size-bounded LRU cache of file contents, including the precompressed variants of files.
+    Entries are checked against the inode, size and modification time of the file at each
+    lookup, so edited files are read again but unchanged ones never are.
+
+    :param max_bytes: total size of the cached contents
+    :param max_entry_bytes: largest file that will be cached
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entry_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, stat):
+        """
+        Returns the cached contents of path if they match the file's current stat, else None.
+        """
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None or entry[0] != file_version(stat):
+                if entry is not None:
+                    self.size -= len(entry[1])
+                self.misses += 1
+                return None
+            # reinsert to mark the entry as most recently used
+            self._entries[path] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path, stat, data):
+        if len(data) > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self._entries[path] = (file_version(stat), data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                evicted = self._entries.popitem(last=False)[1]
+                self.size -= len(evicted[1])
+
+    def read(self, path, stat):
+        """
+        Returns the contents of path, from the cache if possible. stat is the os.stat result
+        for path. Returns None if the file is too large to cache or changed while being read.
+        """
+        if stat.st_size > self.max_entry_bytes:
+            return None
+        data = self.get(path, stat)
+        if data is None:
+            with open(path, "rb") as content:
+                data = content.read()
+            if len(data) != stat.st_size:
+                # the file changed since it was stat'ed, so let the caller stream it instead
+                return None
+            self.put(path, stat, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def resolve_path(root, url_path):
+    """
+    Returns the file system path under root for a URL path, or None if it cannot be served.
+    """
+    path = posixpath.normpath(unquote(urlparse(url_path).path))
+    parts = []
+    for part in path.split("/"):
+        # like SimpleHTTPRequestHandler.translate_path, drop drive letters and anything
+        # before a native separator, e.g. "C:" or "..\\" on Windows
+        part = os.path.split(os.path.splitdrive(part)[1])[1]
+        if part and part not in (os.curdir, os.pardir):
+            parts.append(part)
+
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, *parts))
+    if path != root and not path.startswith(os.path.join(root, "")):
+        return None
+    return path
+
+
+def accepted_encodings(accept):
+    """
+    Returns the set of content codings allowed by an Accept-Encoding header value.
+    """
+    encodings = set()
+    for item in (accept or "").split(","):
+        parts = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for parameter in parts[1:]:
+            if parameter.startswith("q="):
+                try:
+                    quality = float(parameter[2:])
+                except ValueError:
+                    pass
+        if quality > 0:
+            encodings.add(parts[0].lower())
+    return encodings
+
+
+def select_file(path, stat, encodings):
+    """
+    Returns the (path, stat, encoding) of the representation of path to send, which is a
+    precompressed sibling if its encoding is in encodings.
+    """
+    for encoding, extension in ENCODINGS:
+        if encoding not in encodings:
+            continue
+        try:
+            encoded_stat = os.stat(path + extension)
+        except OSError:
+            continue
+        if encoded_stat.st_mtime >= stat.st_mtime:
+            return path + extension, encoded_stat, encoding
+    return path, stat, None
+
+
+def is_not_modified(headers, etag, mtime):
+    """
+    Returns True if the conditional request headers show the client has the current file.
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or "W/" + etag in tags
+
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            since = email.utils.mktime_tz(email.utils.parsedate_tz(if_modified_since))
+        except (TypeError, ValueError, OverflowError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+# A response to a file request. The body is either the bytes in data or, when data is None,
+# count bytes of the open file object content starting at start. Callers must close content.
+FileResponse = collections.namedtuple("FileResponse", ["status", "headers", "data", "content", "start", "count"])
+
+
+def error_response(status, message):
+    body = message.encode("utf-8")
+    return FileResponse(status, [("Content-Type", "text/plain; charset=utf-8"),
+                                 ("Content-Length", str(len(body)))], body, None, 0, 0)
+
+
+class StaticFiles(object):
+    """
+    Answers requests for the files in the root directory. This holds everything about
+    serving files that does not depend on how the request arrived, so that it can be shared
+    by servers.
+
+    :param index: file served for requests for a directory
+    :param cache_control: Cache-Control header sent with files
+    :param cache: AssetCache holding the contents of recently served files, or None
+    """
+
+    def __init__(self, root, index="index.html", cache_control="no-cache", cache=None):
+        self.root = os.path.abspath(root)
+        self.index = index
+        self.cache_control = cache_control
+        self.cache = cache
+
+    def file_headers(self, etag, stat, encoding):
+        headers = [
+            ("ETag", etag),
+            ("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True)),
+            ("Cache-Control", self.cache_control),
+            ("Accept-Ranges", "bytes"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        return headers
+
+    def respond(self, url_path, headers):
+        """
+        Returns the FileResponse for a GET request for url_path. headers are the request
+        headers, in an object with a case-insensitive get method.
+        """
+        path = resolve_path(self.root, url_path)
+        if path is None:
+            return error_response(404, "Not found")
+
+        if os.path.isdir(path):
+            url_path = urlparse(url_path).path
+            if not url_path.endswith("/"):
+                # redirect so that relative links in the index resolve against the directory
+                return FileResponse(301, [("Location", url_path + "/"), ("Content-Length", "0")], b"", None, 0, 0)
+            path = os.path.join(path, self.index)
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return error_response(404, "Not found")
+        if not os.path.isfile(path):
+            return error_response(404, "Not found")
+
+        content_type = guess_content_type(path)
+
+        # byte ranges refer to the file as stored, so range requests get the original
+        range_header = headers.get("Range")
+        if range_header is None:
+            path, stat, encoding = select_file(path, stat, accepted_encodings(headers.get("Accept-Encoding")))
+        else:
+            encoding = None
+        etag = make_etag(stat)
+
+        if is_not_modified(headers, etag, stat.st_mtime):
+            return FileResponse(304, self.file_headers(etag, stat, encoding), b"", None, 0, 0)
+
+        size = stat.st_size
+        start, end = 0, size - 1
+        status = 200
+        if range_header is not None:
+            if_range = headers.get("If-Range")
+            byte_range = parse_range(range_header, size) if if_range in (None, etag) else None
+            if byte_range is False:
+                return FileResponse(416, [("Content-Range", "bytes */%d" % size), ("Content-Length", "0")],
+                                    b"", None, 0, 0)
+            elif byte_range is not None:
+                start, end = byte_range
+                status = 206
+
+        response_headers = [("Content-Type", content_type), ("Content-Length", str(end - start + 1))]
+        if status == 206:
+            response_headers.append(("Content-Range", "bytes %d-%d/%d" % (start, end, size)))
+        response_headers.extend(self.file_headers(etag, stat, encoding))
+
+        try:
+            data = None
+            if self.cache is not None:
+                data = self.cache.read(path, stat)
+            if data is not None:
+                return FileResponse(status, response_headers, memoryview(data)[start:end + 1], None, 0, 0)
+            return FileResponse(status, response_headers, None, open(path, "rb"), start, end - start + 1)
+        except (IOError, OSError):
+            return error_response(404, "Not found")
+
+
+class StaticRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves files from the server's StaticFiles.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # close idle keep-alive connections so they do not hold on to a worker forever
+    timeout = 30
+
+    def log_message(self, format, *args):
+        logging.debug("local server: " + format, *args)
+
+    def do_GET(self):
+        response = self.server.files.respond(self.path, self.headers)
+        try:
+            self.send_response(response.status)
+            for name, value in response.headers:
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command == "HEAD":
+                return
+            if response.data is not None:
+                self.wfile.write(response.data)
+            else:
+                self.copy_file(response.content, response.start, response.count)
+        finally:
+            if response.content is not None:
+                response.content.close()
+
+    do_HEAD = do_GET
+
+    def copy_file(self, content, offset, count):
+        """
+        Sends count bytes of the file object content, starting at offset.
+        """
+        if count <= 0:
+            return
+
+        if hasattr(self.connection, "sendfile"):
+            self.wfile.flush()
+            self.connection.sendfile(content, offset, count)
+            return
+
+        content.seek(offset)
+        while count > 0:
+            data = content.read(min(CHUNK_SIZE, count))
+            if not data:
+                break
+            self.wfile.write(data)
+            count -= len(data)
+
+
+def create_static_server(root, host, port, max_workers=8, index="index.html", cache_control="no-cache",
+                         cache_size=32 * 1024 * 1024):
+    """
+    Creates a ThreadPoolHTTPServer that serves the files in the root directory. Call
+    serve_forever on the result to start handling requests.
+
+    :param max_workers: maximum number of requests handled concurrently
+    :param index: file served for requests for a directory
+    :param cache_control: Cache-Control header sent with files. The default makes browsers
+                          check for changes on every load, which is answered with 304 when
+                          the file has not changed.
+    :param cache_size: bytes of file contents to keep in memory, 0 to always read from disk
+    """
+    from .server import ThreadPoolHTTPServer
+    server = ThreadPoolHTTPServer((host, port), StaticRequestHandler, bind_and_activate=False)
+    server.max_workers = max_workers
+    server.thread_class = get_native("PEWThread", threading.Thread)
+    server.files = StaticFiles(root, index, cache_control, AssetCache(cache_size) if cache_size else None)
+    try:
+        server.server_bind()
+        server.server_activate()
+    except Exception:
+        server.server_close()
+        raise
+    return server
@@ -2,7 +2,11 @@ import logging
 import six
 import warnings
 
+import pew.metrics as metrics
 import pew.options as options
+from pew.js_queue import JSCallQueue
+from pew.pending import PEWTimeoutError
+from pew.recorder import create_recorder, RECORDING_MEMORY
 
 
 def check_platforms():
@@ -59,6 +63,10 @@ def check_platforms():
         import traceback
         errors['gtk'] = traceback.format_exc()
 
+    # the headless backend runs anywhere, so it is only used when asked for
+    if 'headless' in options.preferred_platforms:
+        platforms.append('headless')
+
     if len(platforms) == 0:
         message = "PyEverywhere could not load a browser for this platform."
         logging.error(message)
@@ -95,6 +103,8 @@ for platform in platforms:
             from .wxpy import *
         elif platform in ['gtk']:
             from .pygobject_gtk import *
+        elif platform == 'headless':
+            from .headless import *
         loaded = True
         break
     except Exception as e:
@@ -105,13 +115,8 @@ for platform in platforms:
 if not loaded:
     raise Exception("Error attempting to load a native web browser. See logs for details.")
 
-
-class PEWTimeoutError(Exception):
-    """
-    Exception thrown when PEW times out waiting to retrieve a JS value.
-    """
-
-    pass
+# track how many calls are waiting for the main thread when metrics are enabled
+run_on_main_thread = metrics.instrument_main_thread(run_on_main_thread)
 
 
 class PEWApp(NativePEWApp):
@@ -211,32 +216,30 @@ class WebUIView(NativeWebView):
         self.page_loaded = False
         self.current_url = None
 
-        # a list of JS calls made since app start so that we can do playback in a browser for testing.
-        self.js_session_script = ""
+        # records the JS calls made since app start so that we can do playback in a browser for testing.
+        self.js_recorder = create_recorder(RECORDING_MEMORY)
+
+        # when set, call_js_function buffers calls and sends them to the web view in batches
+        self.js_queue = None
 
         if url is not None:
             self.load_url(url)
 
-    def _wait_for_js_value(self, variable, timeout=1):
+    def get_js_value(self, variable, timeout=1, callback=None):
         """
-        Waits for the UI to send back the requested variable. Returns the variable
-        if retrieved before timeout, otherwise throws a PEWTimeoutError.
+        Gets the value of a property, variable or function in JavaScript. The delegate must be
+        a PEWMessageHandler, which receives the value back from the web UI.
+
+        Returns the value if retrieved before timeout, otherwise throws a PEWTimeoutError.
+        If callback is set, returns immediately and calls callback(value, error) instead,
+        where error is None or the exception that would have been raised.
 
         Params:
             :param variable: variable whose value we are trying to retrieve
             :param timeout: time in seconds to wait before timing out
+            :param callback: function to call with the value instead of blocking
         """
-        total_time = 0
-        sleep_time = 0.05
-        while self.js_value is None:
-            total_time += sleep_time
-            time.sleep(sleep_time)
-            if total_time > timeout:
-                raise PEWTimeoutError("Timed out attempting to retrieve value for '%s'" % variable)
-
-        value = copy.copy(self.js_value)
-        self.js_value = None
-        return value
+        return self.delegate.get_js_value(variable, timeout, callback)
 
     def load_url(self, url):
         """
@@ -306,12 +309,77 @@ class WebUIView(NativeWebView):
             args.append(arg)
 
         js = "%s(%s);" % (function_name, ','.join(args))
-        self.js_session_script += js + "\n"
+        if self.js_recorder is not None:
+            self.js_recorder.record(js)
+        if metrics.enabled:
+            metrics.record_js_call(function_name, js)
+
+        if self.js_queue is not None:
+            self.js_queue.add(function_name, js)
+        else:
+            self.evaluate_javascript(js)
+
+    def set_js_batching(self, enabled=True, interval=0.016, coalesce=False):
+        """
+        Enables or disables batching of call_js_function calls. When enabled, calls are
+        buffered and sent to the web view as a single script, which greatly reduces overhead
+        when many updates are pushed to the UI in a short time.
+
+        :param enabled: True to buffer calls, False to send each call immediately
+        :param interval: seconds to buffer calls for, or None to send them at the end of the
+                         current main loop iteration
+        :param coalesce: True to drop earlier queued calls to a JS function when it is called
+                         again, or a list of function names this should apply to
+        """
+        if self.js_queue is not None:
+            self.js_queue.close()
+            self.js_queue = None
+
+        if enabled:
+            self.js_queue = JSCallQueue(self.evaluate_javascript, run_on_main_thread, interval, coalesce)
+
+    def flush_js_calls(self):
+        """
+        Immediately sends any calls buffered by call_js_function to the web view.
+        """
+        if self.js_queue is not None:
+            self.js_queue.flush()
+
+    def set_js_session_recording(self, mode, **options):
+        """
+        Sets how the JS calls made by call_js_function are recorded for get_js_session_script.
+
+        :param mode: "off" to disable recording, "memory" to keep the most recent calls in memory
+                     (the default), or "file" to stream calls to a rotating file
+        :param options: options for the recorder, max_entries for "memory" and path, max_bytes
+                        and backup_count for "file", see pew.recorder
+        """
+        if self.js_recorder is not None:
+            self.js_recorder.close()
+        self.js_recorder = create_recorder(mode, **options)
+
+    @property
+    def js_session_script(self):
+        return self.get_js_session_script()
 
-        self.evaluate_javascript(js)
+    @js_session_script.setter
+    def js_session_script(self, script):
+        # assigning replaces the recorded calls, e.g. js_session_script = "" clears them
+        self.clear_js_session_script()
+        if script and self.js_recorder is not None:
+            self.js_recorder.record(script.rstrip("\n"))
 
     def get_js_session_script(self):
-        return self.js_session_script
+        if self.js_recorder is None:
+            return ""
+        return self.js_recorder.get_script()
+
+    def clear_js_session_script(self):
+        """
+        Removes the JS calls recorded so far, e.g. to start a new recording for a test.
+        """
+        if self.js_recorder is not None:
+            self.js_recorder.clear()
 
     def shutdown(self):
         if self.delegate is not None:
@@ -326,6 +394,17 @@ class WebUIView(NativeWebView):
 
         return True
 
+    def webview_did_receive_message(self, webview, message, reply=None):
+        """
+        Called by backends that receive bridge messages from the web UI directly rather than
+        as navigations to the protocol URL. message is a JSON document, see pew.messages.
+        Backends that can return results to the caller themselves pass a reply function,
+        see PEWMessageHandler.parse_message.
+        """
+        if self.delegate is not None:
+            return self.delegate.parse_message(message, reply)
+        return False
+
     def webview_did_start_load(self, webview, url=None):
         pass
 
@@ -0,0 +1,244 @@
+"""
+Watches directories for changed files, for reloading the web UI during development.
+
+On Linux, changes are reported by inotify as they happen. Elsewhere, or if inotify is
+unavailable, the directories are scanned for changed modification times every
+poll_interval seconds. Editors often save a file in several steps, so changes are
+collected until none have arrived for debounce seconds and then passed to the callback
+together.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_ignored(path):
+    """
+    Returns True for files that editors and version control create while working, such as
+    swap and backup files, which should not trigger a reload.
+    """
+    name = os.path.basename(path)
+    return name.startswith(".") or name.endswith("~") or name.endswith(".swp") or name.endswith(".tmp")
+
+
+def _walk_dirs(path):
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        yield dirpath, filenames
+
+
+class PollingSource(object):
+    """
+    Finds changes by comparing the modification time and size of every file between scans.
+    """
+
+    def __init__(self, paths, stopped):
+        self.paths = paths
+        self.stopped = stopped
+        self.files = self.scan()
+
+    def scan(self):
+        files = {}
+        for root in self.paths:
+            for dirpath, filenames in _walk_dirs(root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def wait(self, timeout):
+        if self.stopped.wait(timeout):
+            return set()
+        files = self.scan()
+        changes = set(path for path, version in files.items() if self.files.get(path) != version)
+        changes.update(path for path in self.files if path not in files)
+        self.files = files
+        return changes
+
+    def close(self):
+        pass
+
+
+class InotifySource(object):
+    """
+    Receives changes from the Linux kernel with inotify. Directories created while watching
+    are watched too.
+    """
+
+    def __init__(self, paths, stopped):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.paths = paths
+        self.stopped = stopped
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        for root in paths:
+            self.add_tree(root)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, path.encode(sys.getfilesystemencoding()), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                logging.warning("Too many directories to watch with inotify, raise fs.inotify.max_user_watches")
+            raise OSError(error, "inotify_add_watch failed for %s" % path)
+        self.dirs[wd] = path
+
+    def add_tree(self, root):
+        """
+        Watches root and the directories in it. Returns the files found in them.
+        """
+        files = set()
+        for dirpath, filenames in _walk_dirs(root):
+            self.add_watch(dirpath)
+            files.update(os.path.join(dirpath, name) for name in filenames)
+        return files
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        changes = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(sys.getfilesystemencoding())
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, so treat everything as changed
+                changes.update(self.paths)
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+
+            directory = self.dirs.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                    # files may have been added before the watch was in place
+                    changes.update(self.add_tree(path))
+                continue
+            changes.add(path)
+        return changes
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable or self.stopped.is_set():
+            return set()
+        return self.read_events()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher(object):
+    """
+    Calls callback with a sorted list of the paths of changed files in the watched
+    directories. The callback runs on the watcher's thread.
+
+    :param paths: directories to watch, including their subdirectories
+    :param debounce: seconds without changes to wait for before calling callback
+    :param poll_interval: seconds between scans when inotify is not used, and between
+                          checks for stop otherwise
+    :param use_inotify: True or False to choose how changes are found, by default inotify
+                        is used where available
+    """
+
+    def __init__(self, paths, callback, debounce=0.1, poll_interval=0.5, use_inotify=None):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self.source = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts watching on a background thread. Files changed before start returns are not
+        reported.
+        """
+        self.source = None
+        if self.use_inotify:
+            try:
+                self.source = InotifySource(self.paths, self._stopped)
+            except (OSError, AttributeError):
+                import traceback
+                logging.warning("inotify is unavailable, polling for changes instead: %s" % traceback.format_exc())
+        if self.source is None:
+            self.source = PollingSource(self.paths, self._stopped)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                changes = self.source.wait(self.poll_interval)
+                if not changes:
+                    continue
+
+                # collect the rest of a burst of changes
+                more = self.source.wait(self.debounce)
+                while more:
+                    changes.update(more)
+                    more = self.source.wait(self.debounce)
+
+                changes = sorted(path for path in changes if not is_ignored(path))
+                if changes and not self._stopped.is_set():
+                    try:
+                        self.callback(changes)
+                    except Exception:
+                        import traceback
+                        logging.error(traceback.format_exc())
+        finally:
+            self.source.close()
@@ -0,0 +1,264 @@
+"""
+Minimal WebSocket (RFC 6455) support for the message server.
+
+A WebSocket gives the web UI a single persistent, full-duplex connection to Python, so that
+messages in both directions avoid the cost of an HTTP request or a JavaScript evaluation
+each. Only what the bridge needs is implemented: text and binary messages, fragmentation,
+ping/pong and the closing handshake.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+
+import six
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+# close status codes, see RFC 6455 section 7.4.1
+STATUS_PROTOCOL_ERROR = 1002
+STATUS_INVALID_DATA = 1007
+
+
+class WebSocketError(Exception):
+    """
+    Exception thrown when a peer violates the WebSocket protocol. status is the close status
+    code to send to the peer.
+    """
+
+    def __init__(self, message, status=STATUS_PROTOCOL_ERROR):
+        super(WebSocketError, self).__init__(message)
+        self.status = status
+
+
+def decode_text(message):
+    """
+    Decodes the payload of a text message, which must be UTF-8.
+    """
+    try:
+        return message.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise WebSocketError("Text message is not valid UTF-8: %s" % e, STATUS_INVALID_DATA)
+
+
+def accept_key(key):
+    """
+    Returns the Sec-WebSocket-Accept header value for the client's Sec-WebSocket-Key.
+    """
+    digest = hashlib.sha1((key.strip() + GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def apply_mask(data, mask):
+    """
+    XORs data with the 4 byte mask, which is how clients mask every frame they send.
+    """
+    length = len(data)
+    if hasattr(int, "from_bytes"):
+        # XOR as one big integer rather than byte by byte
+        key = (mask * (length // 4 + 1))[:length]
+        return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+    data = bytearray(data)
+    mask = bytearray(mask)
+    for i in range(length):
+        data[i] ^= mask[i % 4]
+    return bytes(data)
+
+
+def encode_frame(opcode, payload, fin=True):
+    """
+    Encodes an unmasked frame, as sent from server to client.
+    """
+    header = bytearray([(0x80 if fin else 0) | opcode])
+    length = len(payload)
+    if length < 126:
+        header.append(length)
+    elif length < 0x10000:
+        header.append(126)
+        header.extend(struct.pack("!H", length))
+    else:
+        header.append(127)
+        header.extend(struct.pack("!Q", length))
+    return bytes(header) + payload
+
+
+class WebSocketConnection(object):
+    """
+    The server side of an established WebSocket connection.
+
+    :param rfile: file-like object to read frames from
+    :param wfile: file-like object to write frames to
+    :param max_message_size: largest message, in bytes, that will be accepted
+    """
+
+    def __init__(self, rfile, wfile, max_message_size=16 * 1024 * 1024):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.max_message_size = max_message_size
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def _read_exact(self, length):
+        data = self.rfile.read(length)
+        if len(data) < length:
+            raise EOFError("Connection closed")
+        return data
+
+    def _read_frame(self):
+        header = self._read_exact(2)
+        first, second = six.indexbytes(header, 0), six.indexbytes(header, 1)
+        fin = bool(first & 0x80)
+        opcode = first & 0x0F
+        length = second & 0x7F
+
+        if length == 126:
+            length = struct.unpack("!H", self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read_exact(8))[0]
+
+        if length > self.max_message_size:
+            raise WebSocketError("Frame of %d bytes exceeds the maximum message size" % length)
+
+        if not second & 0x80:
+            raise WebSocketError("Client frames must be masked")
+        mask = self._read_exact(4)
+        payload = apply_mask(self._read_exact(length), mask) if length else b""
+        return fin, opcode, payload
+
+    def receive(self):
+        """
+        Blocks until a complete message arrives and returns it, as text for text messages and
+        bytes for binary messages. Returns None once the connection has been closed.
+        """
+        fragments = []
+        message_opcode = None
+        size = 0
+
+        while not self.closed:
+            try:
+                fin, opcode, payload = self._read_frame()
+            except (EOFError, IOError, OSError):
+                self.closed = True
+                return None
+
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            elif opcode == OP_PONG:
+                continue
+            elif opcode == OP_CLOSE:
+                self.close(payload[:2] if len(payload) >= 2 else b"")
+                return None
+            elif opcode == OP_CONTINUATION:
+                if message_opcode is None:
+                    raise WebSocketError("Continuation frame without a message")
+            elif opcode in (OP_TEXT, OP_BINARY):
+                if message_opcode is not None:
+                    raise WebSocketError("New message started before the previous one finished")
+                message_opcode = opcode
+            else:
+                raise WebSocketError("Unknown opcode %d" % opcode)
+
+            size += len(payload)
+            if size > self.max_message_size:
+                raise WebSocketError("Message exceeds the maximum message size")
+            fragments.append(payload)
+
+            if fin:
+                message = b"".join(fragments)
+                if message_opcode == OP_TEXT:
+                    return decode_text(message)
+                return message
+
+        return None
+
+    def _send_frame(self, opcode, payload):
+        frame = encode_frame(opcode, payload)
+        with self._send_lock:
+            self.wfile.write(frame)
+            if hasattr(self.wfile, "flush"):
+                self.wfile.flush()
+
+    def send(self, message):
+        """
+        Sends a message, as a text frame for text and a binary frame for bytes.
+        """
+        if isinstance(message, six.text_type):
+            self._send_frame(OP_TEXT, message.encode("utf-8"))
+        else:
+            self._send_frame(OP_BINARY, message)
+
+    def close(self, status=struct.pack("!H", 1000)):
+        """
+        Sends a close frame, if the connection is still open.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OP_CLOSE, status)
+        except (IOError, OSError):
+            pass
+
+
+class WebSocketHub(object):
+    """
+    The set of web UIs connected to the message server over WebSocket, used to push
+    messages from Python to JavaScript. Messages are JSON objects handled by
+    bridge.receiveMessage in nativebridge.js.
+    """
+
+    def __init__(self):
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._connections)
+
+    def add(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+
+    def remove(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+    def send(self, message):
+        """
+        Sends a JSON-serializable message to every connected UI.
+        """
+        data = six.text_type(json.dumps(message))
+        with self._lock:
+            connections = list(self._connections)
+
+        for connection in connections:
+            try:
+                connection.send(data)
+            except (IOError, OSError):
+                logging.info("Dropping disconnected WebSocket client")
+                connection.closed = True
+                self.remove(connection)
+
+    def evaluate_javascript(self, js):
+        """
+        Evaluates js in every connected UI.
+        """
+        self.send({"eval": js})
+
+    def call_js_function(self, function_name, *args):
+        """
+        Calls a JavaScript function in every connected UI. Arguments must be JSON-serializable.
+        """
+        self.send({"call": function_name, "args": list(args)})
@@ -1,4 +1,5 @@
 import atexit
+import json
 import logging
 import os
 import platform
@@ -13,8 +14,10 @@ WindowUtils = cefpython.WindowUtils()
 # Note: this works because we don't import pew UI submodules during initial module load.
 # if that changes, we'll need to rework this.
 import pew
+import pew.assets
 
 from ..interfaces import WebViewInterface
+from ..messages import encode_result
 
 MAC = sys.platform.startswith('darwin')
 
@@ -35,11 +38,180 @@ if MAC:
     chrome_settings['resources_dir_path'] = os.path.join(cef_framework_dir, 'Resources')
     chrome_settings["browser_subprocess_path"] = os.path.join(cefpython_dir, 'subprocess')
 
+# How CEF's message loop is run, see MessagePump. Change these before creating a web view.
+message_pump_settings = {
+    # "adaptive" runs the loop right after activity and backs off while idle, "timer" runs it every interval ms
+    "mode": "adaptive",
+    "interval": 10,
+    # longest wait in ms between runs while idle in adaptive mode
+    "max_interval": 50,
+}
+
+
+class MessagePump(object):
+    """
+    Runs cefpython.MessageLoopWork from the wx main loop.
+
+    In "timer" mode the work runs every interval ms, whether or not CEF has anything to do.
+    In "adaptive" mode it also runs as soon as the wx main loop is free after activity that
+    gives CEF work, such as scripts evaluated from Python, replies to bridge calls and page
+    loads. After that it runs every interval ms, doubling the wait on each idle run up to
+    max_interval ms. Set max_interval to interval to keep the timer at full rate.
+
+    cefpython3 does not let CEF schedule the work itself (OnScheduleMessagePumpWork cannot
+    be set as a client callback), and input goes to CEF's own window without waking the
+    pump, so input handled while idle may wait up to max_interval ms.
+    """
+
+    def __init__(self, mode="adaptive", interval=10, max_interval=50):
+        self.mode = mode
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.current_interval = interval
+        self.timer = None
+        self.running = False
+        self.wake_pending = False
+        self.lock = threading.Lock()
+
+    def start(self, window):
+        self.timer = wx.Timer(window, -1)
+        window.Bind(wx.EVT_TIMER, self.on_timer, self.timer)
+        self.running = True
+        if self.mode == "adaptive":
+            self.schedule(self.interval)
+        else:
+            self.timer.Start(self.interval)
+
+    def stop(self):
+        self.running = False
+        if self.timer is not None:
+            self.timer.Stop()
+
+    def schedule(self, interval):
+        self.current_interval = interval
+        self.timer.StartOnce(interval)
+
+    def wake(self):
+        """
+        Runs the message loop work soon and resets the idle back-off. Can be called from any thread.
+        """
+        if self.mode != "adaptive" or self.timer is None:
+            return
+        with self.lock:
+            if self.wake_pending:
+                return
+            self.wake_pending = True
+        wx.CallAfter(self.run_work)
+
+    def run_work(self):
+        with self.lock:
+            self.wake_pending = False
+        if not self.running:
+            return
+        cefpython.MessageLoopWork()
+        self.schedule(self.interval)
+
+    def on_timer(self, event):
+        cefpython.MessageLoopWork()
+        if self.mode == "adaptive" and self.running:
+            self.schedule(min(self.current_interval * 2, self.max_interval))
+
+
+class BridgeBindings(object):
+    """
+    Exposed to the page as window.pewNative, through which nativebridge.js calls Python
+    directly with structured arguments instead of navigating to protocol URLs.
+    """
+
+    def __init__(self, webview):
+        self.webview = webview
+
+    def postMessage(self, message, callback=None):
+        reply = None
+        if callback is not None:
+            def reply(call_id, value, error):
+                # results of background methods arrive on worker threads, but CEF callbacks
+                # must be called on the UI thread
+                result = json.loads(encode_result(call_id, value, error))
+                cefpython.PostTask(cefpython.TID_UI, callback.Call, result)
+                # the task only runs when the message loop does
+                self.webview.message_pump.wake()
+        self.webview.webview_did_receive_message(self.webview, json.dumps(message), reply)
+
+
+class AssetResourceHandler:
+    """
+    Serves a request for an asset URL from the bundle registered with pew.assets.
+    """
+
+    def __init__(self, client, url):
+        self.client = client
+        self.url = url
+        self.asset = None
+        self.offset = 0
+
+    def ProcessRequest(self, request, callback):
+        try:
+            self.asset = pew.assets.load_url(self.url)
+        except KeyError:
+            self.asset = None
+        callback.Continue()
+        return True
+
+    def GetResponseHeaders(self, response, response_length_out, redirect_url_out):
+        if self.asset is None:
+            response.SetStatus(404)
+            response.SetStatusText("Not Found")
+            response_length_out[0] = 0
+            return
+        response.SetStatus(200)
+        response.SetStatusText("OK")
+        response.SetMimeType(self.asset.content_type.split(";")[0])
+        response.SetHeaderMap(self.asset.headers)
+        response_length_out[0] = len(self.asset.data)
+
+    def ReadResponse(self, data_out, bytes_to_read, bytes_read_out, callback):
+        if self.asset is None or self.offset >= len(self.asset.data):
+            self.client.release_resource_handler(self)
+            return False
+        data = self.asset.data[self.offset:self.offset + bytes_to_read]
+        self.offset += len(data)
+        data_out[0] = data
+        bytes_read_out[0] = len(data)
+        return True
+
+    def CanGetCookie(self, cookie):
+        return True
+
+    def CanSetCookie(self, cookie):
+        return True
+
+    def Cancel(self):
+        self.client.release_resource_handler(self)
+
+
 class ClientHandler:
     # --------------------------------------------------------------------------
     # RequestHandler
     # --------------------------------------------------------------------------
     onload_handled = False
+
+    def __init__(self):
+        # CEF does not keep resource handlers alive, so we hold on to them until they finish
+        self.resource_handlers = []
+
+    def GetResourceHandler(self, browser, frame, request):
+        url = request.GetUrl()
+        if not pew.assets.is_asset_url(url):
+            return None
+        handler = AssetResourceHandler(self, url)
+        self.resource_handlers.append(handler)
+        return handler
+
+    def release_resource_handler(self, handler):
+        if handler in self.resource_handlers:
+            self.resource_handlers.remove(handler)
+
     def OnBeforeBrowse(self, browser, frame, request, user_gesture, is_redirect):
         # - frame.GetUrl() returns current url
         # - request.GetUrl() returns new url
@@ -90,6 +262,7 @@ class NativeWebView(WebViewInterface):
     def __init__(self, name="WebView", size=(1024, 768)):
         self.webview = None
         cli_settings = {'enable-media-stream': '1', 'autoplay-policy': 'no-user-gesture-required'}
+        self.message_pump = MessagePump(**message_pump_settings)
         cefpython.Initialize(chrome_settings, cli_settings)
 
         self.view = wx.Frame(None, -1, name, size=size)
@@ -125,12 +298,15 @@ class NativeWebView(WebViewInterface):
         self.webview = cefpython.CreateBrowserSync(window_info, settings=settings,
                                              url="about:blank")
 
+        bindings = cefpython.JavascriptBindings(bindToFrames=False, bindToPopups=False)
+        bindings.SetObject("pewNative", BridgeBindings(self))
+        self.webview.SetJavascriptBindings(bindings)
+
         client = ClientHandler()
         self.webview.SetClientHandler(client)
         client.callback = self.HandleURL
 
-        self.timer = None
-        self.create_timer()
+        self.message_pump.start(self.view)
 
         self.view.Bind(wx.EVT_CLOSE, self.OnClose)
 
@@ -146,6 +322,7 @@ class NativeWebView(WebViewInterface):
             (width, height) = self.browser_panel.GetSize().Get()
             self.webview.SetBounds(x, y, width, height)
         self.webview.NotifyMoveOrResizeStarted()
+        self.message_pump.wake()
 
     def OnSetFocus(self, _):
         if not self.webview:
@@ -154,17 +331,7 @@ class NativeWebView(WebViewInterface):
             WindowUtils.OnSetFocus(self.browser_panel.GetHandle(),
                                    0, 0, 0)
         self.webview.SetFocus(True)
-
-    def create_timer(self):
-        # See also "Making a render loop":
-        # http://wiki.wxwidgets.org/Making_a_render_loop
-        # Another way would be to use EVT_IDLE in MainFrame.
-        self.timer = wx.Timer(self.view, -1)
-        self.view.Bind(wx.EVT_TIMER, self.on_timer, self.timer)
-        self.timer.Start(10)  # 10ms timer
-
-    def on_timer(self, event):
-        cefpython.MessageLoopWork()
+        self.message_pump.wake()
 
     def show(self):
         self.view.Show()
@@ -177,6 +344,7 @@ class NativeWebView(WebViewInterface):
 
     def load_url(self, url):
         self.webview.LoadUrl(url)
+        self.message_pump.wake()
 
     def get_user_agent(self):
         return ""
@@ -189,6 +357,7 @@ class NativeWebView(WebViewInterface):
 
     def reload(self):
         self.webview.Reload()
+        self.message_pump.wake()
 
     def go_back(self):
         self.webview.GoBack()
@@ -204,11 +373,11 @@ class NativeWebView(WebViewInterface):
 
     def evaluate_javascript(self, js):
         self.webview.GetMainFrame().ExecuteJavascript(js)
+        self.message_pump.wake()
 
     def OnClose(self, event):
         logging.info("OnClose called...")
-        if self.timer:
-            self.timer.Stop()
+        self.message_pump.stop()
         if self.webview:
             self.webview.ParentWindowWillClose()
             self.webview = None
@@ -217,6 +386,7 @@ class NativeWebView(WebViewInterface):
 
     def HandleURL(self, url):
         #self.evaluate_javascript("$('#search_bar').val('%s');" % url)
+        self.message_pump.wake()
         return self.webview_should_start_load(self, url, None)
 
     def OnLoadComplete(self, event):
@@ -35,13 +35,98 @@ var NativeBridge = function() {
         this.language = "en";
         this.appData = [];
         this.js_controller = null;
+        this.socket = null;
+        this.eventSource = null;
+        // calls waiting for a reply from Python, by call ID
+        this.nextCallId = 1;
+        this.pendingCalls = {};
+        // milliseconds to wait for the result of a call, 0 to wait forever
+        this.callTimeout = 30000;
     };
 
 	this.setProtocol = function(p)
 	{
 		this.protocol = p;
+		// message servers also accept WebSocket connections, which avoid a request per message
+		if (/^https?:/.test(p) && typeof WebSocket !== "undefined") {
+			this.connectWebSocket(p.replace(/^http/, "ws") + "ws");
+		} else if (/^https?:/.test(p) && typeof EventSource !== "undefined") {
+			// the app server can also push over server-sent events, see pew.app_server
+			this.connectEventSource(p + "events");
+		}
 	};
 
+    this.connectEventSource = function(url)
+    {
+        var self = this;
+        var source = new EventSource(url);
+        source.onmessage = function(event) {
+            self.receiveMessage(JSON.parse(event.data));
+        };
+        this.eventSource = source;
+        // servers without an event stream reply with an error, which closes the source
+        // rather than retrying, so no error handling is needed
+    };
+
+    this.connectWebSocket = function(url)
+    {
+        var self = this;
+        var socket = new WebSocket(url);
+        socket.onopen = function() {
+            self.socket = socket;
+        };
+        socket.onmessage = function(event) {
+            self.receiveMessage(JSON.parse(event.data));
+        };
+        socket.onclose = function() {
+            // fall back to HTTP requests
+            if (self.socket === socket) {
+                self.socket = null;
+            }
+        };
+    };
+
+    this.receiveMessage = function(message)
+    {
+        // handles messages pushed from Python, see pew.websocket.WebSocketHub
+        if (message.reply !== undefined) {
+            this.resolveCall(message);
+        }
+        if (message.eval !== undefined) {
+            eval(message.eval);
+        }
+        if (message.call !== undefined) {
+            var parts = message.call.split(".");
+            var context = window;
+            var func = window;
+            for (var i = 0; i < parts.length; i++) {
+                context = func;
+                func = func[parts[i]];
+            }
+            func.apply(context, message.args || []);
+        }
+    };
+
+    this.resolveCall = function(message)
+    {
+        // settles the promise returned by call, see pew.messages.encode_result
+        var call = this.pendingCalls[message.reply];
+        if (call === undefined) {
+            return;
+        }
+        delete this.pendingCalls[message.reply];
+        if (call.timer !== null) {
+            clearTimeout(call.timer);
+        }
+        if (message.error) {
+            var error = new Error(message.error.message);
+            error.name = message.error.type;
+            call.reject(error);
+        } else {
+            call.resolve(message.value);
+        }
+    };
+
     this.setJSController = function(controller) {
         this.js_controller = controller;
     };
@@ -69,52 +154,201 @@ var NativeBridge = function() {
         return this.language;
     };
 
-    this.getJSValue = function(property)
+    this.getJSValue = function(property, requestId)
     {
-        this.sendMessage("get_value_from_js", eval(property));
+        var value = eval(property);
+        // wrap the value so that its JSON type survives the trip to Python
+        this.postMessage("js_value_result", [requestId, {value: value === undefined ? null : value}]);
     };
 
-	this.sendMessage = function()
-	{
-		var url = arguments[0];
-		if (arguments.length > 1)
-		{
-			url += "?";
-			for (var i = 1; i < arguments.length; i++) {
-                var value = arguments[i];
-                if (value.constructor === [].constructor || value.constructor === {}.constructor) {
+    this.encodeURLMessage = function(name, args, callId)
+    {
+        // legacy format, used by transports that can only deliver URLs
+        var url = name;
+        var parts = [];
+        if (args.length > 0) {
+            for (var i = 0; i < args.length; i++) {
+                var value = args[i];
+                if (value === null || value === undefined) {
+                    value = "null";
+                } else if (value.constructor === [].constructor || value.constructor === {}.constructor) {
                     value = JSON.stringify(value);
                 }
-                url += encodeURIComponent(value) + "&";
+                parts.push(encodeURIComponent(value));
             }
-            // cut off the last & character
-            url = url.substring(0, url.length - 1);
-		}
+        }
+        if (callId !== undefined) {
+            parts.push("_call_id=" + callId);
+        }
+        if (parts.length > 0) {
+            url += "?" + parts.join("&");
+        }
+        return url;
+    };
 
-        if (this.protocol !== null) {
-            console.log("sending message " + url);
-            $.ajax(this.protocol + url);
+    this.isBinary = function(value)
+    {
+        return typeof ArrayBuffer !== "undefined" && value !== null && value !== undefined &&
+            (value instanceof ArrayBuffer || ArrayBuffer.isView(value));
+    };
+
+    this.hasBinaryArgs = function(args)
+    {
+        for (var i = 0; i < args.length; i++) {
+            if (this.isBinary(args[i])) {
+                return true;
+            }
+        }
+        return false;
+    };
+
+    this.encodeBinaryMessage = function(name, args, callId)
+    {
+        // see pew.messages for the envelope format
+        var blobs = [];
+        var self = this;
+        var header = JSON.stringify({name: name, args: args, id: callId}, function(key, value) {
+            if (self.isBinary(value)) {
+                var bytes = value instanceof ArrayBuffer ? new Uint8Array(value) :
+                    new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+                blobs.push(bytes);
+                return {"$blob": blobs.length - 1};
+            }
+            return value;
+        });
+        header = new TextEncoder().encode(header);
+
+        var size = 8 + header.length;
+        for (var i = 0; i < blobs.length; i++) {
+            size += 4 + blobs[i].length;
+        }
+        var buffer = new Uint8Array(size);
+        var view = new DataView(buffer.buffer);
+        buffer.set([80, 69, 87, 66]);  // "PEWB"
+        view.setUint32(4, header.length);
+        buffer.set(header, 8);
+        var offset = 8 + header.length;
+        for (var n = 0; n < blobs.length; n++) {
+            view.setUint32(offset, blobs[n].length);
+            buffer.set(blobs[n], offset + 4);
+            offset += 4 + blobs[n].length;
+        }
+        return buffer.buffer;
+    };
+
+    this.call = function(name)
+    {
+        // calls Python delegate method name with the remaining arguments and returns a Promise for
+        // its return value. The promise is rejected with an Error named after the Python exception
+        // if the method raises, or a TimeoutError if no result arrives within callTimeout.
+        var args = Array.prototype.slice.call(arguments, 1);
+        var self = this;
+        return new Promise(function(resolve, reject) {
+            var callId = self.nextCallId++;
+            var timer = null;
+            if (self.callTimeout > 0) {
+                timer = setTimeout(function() {
+                    self.resolveCall({reply: callId, error: {type: "TimeoutError",
+                        message: name + " did not return within " + self.callTimeout + " ms"}});
+                }, self.callTimeout);
+            }
+            self.pendingCalls[callId] = {resolve: resolve, reject: reject, timer: timer};
+            self.postMessage(name, args, callId);
+        });
+    };
+
+    this.notify = function(name)
+    {
+        // sends a message without waiting for a result, which saves Python the reply
+        this.postMessage(name, Array.prototype.slice.call(arguments, 1));
+    };
+
+	this.sendMessage = function()
+	{
+		// fire-and-forget, use call to get the return value of the Python delegate method
+		this.notify.apply(this, arguments);
+	};
+
+    this.getMessageHandler = function()
+    {
+        // native backends that register a script message handler (WebKitGTK) receive messages
+        // as structured values, without encoding them in a URL and cancelling a navigation
+        if (window.webkit && window.webkit.messageHandlers && window.webkit.messageHandlers.pew) {
+            return window.webkit.messageHandlers.pew;
+        }
+        return null;
+    };
+
+    this.postMessage = function(name, args, callId)
+    {
+        // sends a message to Python. If a callId is given, the result is passed to resolveCall.
+        var self = this;
+        var handler = this.getMessageHandler();
+        if (handler !== null && !this.hasBinaryArgs(args)) {
+            // the result arrives through receiveMessage
+            handler.postMessage({name: name, args: args, id: callId});
+        } else if (window.pewAndroid !== undefined && !this.hasBinaryArgs(args)) {
+            // Android's Java interface queues the message for Python, the result arrives through receiveMessage
+            window.pewAndroid.postMessage(JSON.stringify({name: name, args: args, id: callId}));
+        } else if (window.pewNative !== undefined && !this.hasBinaryArgs(args)) {
+            // the Chromium backend calls Python directly, which returns the result to the callback
+            window.pewNative.postMessage({name: name, args: args, id: callId}, function(result) {
+                self.resolveCall(result);
+            });
+        } else if (this.socket !== null && this.socket.readyState === WebSocket.OPEN) {
+            if (this.hasBinaryArgs(args)) {
+                this.socket.send(this.encodeBinaryMessage(name, args, callId));
+            } else {
+                this.socket.send(JSON.stringify({name: name, args: args, id: callId}));
+            }
+        } else if (this.protocol !== null) {
+            console.log("sending message " + name);
+            if (/^https?:/.test(this.protocol)) {
+                // send the message to the message server in the body so large payloads are not limited by URL length
+                var binary = this.hasBinaryArgs(args);
+                var request = $.ajax({
+                    url: this.protocol + name,
+                    type: "POST",
+                    contentType: binary ? "application/octet-stream" : "text/plain",
+                    processData: false,
+                    data: binary ? this.encodeBinaryMessage(name, args, callId) :
+                        JSON.stringify({name: name, args: args, id: callId})
+                });
+                if (callId !== undefined) {
+                    // the message server sends the result in the response
+                    request.done(function(response) {
+                        self.resolveCall(response);
+                    }).fail(function(xhr) {
+                        self.resolveCall({reply: callId, error: {type: "HTTPError", message: xhr.status + " " + xhr.statusText}});
+                    });
+                }
+            } else {
+                // the result arrives through receiveMessage
+                $.ajax(this.protocol + this.encodeURLMessage(name, args, callId));
+            }
         } else if (this.js_controller !== null) {
-            var methodString = "this.js_controller." + arguments[0].replace("/", ".") + "(";
-            if (arguments.length > 1)
+            var methodString = "this.js_controller." + name.replace("/", ".") + "(";
+            if (args.length > 0)
             {
-                for (var n = 1; n < arguments.length; n++) {
-                    methodString += '"' + arguments[n] + '",';
+                for (var n = 0; n < args.length; n++) {
+                    methodString += '"' + args[n] + '",';
                 }
                 methodString = methodString.substring(0, methodString.length - 1);
             }
             methodString += ");";
             console.log("sending message " + methodString);
             try {
-                eval(methodString);
+                var result = eval(methodString);
+                this.resolveCall({reply: callId, value: result === undefined ? null : result});
             } catch(err) {
                 console.log(err);
+                this.resolveCall({reply: callId, error: {type: err.name, message: err.message}});
             }
         } else {
-            console.log("Not handling message " + url);
+            console.log("Not handling message " + name);
+            this.resolveCall({reply: callId, error: {type: "Error", message: "No bridge to Python"}});
         }
-	};
-
+    };
 };
 
 var bridge = new NativeBridge();
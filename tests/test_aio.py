@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import unittest
+
+import pew
+import pew.aio
+from pew.pending import JavaScriptError, PEWTimeoutError
+
+
+class FakeWebView(object):
+    def __init__(self):
+        self.handler = None
+        self.scripts = []
+        self.main_thread_calls = 0
+
+    def run_on_main_thread(self, func, *args, **kwargs):
+        self.main_thread_calls += 1
+        threading.Thread(target=func, args=args, kwargs=kwargs).start()
+
+    def evaluate_javascript(self, js):
+        self.scripts.append(js)
+        if js.startswith('bridge.getJSValue("answer"'):
+            request_id = int(js.split(", ")[1].rstrip(");"))
+            self.handler.js_value_result(request_id, {'value': 42})
+
+
+class ResultWebView(object):
+    javascript_results = True
+
+    def evaluate_javascript(self, js, callback=None):
+        if js == "1 + 1":
+            callback(2, None)
+        else:
+            callback(None, JavaScriptError("ReferenceError"))
+
+
+class Delegate(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.thread = None
+
+    async def fetch(self):
+        await asyncio.sleep(0)
+        self.thread = threading.current_thread()
+        self.done.set()
+
+    @pew.background
+    async def fetch_later(self):
+        await self.fetch()
+
+
+class AsyncBridgeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        pew.aio.set_event_loop(cls.loop)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        pew.aio.set_event_loop(None)
+
+    def setUp(self):
+        self.webview = FakeWebView()
+        self.delegate = Delegate()
+        self.handler = pew.PEWMessageHandler(self.webview, self.delegate)
+        self.webview.handler = self.handler
+        self.bridge = pew.aio.AsyncBridge(self.handler, self.webview.run_on_main_thread)
+
+    def run_coroutine(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(2)
+
+    def test_evaluate_javascript(self):
+        self.run_coroutine(self.bridge.evaluate_javascript("a();"))
+        self.assertEqual(self.webview.scripts, ["a();"])
+        self.assertEqual(self.webview.main_thread_calls, 1)
+
+    def test_evaluate_javascript_result(self):
+        webview = ResultWebView()
+        bridge = pew.aio.AsyncBridge(pew.PEWMessageHandler(webview, self.delegate), self.webview.run_on_main_thread)
+        self.assertEqual(self.run_coroutine(bridge.evaluate_javascript("1 + 1")), 2)
+        with self.assertRaises(JavaScriptError):
+            self.run_coroutine(bridge.evaluate_javascript("missing()"))
+
+    def test_get_js_value(self):
+        self.assertEqual(self.run_coroutine(self.bridge.get_js_value("answer")), 42)
+        with self.assertRaises(PEWTimeoutError):
+            self.run_coroutine(self.bridge.get_js_value("missing", timeout=0.05))
+
+    def test_coroutine_delegate_methods_run_on_loop(self):
+        self.assertTrue(self.handler.parse_message("myapp://fetch"))
+        self.assertTrue(self.delegate.done.wait(2))
+        self.assertIs(self.delegate.thread, self.thread)
+
+    def test_background_coroutines_run_without_call_id(self):
+        self.assertTrue(self.handler.parse_message('{"name": "fetch_later", "args": []}'))
+        self.assertTrue(self.delegate.done.wait(2))
+        self.assertIs(self.delegate.thread, self.thread)
+
+
+class DefaultEventLoopTest(unittest.TestCase):
+    def tearDown(self):
+        loop = pew.aio.get_event_loop()
+        loop.call_soon_threadsafe(loop.stop)
+        pew.aio.set_event_loop(None)
+
+    def test_loop_starts_without_native_backend(self):
+        pew.aio.set_event_loop(None)
+        delegate = Delegate()
+        handler = pew.PEWMessageHandler(FakeWebView(), delegate)
+        self.assertTrue(handler.parse_message("myapp://fetch"))
+        self.assertTrue(delegate.done.wait(2))
+        self.assertIsInstance(delegate.thread, threading.Thread)
+        self.assertIsNot(delegate.thread, threading.current_thread())
+
+    def test_call_on_main_thread_without_native_backend(self):
+        pew.aio.set_event_loop(None)
+
+        async def call():
+            return await pew.aio.call_on_main_thread(lambda: 3)
+
+        self.assertEqual(pew.aio.run_coroutine(call()).result(2), 3)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from six.moves import http_client
+
+import pew
+import pew.aio
+from pew import websocket
+from pew.app_server import AppServer
+
+
+class Delegate(object):
+    def __init__(self):
+        self.calls = []
+
+    def save(self, value):
+        self.calls.append(('save', value))
+
+    def fail(self):
+        raise ValueError("failed")
+
+    @pew.background
+    def load(self, name):
+        return {'name': name}
+
+
+class AppServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        pew.aio.set_event_loop(cls.loop)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        pew.aio.set_event_loop(None)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        with open(os.path.join(self.root, "index.html"), "wb") as index:
+            index.write(b"<html></html>")
+        # too large for the cache, so it is sent straight from the file
+        self.video = os.urandom(64 * 1024) * 80
+        with open(os.path.join(self.root, "video.mp4"), "wb") as video:
+            video.write(self.video)
+
+        self.delegate = Delegate()
+        handler = pew.PEWMessageHandler(None, self.delegate)
+        self.server = AppServer(self.root, handler, dispatch_on_main_thread=False)
+        self.url = self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.root)
+
+    def request(self, connection, method, path, body=None, headers={}):
+        if path.startswith("/_pew/"):
+            path = self.server.bridge_path + path[len("/_pew/"):]
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response, response.read()
+
+    def test_files_and_messages_on_one_port(self):
+        self.assertNotEqual(self.server.port, 0)
+        self.assertEqual(self.url, "http://127.0.0.1:%d/" % self.server.port)
+
+        connection = http_client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+        response, body = self.request(connection, "GET", "/")
+        self.assertEqual((response.status, body), (200, b"<html></html>"))
+        sock = connection.sock
+
+        response, body = self.request(connection, "GET", "/", headers={"If-None-Match": response.getheader("ETag")})
+        self.assertEqual(response.status, 304)
+        response, body = self.request(connection, "GET", "/video.mp4")
+        self.assertEqual((response.status, body), (200, self.video))
+        response, body = self.request(connection, "GET", "/video.mp4", headers={"Range": "bytes=100-199"})
+        self.assertEqual((response.status, body), (206, self.video[100:200]))
+        self.assertEqual(self.request(connection, "GET", "/missing.txt")[0].status, 404)
+
+        response, body = self.request(connection, "POST", "/_pew/save", "%5B1%5D")
+        self.assertEqual((response.status, json.loads(body.decode("utf-8"))), (200, {"ok": True}))
+        response, body = self.request(connection, "POST", "/_pew/", '{"name": "load", "args": ["a"], "id": 3}')
+        self.assertEqual(json.loads(body.decode("utf-8")), {"reply": 3, "value": {"name": "a"}, "error": None})
+        response, body = self.request(connection, "GET", "/_pew/fail?_call_id=4")
+        self.assertEqual(json.loads(body.decode("utf-8"))["error"]["type"], "ValueError")
+        self.assertEqual(self.request(connection, "GET", "/_pew/missing")[0].status, 500)
+        # everything was served over the same connection
+        self.assertIs(connection.sock, sock)
+        connection.close()
+
+        self.assertEqual(self.delegate.calls, [('save', [1])])
+
+    def test_foreign_origins_are_rejected(self):
+        connection = http_client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+        response, body = self.request(connection, "POST", "/_pew/save", "%5B1%5D",
+                                      headers={"Origin": "https://example.com"})
+        self.assertEqual(response.status, 403)
+        response, body = self.request(connection, "POST", "/_pew/save", "%5B1%5D",
+                                      headers={"Origin": self.server.origin})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Access-Control-Allow-Origin"), self.server.origin)
+        connection.close()
+        self.assertEqual(self.delegate.calls, [('save', [1])])
+
+        sock, rfile, status = self.connect(b"/_pew/ws", b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                                                        b"Origin: https://example.com\r\n"
+                                                        b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n")
+        self.assertIn(b"403", status)
+        sock.close()
+
+    def test_token_is_required(self):
+        self.assertEqual(self.server.bridge_url, self.url + "_pew/%s/" % self.server.token)
+        connection = http_client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+        for path in ("/_pew/save?1", "/_pew/wrong/save?1", "/_pew/events"):
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(response.status, 403)
+        connection.close()
+
+        sock, rfile, status = self.connect(b"/_pew/ws", b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                                                        b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n",
+                                           token=False)
+        self.assertIn(b"403", status)
+        sock.close()
+        self.assertEqual(self.delegate.calls, [])
+        self.assertEqual(len(self.server.clients), 0)
+
+    def test_start_on_the_event_loop(self):
+        server = AppServer(None, None)
+
+        async def start():
+            with self.assertRaises(RuntimeError):
+                server.start()
+            return await server.start_serving()
+
+        self.assertEqual(asyncio.run_coroutine_threadsafe(start(), self.loop).result(5), server.url)
+        server.stop()
+
+    def test_body_size_limit(self):
+        self.server.max_body_size = 10
+        connection = http_client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+        self.assertEqual(self.request(connection, "POST", "/_pew/save", "x" * 11)[0].status, 413)
+        connection.close()
+
+    def connect(self, path, headers=b"", token=True):
+        if token:
+            path = self.server.bridge_path.encode("ascii") + path[len(b"/_pew/"):]
+        sock = socket.create_connection(("127.0.0.1", self.server.port), timeout=5)
+        sock.sendall(b"GET " + path + b" HTTP/1.1\r\nHost: localhost\r\n" + headers + b"\r\n")
+        rfile = sock.makefile("rb")
+        status = rfile.readline()
+        line = rfile.readline()
+        while line.strip():
+            line = rfile.readline()
+        return sock, rfile, status
+
+    def wait_for_clients(self, count):
+        for _ in range(100):
+            if len(self.server.clients) == count:
+                return
+            threading.Event().wait(0.01)
+        self.fail("expected %d clients" % count)
+
+    def test_websocket(self):
+        sock, rfile, status = self.connect(b"/_pew/ws", b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                                                        b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n")
+        self.assertIn(b"101", status)
+
+        mask = b"\x01\x02\x03\x04"
+        payload = b'{"name": "load", "args": ["b"], "id": 1}'
+        frame = bytearray(websocket.encode_frame(websocket.OP_TEXT, b""))
+        frame[1] = 0x80 | len(payload)
+        sock.sendall(bytes(frame) + mask + websocket.apply_mask(payload, mask))
+        first, length = bytearray(rfile.read(2))
+        self.assertEqual(json.loads(rfile.read(length).decode("utf-8")),
+                         {"reply": 1, "value": {"name": "b"}, "error": None})
+
+        self.wait_for_clients(1)
+        self.server.clients.evaluate_javascript("app.refresh()")
+        first, length = bytearray(rfile.read(2))
+        self.assertEqual(json.loads(rfile.read(length).decode("utf-8")), {"eval": "app.refresh()"})
+        sock.close()
+
+    def test_event_stream(self):
+        sock, rfile, status = self.connect(b"/_pew/events")
+        self.assertIn(b"200", status)
+        self.wait_for_clients(1)
+
+        self.server.clients.call_js_function("app.update", 1)
+        self.assertEqual(rfile.readline(), b'data: {"call": "app.update", "args": [1]}\n')
+        sock.close()
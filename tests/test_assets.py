@@ -0,0 +1,68 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import pew.assets
+from pew.assets import ZipAssetBundle, normalize_path, open_bundle
+
+
+class AssetBundleTest(unittest.TestCase):
+    def tearDown(self):
+        pew.assets.bundle = None
+        pew.assets.scheme = pew.assets.DEFAULT_SCHEME
+
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path("/"), "index.html")
+        self.assertEqual(normalize_path("/lib/../css/app.css?v=1"), "css/app.css")
+        self.assertEqual(normalize_path("/../../etc/passwd"), "etc/passwd")
+        self.assertEqual(normalize_path("/docs/"), "docs/index.html")
+
+    def test_zip_bundle(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as bundle_zip:
+            bundle_zip.writestr("web/index.html", "<html></html>")
+            bundle_zip.writestr("web/lib/app.js", "var x = 1;")
+            bundle_zip.writestr("other.txt", "not served")
+        archive.seek(0)
+
+        bundle = ZipAssetBundle(archive, "web")
+        self.assertEqual(sorted(bundle.index), ["index.html", "lib/app.js"])
+        asset = bundle.load("/lib/app.js")
+        self.assertEqual(asset.data, b"var x = 1;")
+        self.assertEqual(asset.content_type, "application/javascript; charset=utf-8")
+        self.assertEqual(asset.headers["Content-Length"], "10")
+        self.assertIn("immutable", asset.headers["Cache-Control"])
+        with self.assertRaises(KeyError):
+            bundle.load("/../other.txt")
+
+    def test_urls(self):
+        pew.assets.set_bundle({"index.html": b"<html></html>", "img/a.png": b"\x89PNG"}, "myui")
+        self.assertEqual(pew.assets.get_url(), "myui://bundle/index.html")
+        self.assertTrue(pew.assets.is_asset_url("myui://bundle/img/a.png"))
+        self.assertFalse(pew.assets.is_asset_url("file:///img/a.png"))
+        self.assertEqual(pew.assets.load_url("myui://bundle/").data, b"<html></html>")
+        self.assertEqual(pew.assets.load_url("myui:///img/a.png").content_type, "image/png")
+
+    def test_encoded_urls(self):
+        pew.assets.set_bundle({"index.html": b"<html></html>", "img/my file.png": b"\x89PNG"}, "myui")
+        self.assertEqual(pew.assets.load_url("myui://bundle/img/my%20file.png?v=1").data, b"\x89PNG")
+        # encoded .. cannot leave the bundle either
+        self.assertEqual(pew.assets.load_url("myui://bundle/img/%2e%2e/%2E%2E/index.html").data, b"<html></html>")
+        with self.assertRaises(KeyError):
+            pew.assets.load_url("myui://bundle/img/my%2520file.png")
+
+    def test_directory_bundle(self):
+        root = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(root, "index.html"), "wb") as index:
+                index.write(b"<html></html>")
+            bundle = open_bundle(root)
+            self.assertEqual(bundle.load("/").data, b"<html></html>")
+            self.assertEqual(bundle.cache_control, "no-cache")
+            with self.assertRaises(KeyError):
+                bundle.load("/missing.js")
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from six.moves import http_client
+
+import pew.aio
+from pew.devserver import DevServer
+
+
+class DevServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        pew.aio.set_event_loop(cls.loop)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        pew.aio.set_event_loop(None)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "css"))
+        with open(os.path.join(self.root, "index.html"), "wb") as index:
+            index.write(b"<html><body></body></html>")
+        with open(os.path.join(self.root, "css", "app.css"), "wb") as stylesheet:
+            stylesheet.write(b"body {}")
+
+        self.server = DevServer(self.root, debounce=0.05)
+        self.server.start()
+        self.connection = http_client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.stop()
+        shutil.rmtree(self.root)
+
+    def get(self, path):
+        self.connection.request("GET", path)
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_pages_load_the_reload_script(self):
+        response, body = self.get("/")
+        expected = b'<html><body><script src="/_pew/%s/livereload.js"></script></body></html>' % (
+            self.server.token.encode("ascii"))
+        self.assertEqual(body, expected)
+        self.assertEqual(int(response.getheader("Content-Length")), len(expected))
+        self.assertEqual(self.get("/css/app.css")[1], b"body {}")
+
+        response, body = self.get(self.server.client_path)
+        self.assertEqual(response.status, 200)
+        self.assertIn(b"EventSource", body)
+        self.assertEqual(self.get("/_pew/livereload.js")[0].status, 403)
+
+    def listen(self):
+        sock = socket.create_connection(("127.0.0.1", self.server.port), timeout=5)
+        path = (self.server.bridge_path + "events").encode("ascii")
+        sock.sendall(b"GET " + path + b" HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        rfile = sock.makefile("rb")
+        while rfile.readline().strip():
+            pass
+        for _ in range(100):
+            if len(self.server.clients) == 1:
+                break
+            threading.Event().wait(0.01)
+        return sock, rfile
+
+    def read_event(self, rfile):
+        line = rfile.readline()
+        self.assertTrue(line.startswith(b"data: "))
+        rfile.readline()
+        return json.loads(line[len(b"data: "):].decode("utf-8"))
+
+    def test_changes_are_pushed(self):
+        sock, rfile = self.listen()
+
+        self.server.files_changed([os.path.join(self.root, "css", "app.css")])
+        self.assertEqual(self.read_event(rfile), {"css": ["/css/app.css"]})
+        self.server.files_changed([os.path.join(self.root, "css", "app.css"), os.path.join(self.root, "index.html")])
+        self.assertEqual(self.read_event(rfile), {"reload": True})
+
+        with open(os.path.join(self.root, "css", "app.css"), "wb") as stylesheet:
+            stylesheet.write(b"body { color: red; }")
+        self.assertEqual(self.read_event(rfile), {"css": ["/css/app.css"]})
+        sock.close()
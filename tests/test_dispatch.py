@@ -0,0 +1,131 @@
+import threading
+import unittest
+
+import pew
+from pew.dispatch import MessageDispatcher, route
+from pew.pending import PendingResult
+
+
+class Controller(object):
+    def __init__(self):
+        self.calls = []
+
+    def refresh(self):
+        self.calls.append('refresh')
+
+
+class Delegate(object):
+    def __init__(self):
+        self.calls = []
+        self.controller = Controller()
+
+    def load_complete(self):
+        self.calls.append('load_complete')
+
+    @route('user/save', 'user/update')
+    def save_user(self, name=None):
+        self.calls.append(('save_user', name))
+        return name
+
+    @route
+    def ping(self):
+        return 'pong'
+
+    @pew.background
+    def load(self, path):
+        self.calls.append(('load', threading.current_thread()))
+        if not path:
+            raise IOError("no path")
+        return {'path': path}
+
+    def _private(self):
+        self.calls.append('_private')
+
+
+class MessageDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.delegate = Delegate()
+        self.dispatcher = MessageDispatcher(self.delegate)
+
+    def test_resolves_method_by_name(self):
+        self.dispatcher.dispatch('load_complete')
+        self.assertEqual(self.delegate.calls, ['load_complete'])
+
+    def test_resolves_dotted_path(self):
+        self.dispatcher.dispatch('controller/refresh')
+        self.assertEqual(self.delegate.controller.calls, ['refresh'])
+
+    def test_decorated_routes(self):
+        self.assertEqual(self.dispatcher.dispatch('user/save', ('ann',)), 'ann')
+        self.assertEqual(self.dispatcher.dispatch('user.update', kwargs={'name': 'bob'}), 'bob')
+        self.assertEqual(self.dispatcher.dispatch('ping'), 'pong')
+
+    def test_resolution_is_cached(self):
+        first = self.dispatcher.resolve('load_complete')
+        self.delegate.load_complete = lambda: None
+        self.assertIs(self.dispatcher.resolve('load_complete'), first)
+        self.dispatcher.invalidate()
+        self.assertIsNot(self.dispatcher.resolve('load_complete'), first)
+
+    def test_unknown_and_private_routes(self):
+        self.assertIsNone(self.dispatcher.resolve('does_not_exist'))
+        self.assertIn('does_not_exist', self.dispatcher._missing)
+        self.assertIsNone(self.dispatcher.resolve('_private'))
+        self.assertIsNone(self.dispatcher.resolve('controller.__class__'))
+        with self.assertRaises(KeyError):
+            self.dispatcher.dispatch('_private')
+        self.assertEqual(self.delegate.calls, [])
+
+    def test_register_overrides_missing(self):
+        self.assertIsNone(self.dispatcher.resolve('late'))
+        self.dispatcher.register('late', lambda: 'here')
+        self.assertEqual(self.dispatcher.dispatch('late'), 'here')
+
+
+class MessageHandlerTest(unittest.TestCase):
+    def test_parse_message(self):
+        delegate = Delegate()
+        handler = pew.PEWMessageHandler(None, delegate)
+        self.assertTrue(handler.parse_message('myapp://load_complete'))
+        self.assertTrue(handler.parse_message('myapp://controller/refresh'))
+        self.assertTrue(handler.message_received)
+        self.assertFalse(handler.parse_message('myapp://missing'))
+        self.assertEqual(delegate.calls, ['load_complete'])
+        self.assertEqual(delegate.controller.calls, ['refresh'])
+
+    def test_background_calls_reply(self):
+        delegate = Delegate()
+        handler = pew.PEWMessageHandler(None, delegate)
+
+        def call(message):
+            result = PendingResult(None)
+            handler.parse_message(message, lambda call_id, value, error: result.set_result((call_id, value, error)))
+            return result.wait(5)
+
+        call_id, value, error = call('{"name": "load", "args": ["a.txt"], "id": 1}')
+        self.assertEqual((call_id, value, error), (1, {'path': 'a.txt'}, None))
+        self.assertIsNot(delegate.calls[0][1], threading.current_thread())
+
+        call_id, value, error = call('{"name": "load", "args": [""], "id": 2}')
+        self.assertEqual(call_id, 2)
+        self.assertIsInstance(error, IOError)
+
+        self.assertEqual(call('myapp://ping?_call_id=3'), (3, 'pong', None))
+        self.assertIsInstance(call('{"name": "missing", "id": 4}')[2], KeyError)
+        handler.executor.shutdown()
+
+    def test_replies_only_for_calls(self):
+        delegate = Delegate()
+        handler = pew.PEWMessageHandler(None, delegate)
+        replies = []
+
+        def reply(call_id, value, error):
+            replies.append(call_id)
+
+        # messages without a call ID, as sent by bridge.notify and bridge.sendMessage, get no reply
+        handler.parse_message('{"name": "load_complete"}', reply)
+        handler.parse_message('{"name": "missing"}', reply)
+        handler.parse_message('myapp://ping', reply)
+        self.assertEqual(replies, [])
+        handler.parse_message('{"name": "load_complete", "id": 5}', reply)
+        self.assertEqual(replies, [5])
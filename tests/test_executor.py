@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+
+from pew.executor import TaskLoop
+
+
+class TaskLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = TaskLoop()
+        self.thread = threading.Thread(target=self.loop.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.loop.stop()
+        self.thread.join(1)
+
+    def test_tasks_run_on_the_loop_thread(self):
+        done = threading.Event()
+        threads = []
+
+        def task(value):
+            threads.append((threading.current_thread(), value))
+            done.set()
+
+        self.loop.call_soon(task, 1)
+        self.assertTrue(done.wait(1))
+        self.assertEqual(threads, [(self.thread, 1)])
+
+    def test_timers(self):
+        calls = []
+        done = threading.Event()
+        start = time.time()
+        self.loop.call_later(0.1, lambda: (calls.append("late"), done.set()))
+        self.loop.call_later(0.02, calls.append, "early")
+        self.loop.call_later(0.05, calls.append, "cancelled").cancel()
+        self.assertTrue(done.wait(1))
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertEqual(calls, ["early", "late"])
+
+    def test_stop(self):
+        self.loop.call_soon(lambda: 1 / 0)
+        self.loop.stop()
+        self.thread.join(1)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(self.loop.running)
+
+
+class RunPendingTest(unittest.TestCase):
+    def test_run_pending_does_not_wait(self):
+        loop = TaskLoop()
+        calls = []
+        loop.call_soon(calls.append, 1)
+        loop.call_later(10, calls.append, 2)
+        self.assertEqual(loop.run_pending(), 1)
+        self.assertEqual(loop.run_pending(), 0)
+        self.assertEqual(calls, [1])
+
+    def test_timers_ignore_wall_clock_changes(self):
+        loop = TaskLoop()
+        calls = []
+        loop.call_later(10, calls.append, 1)
+        wall_clock = time.time
+        time.time = lambda: wall_clock() + 3600
+        try:
+            self.assertEqual(loop.run_pending(), 0)
+        finally:
+            time.time = wall_clock
+        self.assertEqual(calls, [])
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import pew
+from pew.headless import main_loop
+from pew.headless.bridge import NativeBridgeStub, parse_arguments
+from pew.headless.webview import NativeWebView
+from pew.pending import JavaScriptError
+
+
+class HeadlessWebView(NativeWebView):
+    """
+    Forwards bridge messages to its delegate, like pew.ui.WebUIView does.
+    """
+    def __init__(self):
+        super(HeadlessWebView, self).__init__()
+        self.delegate = None
+        self.loaded = []
+
+    def webview_should_start_load(self, webview, url, nav_type):
+        return not url.startswith("blocked:")
+
+    def webview_did_finish_load(self, webview, url=None):
+        self.loaded.append(url)
+
+    def webview_did_receive_message(self, webview, message, reply=None):
+        return self.delegate.parse_message(message, reply)
+
+
+class Delegate(object):
+    def add(self, a, b):
+        return a + b
+
+    def fail(self):
+        raise ValueError("failed")
+
+
+class HeadlessWebViewTest(unittest.TestCase):
+    def setUp(self):
+        self.webview = HeadlessWebView()
+
+    def tearDown(self):
+        main_loop.run_pending()
+
+    def test_navigation(self):
+        self.webview.load_url("http://example.com/a")
+        self.webview.load_url("blocked:b")
+        self.webview.load_url("http://example.com/c")
+        main_loop.run_pending()
+        self.assertEqual(self.webview.loaded, ["http://example.com/a", "http://example.com/c"])
+
+        # vetoed navigations are not added to the history
+        self.assertEqual(self.webview.history, ["http://example.com/a", "http://example.com/c"])
+
+        self.webview.go_back()
+        main_loop.run_pending()
+        self.assertEqual(self.webview.get_url(), "http://example.com/a")
+        self.webview.go_forward()
+        main_loop.run_pending()
+        self.assertEqual(self.webview.get_url(), "http://example.com/c")
+        self.assertEqual(self.webview.history_index, 1)
+
+    def test_scripts_are_recorded(self):
+        results = []
+        self.webview.evaluate_javascript("update(1);", lambda value, error: results.append((value, error)))
+        self.assertEqual(list(self.webview.scripts), ["update(1);"])
+        self.assertEqual(self.webview.script_count, 1)
+        self.assertEqual(results, [(None, None)])
+        self.assertFalse(self.webview.javascript_results)
+
+
+class NativeBridgeStubTest(unittest.TestCase):
+    def setUp(self):
+        self.webview = HeadlessWebView()
+        self.handler = pew.PEWMessageHandler(self.webview, Delegate())
+        self.webview.delegate = self.handler
+        self.bridge = NativeBridgeStub(self.webview, values={"app.count": 3})
+
+    def test_calls_from_js(self):
+        self.assertEqual(self.bridge.call("add", 1, 2).wait(1), 3)
+        with self.assertRaises(JavaScriptError):
+            self.bridge.call("fail").wait(1)
+        self.assertEqual(len(self.bridge.pending_calls), 0)
+
+    def test_calls_to_js(self):
+        updates = []
+        self.bridge.functions["update"] = updates.append
+        self.webview.evaluate_javascript("try { update({\"a\": 1}); } catch (e) { console.error(e); }\n"
+                                         "try { show('b', 2); } catch (e) { console.error(e); }")
+        self.assertEqual(self.bridge.calls, [("update", [{"a": 1}]), ("show", ["b", 2])])
+        self.assertEqual(updates, [{"a": 1}])
+
+    def test_js_values(self):
+        self.assertTrue(self.webview.javascript_results)
+        self.assertEqual(self.handler.get_js_value("app.count"), 3)
+        with self.assertRaises(JavaScriptError):
+            self.handler.get_js_value("missing")
+
+        pending = self.handler.js_requests.create()
+        self.bridge('bridge.getJSValue("app.count", %d);' % pending.request_id)
+        self.assertEqual(pending.wait(1), 3)
+        self.bridge("bridge.setProtocol('pew')")
+        self.assertEqual(self.bridge.protocol, "pew")
+
+    def test_parse_arguments(self):
+        self.assertEqual(parse_arguments(""), [])
+        self.assertEqual(parse_arguments('1, "a", [true, null]'), [1, "a", [True, None]])
+        self.assertEqual(parse_arguments("'it\\'s', 2.5"), ["it's", 2.5])
+        self.assertEqual(parse_arguments("a + b"), ["a + b"])
+
+
+class HeadlessAppTest(unittest.TestCase):
+    def test_app_runs_headless(self):
+        script = textwrap.dedent("""
+            import pew, pew.ui
+            from pew.headless.bridge import NativeBridgeStub
+
+            class App(pew.ui.PEWApp):
+                def setUp(self):
+                    self.webview = pew.ui.WebUIView("Test")
+                    self.webview.delegate = pew.PEWMessageHandler(self.webview, self)
+                    self.bridge = NativeBridgeStub(self.webview)
+                    self.result = self.bridge.call("add", 1, 2)
+                    self.result.add_done_callback(lambda result: self.shutdown())
+
+                def add(self, a, b):
+                    return a + b
+
+            app = App()
+            app.run()
+            print(pew.ui.platforms, app.result.value)
+        """)
+        env = dict(os.environ, PEW_PREFERRED_PLATFORMS="headless",
+                   PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output([sys.executable, "-c", script], env=env, timeout=30)
+        self.assertEqual(output.decode("utf-8").split(), ["['headless']", "3"])
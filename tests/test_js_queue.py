@@ -0,0 +1,80 @@
+import threading
+import unittest
+
+from pew.js_queue import JSCallQueue
+
+
+class JSCallQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.scripts = []
+        self.scheduled = []
+
+    def create_queue(self, **kwargs):
+        return JSCallQueue(self.scripts.append, self.scheduled.append, **kwargs)
+
+    def test_batches_calls_into_one_script(self):
+        queue = self.create_queue(interval=None)
+        queue.add('a', 'a(1);')
+        queue.add('b', 'b(2);')
+        queue.add('a', 'a(3);')
+
+        # only one flush is scheduled per batch
+        self.assertEqual(self.scheduled, [queue.flush])
+        self.assertEqual(len(queue), 3)
+
+        self.scheduled[0]()
+        self.assertEqual(len(self.scripts), 1)
+        script = self.scripts[0]
+        self.assertTrue(script.index('a(1);') < script.index('b(2);') < script.index('a(3);'))
+
+        queue.flush()
+        self.assertEqual(len(self.scripts), 1)
+
+    def test_single_call_is_sent_unwrapped(self):
+        queue = self.create_queue(interval=None)
+        queue.add('a', 'a(1);')
+        queue.flush()
+        self.assertEqual(self.scripts, ['a(1);'])
+
+    def test_coalesce_keeps_latest_call(self):
+        queue = self.create_queue(interval=None, coalesce=['progress'])
+        queue.add('progress', 'progress(1);')
+        queue.add('log', 'log(1);')
+        queue.add('log', 'log(2);')
+        queue.add('progress', 'progress(2);')
+        queue.flush()
+
+        script = self.scripts[0]
+        self.assertNotIn('progress(1);', script)
+        self.assertTrue(script.index('log(1);') < script.index('log(2);') < script.index('progress(2);'))
+
+    def test_interval_flush(self):
+        flushed = threading.Event()
+
+        def schedule(func):
+            func()
+            flushed.set()
+
+        queue = JSCallQueue(self.scripts.append, schedule, interval=0.001)
+        queue.add('a', 'a(1);')
+        self.assertTrue(flushed.wait(1))
+        self.assertEqual(self.scripts, ['a(1);'])
+
+    def test_interval_flushes_share_one_thread(self):
+        flushed = threading.Semaphore(0)
+
+        def schedule(func):
+            func()
+            flushed.release()
+
+        queue = JSCallQueue(self.scripts.append, schedule, interval=0.001)
+        threads = threading.active_count()
+        for i in range(3):
+            queue.add('a', 'a(%d);' % i)
+            self.assertTrue(flushed.acquire(timeout=1))
+        self.assertEqual(self.scripts, ['a(0);', 'a(1);', 'a(2);'])
+        self.assertEqual(threading.active_count(), threads + 1)
+
+        queue.close()
+        queue._flusher.join(1)
+        self.assertFalse(queue._flusher.is_alive())
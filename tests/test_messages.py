@@ -0,0 +1,54 @@
+import datetime
+import decimal
+import json
+import unittest
+
+from pew.messages import (Message, decode_message, encode_binary_message, encode_json_message,
+                          encode_result)
+
+
+class MessageDecodingTest(unittest.TestCase):
+    def test_legacy_url(self):
+        self.assertEqual(decode_message('myapp://user/save?%7B%22id%22%3A1%7D&empty_string&label=a%3Db'),
+                         Message('user.save', [{'id': 1}, ''], {'label': 'a=b'}))
+        self.assertEqual(decode_message('/load_complete'), Message('load_complete', [], {}))
+        self.assertEqual(decode_message('load_complete?caf%C3%A9'), Message('load_complete', [u'caf\xe9'], {}))
+        # only a literal "=" separates a keyword argument
+        self.assertEqual(decode_message('save?key%3Dvalue'), Message('save', ['key=value'], {}))
+
+    def test_json_document(self):
+        text = encode_json_message('user/save', ['123', {'id': 1}], {'force': True})
+        self.assertEqual(decode_message(text), Message('user.save', ['123', {'id': 1}], {'force': True}))
+        self.assertEqual(decode_message(text.encode('utf-8')).args[0], '123')
+
+    def test_binary_envelope(self):
+        data = encode_binary_message('upload', [b'\x00\x01', {'thumb': bytearray(b'\xff')}], {'raw': b''})
+        self.assertEqual(decode_message(data), Message('upload', [b'\x00\x01', {'thumb': b'\xff'}], {'raw': b''}))
+
+    def test_malformed_messages(self):
+        for message in ['{"args": []}', '{"name": "a", "args": {}}', '{not json',
+                        encode_binary_message('a', [b'abc'])[:-1],
+                        b'PEWB' + b'\x00\x00\x00\x02{}']:
+            with self.assertRaises(ValueError):
+                decode_message(message)
+
+        for index in [3, -1, 'x', None, True]:
+            header = json.dumps({'name': 'a', 'args': [{'$blob': index}]}).encode('utf-8')
+            blob = b'\x00\x00\x00\x01z'
+            with self.assertRaises(ValueError):
+                decode_message(b'PEWB' + bytearray([0, 0, 0, len(header)]) + header + blob)
+
+
+class ResultEncodingTest(unittest.TestCase):
+    def test_values_are_marshalled(self):
+        value = {'when': datetime.date(2020, 1, 2), 'tags': set(['a']), 'price': decimal.Decimal('1.5'),
+                 'data': b'\x00\xff', 'items': (1, 2)}
+        self.assertEqual(json.loads(encode_result(3, value)), {
+            'reply': 3, 'error': None,
+            'value': {'when': '2020-01-02', 'tags': ['a'], 'price': 1.5, 'data': 'AP8=', 'items': [1, 2]}})
+
+    def test_errors(self):
+        reply = json.loads(encode_result('a', error=KeyError('missing')))
+        self.assertEqual(reply['error']['type'], 'KeyError')
+        reply = json.loads(encode_result('b', object()))
+        self.assertEqual((reply['value'], reply['error']['type']), (None, 'TypeError'))
@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pew
+import pew.metrics as metrics
+
+
+class Delegate(object):
+    def load_complete(self):
+        pass
+
+    def fail(self):
+        raise ValueError("failed")
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+
+    def test_route_metrics(self):
+        handler = pew.PEWMessageHandler(None, Delegate())
+        handler.parse_message('myapp://load_complete')
+        handler.parse_message('myapp://load_complete')
+        handler.parse_message('myapp://fail')
+
+        routes = metrics.snapshot()['routes']
+        self.assertEqual(routes['load_complete']['calls'], 2)
+        self.assertEqual(routes['load_complete']['errors'], 0)
+        self.assertEqual(routes['load_complete']['latency_ms']['count'], 2)
+        self.assertEqual(routes['fail']['errors'], 1)
+
+    def test_disabled(self):
+        metrics.enable(False)
+        pew.PEWMessageHandler(None, Delegate()).parse_message('myapp://load_complete')
+        self.assertEqual(metrics.snapshot()['routes'], {})
+
+    def test_histogram(self):
+        histogram = metrics.Histogram()
+        for value in (0.05, 0.3, 3, 3000, 10000):
+            histogram.add(value)
+        data = histogram.to_dict()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['buckets']['le_0.1'], 1)
+        self.assertEqual(data['buckets']['le_inf'], 1)
+        self.assertEqual(data['p50'], 5)
+        self.assertEqual(data['p99'], 10000)
+
+    def test_main_thread_queue_depth(self):
+        queued = []
+        run_on_main_thread = metrics.instrument_main_thread(lambda func, *args: queued.append((func, args)))
+        run_on_main_thread(lambda: None)
+        run_on_main_thread(lambda value: value, 1)
+        self.assertEqual(metrics.snapshot()['main_thread'], {'queued': 2, 'max_queued': 2, 'calls': 2})
+        for func, args in queued:
+            func(*args)
+        self.assertEqual(metrics.snapshot()['main_thread']['queued'], 0)
+
+    def test_export_to_file(self):
+        metrics.record_js_call('update', u'update("é");')
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'metrics.json')
+            metrics.export(path)
+            with open(path) as metrics_file:
+                data = json.load(metrics_file)
+            self.assertEqual(data['js_functions']['update'], {'calls': 1, 'bytes': 13})
+        finally:
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,154 @@
+import re
+import threading
+import unittest
+
+import pew
+from pew.pending import JavaScriptError, PendingRequests, PEWTimeoutError
+
+
+class FakeWebView(object):
+    """
+    Answers bridge.getJSValue requests from a background thread, like a real web view would.
+    """
+    def __init__(self, values):
+        self.values = values
+        self.handler = None
+        self.scripts = []
+
+    def evaluate_javascript(self, js):
+        self.scripts.append(js)
+        match = re.match(r'bridge\.getJSValue\("(.*)", (\d+)\);', js)
+        if match and match.group(1) in self.values:
+            request_id = int(match.group(2))
+            value = self.values[match.group(1)]
+            threading.Timer(0.01, self.handler.dispatcher.dispatch,
+                            ('js_value_result', (request_id, {'value': value}))).start()
+
+
+class ResultWebView(object):
+    """
+    Returns the result of scripts to a callback, like WebKitGTK's web view.
+    """
+    javascript_results = True
+
+    def __init__(self, values):
+        self.values = values
+        self.scripts = []
+
+    def evaluate_javascript(self, js, callback=None):
+        self.scripts.append(js)
+        if js in self.values:
+            threading.Timer(0.01, callback, (self.values[js], None)).start()
+        else:
+            threading.Timer(0.01, callback, (None, JavaScriptError("ReferenceError: %s" % js))).start()
+
+
+class PendingRequestsTest(unittest.TestCase):
+    def test_results_are_matched_by_id(self):
+        requests = PendingRequests()
+        first = requests.create()
+        second = requests.create()
+        self.assertEqual(len(requests), 2)
+
+        self.assertTrue(requests.resolve(second.request_id, 'b'))
+        self.assertTrue(requests.resolve(first.request_id, 'a'))
+        self.assertFalse(requests.resolve(first.request_id, 'again'))
+        self.assertEqual(first.wait(0), 'a')
+        self.assertEqual(second.wait(0), 'b')
+        self.assertEqual(len(requests), 0)
+
+    def test_callbacks_and_timeouts(self):
+        requests = PendingRequests()
+        pending = requests.create()
+        values = []
+        pending.add_done_callback(lambda result: values.append(result.value))
+        with self.assertRaises(PEWTimeoutError):
+            pending.wait(0.01)
+        requests.resolve(pending.request_id, 42)
+        self.assertEqual(values, [42])
+
+
+class GetJSValueTest(unittest.TestCase):
+    def setUp(self):
+        self.webview = FakeWebView({'document.title': 'Home', 'count': 3})
+        self.handler = pew.PEWMessageHandler(self.webview, None)
+        self.webview.handler = self.handler
+
+    def test_concurrent_requests(self):
+        results = {}
+
+        def get(variable):
+            results[variable] = self.handler.get_js_value(variable)
+
+        threads = [threading.Thread(target=get, args=(name,)) for name in ('document.title', 'count')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {'document.title': 'Home', 'count': 3})
+
+    def test_timeout(self):
+        with self.assertRaises(PEWTimeoutError):
+            self.handler.get_js_value('missing', timeout=0.05)
+        self.assertEqual(len(self.handler.js_requests), 0)
+
+    def test_callback(self):
+        received = threading.Semaphore(0)
+        results = []
+
+        def callback(value, error):
+            results.append((value, error))
+            received.release()
+
+        self.assertIsNone(self.handler.get_js_value('count', callback=callback))
+        self.assertTrue(received.acquire(timeout=1))
+        self.assertEqual(results, [(3, None)])
+
+        # timeouts are reported to the callback too
+        self.handler.get_js_value('missing', timeout=0.05, callback=callback)
+        self.assertTrue(received.acquire(timeout=1))
+        self.assertIsInstance(results[1][1], PEWTimeoutError)
+        self.assertEqual(len(self.handler.js_requests), 0)
+
+    def test_scripts_are_evaluated_on_the_main_thread(self):
+        main_thread_calls = []
+
+        def run_on_main_thread(func, *args):
+            main_thread_calls.append(args)
+            func(*args)
+
+        get_native = pew.get_native
+        pew.get_native = lambda name, default=None: run_on_main_thread
+        try:
+            self.assertEqual(self.handler.get_js_value('count'), 3)
+        finally:
+            pew.get_native = get_native
+        self.assertEqual(main_thread_calls, [(self.webview.scripts[0],)])
+
+
+class ScriptResultTest(unittest.TestCase):
+    def setUp(self):
+        self.webview = ResultWebView({'document.title': 'Home'})
+        self.handler = pew.PEWMessageHandler(self.webview, None)
+
+    def test_values_are_returned_directly(self):
+        self.assertEqual(self.handler.get_js_value('document.title'), 'Home')
+        # the expression itself is evaluated, without a bridge.getJSValue round trip
+        self.assertEqual(self.webview.scripts, ['document.title'])
+        with self.assertRaises(JavaScriptError):
+            self.handler.get_js_value('missing')
+        self.assertEqual(len(self.handler.js_requests), 0)
+
+    def test_callback_receives_errors(self):
+        received = threading.Event()
+        results = []
+
+        def callback(value, error):
+            results.append((value, error))
+            received.set()
+
+        self.handler.get_js_value('missing', callback=callback)
+        self.assertTrue(received.wait(1))
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], JavaScriptError)
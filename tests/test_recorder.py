@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pew.recorder import FileRecorder, MemoryRecorder, create_recorder
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_memory_recorder_keeps_latest_calls(self):
+        recorder = MemoryRecorder(max_entries=2)
+        for i in range(5):
+            recorder.record("update(%d);" % i)
+        self.assertEqual(recorder.get_script(), "update(3);\nupdate(4);\n")
+
+    def test_file_recorder_rotates(self):
+        path = os.path.join(self.temp_dir, "session.js")
+        recorder = FileRecorder(path, max_bytes=24, backup_count=1)
+        for i in range(5):
+            recorder.record("update(%d);" % i)
+
+        self.assertTrue(os.path.exists(path + ".1"))
+        self.assertFalse(os.path.exists(path + ".2"))
+        # each file holds two 11 byte calls, only the newest backup is kept
+        self.assertEqual(recorder.get_script(), "update(2);\nupdate(3);\nupdate(4);\n")
+        recorder.close()
+        recorder.record("ignored();")
+
+    def test_clear(self):
+        recorder = MemoryRecorder()
+        recorder.record("update(1);")
+        recorder.clear()
+        recorder.record("update(2);")
+        self.assertEqual(recorder.get_script(), "update(2);\n")
+
+        path = os.path.join(self.temp_dir, "session.js")
+        recorder = FileRecorder(path, max_bytes=24, backup_count=1)
+        for i in range(3):
+            recorder.record("update(%d);" % i)
+        recorder.clear()
+        self.assertFalse(os.path.exists(path + ".1"))
+        self.assertEqual(recorder.get_script(), "")
+        recorder.record("update(3);")
+        self.assertEqual(recorder.get_script(), "update(3);\n")
+        recorder.close()
+
+    def test_create_recorder(self):
+        self.assertIsNone(create_recorder("off"))
+        self.assertIsInstance(create_recorder("memory", max_entries=1), MemoryRecorder)
+        with self.assertRaises(ValueError):
+            create_recorder("tape")
@@ -0,0 +1,198 @@
+import json
+import socket
+import threading
+import unittest
+
+from six.moves import http_client
+
+import pew
+from pew import websocket
+from pew.server import create_message_server
+
+
+class Delegate(object):
+    def __init__(self):
+        self.calls = []
+
+    def load_complete(self):
+        self.calls.append('load_complete')
+
+    def save(self, value):
+        self.calls.append(('save', value))
+
+    def fail(self):
+        raise ValueError("failed")
+
+    @pew.background
+    def load(self, name):
+        return {'name': name}
+
+
+class MessageServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.delegate = Delegate()
+        handler = pew.PEWMessageHandler(None, self.delegate)
+        self.server = create_message_server(handler, "127.0.0.1", 0, max_workers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, connection, method, path, body=None, headers={}, token=True):
+        if token:
+            path = "/" + self.server.token + path
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        self.response = response
+        return response.status, json.loads(response.read().decode('utf-8'))
+
+
+class MessageServerTest(MessageServerTestCase):
+    def test_keep_alive(self):
+        connection = http_client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.assertEqual(self.request(connection, "GET", "/load_complete"), (200, {"ok": True}))
+        sock = connection.sock
+        self.assertEqual(self.request(connection, "POST", "/save", '%7B%22a%22%3A%201%7D'), (200, {"ok": True}))
+        self.assertEqual(self.request(connection, "POST", "/", '{"name": "save", "args": ["1"]}'), (200, {"ok": True}))
+        self.assertEqual(self.request(connection, "GET", "/fail")[0], 500)
+        self.assertEqual(self.request(connection, "GET", "/missing")[0], 500)
+        # all requests were served over the same connection
+        self.assertIs(connection.sock, sock)
+        connection.close()
+
+        self.assertEqual(self.delegate.calls, ['load_complete', ('save', {'a': 1}), ('save', '1')])
+
+    def test_call_results(self):
+        connection = http_client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.assertEqual(self.request(connection, "POST", "/", '{"name": "load", "args": ["a"], "id": 7}'),
+                         (200, {"reply": 7, "value": {"name": "a"}, "error": None}))
+        status, reply = self.request(connection, "GET", "/fail?_call_id=8")
+        self.assertEqual((status, reply["reply"], reply["error"]["type"]), (200, 8, "ValueError"))
+        connection.close()
+
+    def test_body_size_limit(self):
+        self.server.max_body_size = 10
+        connection = http_client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.assertEqual(self.request(connection, "POST", "/save", "x" * 11)[0], 413)
+        connection.close()
+
+    def test_invalid_content_length(self):
+        for length in ("abc", "-5"):
+            sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+            request = "POST /%s/save HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: %s\r\n\r\n"
+            sock.sendall((request % (self.server.token, length)).encode("ascii"))
+            response = sock.makefile("rb").read().decode("utf-8")
+            sock.close()
+            self.assertTrue(response.startswith("HTTP/1.0 400") or response.startswith("HTTP/1.1 400"))
+        self.assertEqual(self.delegate.calls, [])
+
+    def test_token_and_origin_are_checked(self):
+        connection = http_client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.assertEqual(self.request(connection, "GET", "/load_complete", token=False)[0], 403)
+        self.assertEqual(self.request(connection, "GET", "/load_complete",
+                                      headers={"Origin": "https://example.com"})[0], 403)
+        self.assertIsNone(self.response.getheader("Access-Control-Allow-Origin"))
+
+        self.assertEqual(self.request(connection, "GET", "/load_complete",
+                                      headers={"Origin": "http://127.0.0.1:8456"}), (200, {"ok": True}))
+        self.assertEqual(self.response.getheader("Access-Control-Allow-Origin"), "http://127.0.0.1:8456")
+        connection.close()
+        self.assertEqual(self.delegate.calls, ['load_complete'])
+        self.assertTrue(self.server.url.endswith("/%s/" % self.server.token))
+
+    def test_close_with_full_queue(self):
+        self.server.max_workers = 1
+        self.server.max_queued_requests = 1
+        # the only worker waits for the rest of the first request while the second one is queued
+        busy = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        busy.sendall(b"GET /")
+        queued = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        for _ in range(100):
+            if self.server._requests is not None and self.server._requests.full():
+                break
+            threading.Event().wait(0.01)
+        self.assertTrue(self.server._requests.full())
+
+        self.server.shutdown()
+        closer = threading.Thread(target=self.server.server_close)
+        closer.start()
+        closer.join(2)
+        self.assertFalse(closer.is_alive())
+        busy.close()
+        queued.close()
+
+
+class WebSocketTest(MessageServerTestCase):
+    def connect(self, origin="http://localhost:8456"):
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        sock.sendall(("GET /%s/ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      "Origin: %s\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+                      "Sec-WebSocket-Version: 13\r\n\r\n" % (self.server.token, origin)).encode("ascii"))
+        rfile = sock.makefile("rb")
+        status = rfile.readline()
+        headers = []
+        line = rfile.readline()
+        while line.strip():
+            headers.append(line.strip())
+            line = rfile.readline()
+        return sock, rfile, status, headers
+
+    def send_text(self, sock, text, opcode=websocket.OP_TEXT):
+        mask = b"\x01\x02\x03\x04"
+        frame = bytearray(websocket.encode_frame(opcode, b""))
+        payload = text.encode("utf-8") if isinstance(text, type(u"")) else text
+        frame[1] = 0x80 | len(payload)
+        sock.sendall(bytes(frame) + mask + websocket.apply_mask(payload, mask))
+
+    def read_frame(self, rfile):
+        first, length = bytearray(rfile.read(2))
+        return first & 0x0F, rfile.read(length)
+
+    def test_messages_in_both_directions(self):
+        sock, rfile, status, headers = self.connect()
+        self.assertIn(b"101", status)
+        self.assertIn(b"Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=", headers)
+
+        self.send_text(sock, "load_complete")
+        self.send_text(sock, "save?%5B1%2C2%5D")
+        self.send_text(sock, '{"name": "load", "args": ["b"], "id": 1}')
+        opcode, payload = self.read_frame(rfile)
+        self.assertEqual(json.loads(payload.decode("utf-8")), {"reply": 1, "value": {"name": "b"}, "error": None})
+        self.send_text(sock, "ping", websocket.OP_PING)
+        self.assertEqual(self.read_frame(rfile), (websocket.OP_PONG, b"ping"))
+        self.assertEqual(self.delegate.calls, ['load_complete', ('save', [1, 2])])
+
+        self.assertEqual(len(self.server.websockets), 1)
+        self.server.websockets.call_js_function("app.update", {"a": 1})
+        opcode, payload = self.read_frame(rfile)
+        self.assertEqual(opcode, websocket.OP_TEXT)
+        self.assertEqual(json.loads(payload.decode("utf-8")), {"call": "app.update", "args": [{"a": 1}]})
+
+        self.send_text(sock, "", websocket.OP_CLOSE)
+        self.assertEqual(self.read_frame(rfile)[0], websocket.OP_CLOSE)
+        sock.close()
+
+    def test_invalid_text_is_rejected(self):
+        sock, rfile, status, headers = self.connect()
+        self.send_text(sock, b"\xff\xfe")
+        self.assertEqual(self.read_frame(rfile), (websocket.OP_CLOSE, b"\x03\xef"))
+        sock.close()
+
+    def test_websockets_do_not_use_workers(self):
+        # the server has two workers, which stay free for HTTP requests
+        sockets = [self.connect()[0] for _ in range(3)]
+        connection = http_client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.assertEqual(self.request(connection, "GET", "/load_complete"), (200, {"ok": True}))
+        connection.close()
+        for sock in sockets:
+            sock.close()
+
+    def test_foreign_origins_are_rejected(self):
+        sock, rfile, status, headers = self.connect("https://example.com")
+        self.assertIn(b"403", status)
+        self.assertEqual(len(self.server.websockets), 0)
+        sock.close()
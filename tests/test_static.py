@@ -0,0 +1,148 @@
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from six.moves import http_client
+
+from pew.static import AssetCache, create_static_server, parse_range, resolve_path
+
+
+class StaticServerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "lib"))
+        with open(os.path.join(self.root, "index.html"), "wb") as index:
+            index.write(b"<html></html>")
+        self.script = b"var x = 1;\n" * 100
+        with open(os.path.join(self.root, "lib", "app.js"), "wb") as script:
+            script.write(self.script)
+        with gzip.open(os.path.join(self.root, "lib", "app.js.gz"), "wb") as compressed:
+            compressed.write(self.script)
+
+        self.server = create_static_server(self.root, "127.0.0.1", 0, max_workers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.connection = http_client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+
+    def get(self, path, headers=None):
+        self.connection.request("GET", path, headers=headers or {})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_conditional_requests(self):
+        response, body = self.get("/")
+        self.assertEqual((response.status, body), (200, b"<html></html>"))
+        etag = response.getheader("ETag")
+        last_modified = response.getheader("Last-Modified")
+
+        response, body = self.get("/index.html", {"If-None-Match": etag})
+        self.assertEqual((response.status, body), (304, b""))
+        response, body = self.get("/index.html", {"If-Modified-Since": last_modified})
+        self.assertEqual(response.status, 304)
+        response, body = self.get("/index.html", {"If-None-Match": '"other"'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.server.files.cache.hits, 1)
+
+        self.assertEqual(self.get("/missing.js")[0].status, 404)
+        # paths cannot escape the root
+        self.assertEqual(self.get("/../" + os.path.basename(self.root) + "/index.html")[0].status, 404)
+        self.assertEqual(self.get("/lib/../../index.html")[1], b"<html></html>")
+
+    def test_resolve_path_stays_under_root(self):
+        root = os.path.realpath(self.root)
+        for url_path in ("/../etc/passwd", "/..%5C..%5Cetc", "/C:%5CWindows", "/%2E%2E/index.html"):
+            path = resolve_path(self.root, url_path)
+            self.assertTrue(path.startswith(os.path.join(root, "")), path)
+        self.assertEqual(resolve_path(self.root, "/"), root)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symlinks")
+    def test_symlinks_cannot_escape_root(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        with open(os.path.join(outside, "secret.txt"), "wb") as secret:
+            secret.write(b"secret")
+        os.symlink(outside, os.path.join(self.root, "link"))
+        self.assertIsNone(resolve_path(self.root, "/link/secret.txt"))
+        self.assertEqual(self.get("/link/secret.txt")[0].status, 404)
+        self.assertEqual(self.get("/lib")[0].status, 301)
+
+    def test_precompressed_files(self):
+        response, body = self.get("/lib/app.js", {"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertTrue(response.getheader("Content-Type").startswith("application/javascript"))
+        self.assertEqual(gzip.GzipFile(fileobj=__import__("io").BytesIO(body)).read(), self.script)
+
+        response, body = self.get("/lib/app.js", {"Accept-Encoding": "gzip;q=0"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, self.script)
+
+    def test_ranges(self):
+        response, body = self.get("/lib/app.js", {"Range": "bytes=4-9", "Accept-Encoding": "gzip"})
+        self.assertEqual((response.status, body), (206, self.script[4:10]))
+        self.assertEqual(response.getheader("Content-Range"), "bytes 4-9/%d" % len(self.script))
+        self.assertIsNone(response.getheader("Content-Encoding"))
+
+        response, body = self.get("/lib/app.js", {"Range": "bytes=-5"})
+        self.assertEqual(body, self.script[-5:])
+        response, body = self.get("/lib/app.js", {"Range": "bytes=5000-"})
+        self.assertEqual(response.status, 416)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-", 10), (0, 9))
+        self.assertEqual(parse_range("bytes=2-100", 10), (2, 9))
+        self.assertEqual(parse_range("bytes=-20", 10), (0, 9))
+        self.assertIsNone(parse_range("bytes=0-1,4-5", 10))
+        self.assertIs(parse_range("bytes=10-", 10), False)
+
+
+class AssetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, data, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as asset:
+            asset.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_hits_and_invalidation(self):
+        cache = AssetCache()
+        path = self.write("a.js", b"one", time.time() - 10)
+        self.assertEqual(cache.read(path, os.stat(path)), b"one")
+        self.assertEqual(cache.read(path, os.stat(path)), b"one")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.write("a.js", b"two", time.time())
+        self.assertEqual(cache.read(path, os.stat(path)), b"two")
+        self.assertEqual((cache.hits, cache.misses, cache.size), (1, 2, 3))
+
+    def test_size_bound(self):
+        cache = AssetCache(max_bytes=10, max_entry_bytes=6)
+        paths = [self.write(name, data) for name, data in (("a", b"aaaa"), ("b", b"bbbb"), ("c", b"cccc"))]
+        for path in paths[:2]:
+            cache.read(path, os.stat(path))
+        # touch a so that b is the least recently used entry
+        cache.read(paths[0], os.stat(paths[0]))
+        cache.read(paths[2], os.stat(paths[2]))
+        self.assertEqual((len(cache), cache.size), (2, 8))
+        self.assertIsNotNone(cache.get(paths[0], os.stat(paths[0])))
+        self.assertIsNone(cache.get(paths[1], os.stat(paths[1])))
+
+        large = self.write("large", b"x" * 7)
+        self.assertIsNone(cache.read(large, os.stat(large)))
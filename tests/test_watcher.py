@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from pew.watcher import FileWatcher, is_ignored
+
+
+class FileWatcherTest(unittest.TestCase):
+    use_inotify = False
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "css"))
+        self.changes = []
+        self.changed = threading.Event()
+        self.watcher = FileWatcher([self.root], self.on_change, debounce=0.2, poll_interval=0.05,
+                                   use_inotify=self.use_inotify)
+        self.watcher.start()
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.root)
+
+    def on_change(self, paths):
+        self.changes.append(paths)
+        self.changed.set()
+
+    def write(self, *parts):
+        with open(os.path.join(self.root, *parts), "w") as f:
+            f.write("body {}")
+
+    def test_burst_of_changes_is_reported_once(self):
+        self.write("css", "a.css")
+        self.write("css", "b.css")
+        self.write("css", ".a.css.swp")
+        self.assertTrue(self.changed.wait(5))
+        self.assertEqual(self.changes, [[os.path.join(self.root, "css", "a.css"),
+                                         os.path.join(self.root, "css", "b.css")]])
+
+    def test_new_directories_are_watched(self):
+        os.makedirs(os.path.join(self.root, "js", "lib"))
+        self.write("js", "lib", "app.js")
+        self.assertTrue(self.changed.wait(5))
+        self.changed.clear()
+        self.assertIn(os.path.join(self.root, "js", "lib", "app.js"), self.changes[-1])
+
+        os.remove(os.path.join(self.root, "js", "lib", "app.js"))
+        self.assertTrue(self.changed.wait(5))
+        self.assertEqual(self.changes[-1], [os.path.join(self.root, "js", "lib", "app.js")])
+
+    def test_ignored_files(self):
+        self.assertTrue(is_ignored("/ui/.index.html.swp"))
+        self.assertTrue(is_ignored("/ui/index.html~"))
+        self.assertFalse(is_ignored("/ui/index.html"))
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is only available on Linux")
+class InotifyWatcherTest(FileWatcherTest):
+    use_inotify = True
+
+    def test_uses_inotify(self):
+        self.assertEqual(type(self.watcher.source).__name__, "InotifySource")